@@ -0,0 +1,131 @@
+"""
+Warehouse size over many hourly runs: every fetched row appended, the
+"versions" layout and the "ranges" (validity range) layout, then the two
+warehouse layouts after compaction with the default retention policy.
+
+Each simulated run fetches --hours hourly wind records for every spot, of
+which --change-rate differ from the previous run. Only the changed records
+should be stored, and compaction should thin versions older than
+--hourly-days to one per day.
+
+    python benchmarks/bench_archive.py --runs 240 --spots 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import duckdb
+
+from duckdive.compaction import compact_warehouse
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+
+def batch(con, args, run: int, fetched_at: datetime) -> None:
+    """
+    Replace the "wind" table with the records fetched by one run.
+    """
+    start = int(fetched_at.timestamp()) // 3600 * 3600
+    # Each record is revised once every `period` runs, staggered by its hash
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE wind AS
+        SELECT 'spot' || spot AS spot_id, ts AS "timestamp",
+            round(10 + sin(ts / 20000) * 5 + revision % 4 * 0.5, 2) AS speed,
+            round((ts / 100) % 360, 2) AS direction,
+            'Offshore' AS directionType
+        FROM (
+            SELECT spot, ts,
+                ($run + hash(spot, ts) % $period) // $period AS revision
+            FROM range($spots) s(spot), range($start, $start + $hours * 3600, 3600) t(ts)
+        )
+        """,
+        {
+            "run": run,
+            "period": max(round(1 / args.change_rate), 1),
+            "spots": args.spots,
+            "start": start,
+            "hours": args.hours,
+        },
+    )
+
+
+def run(args, directory: str, layout: str) -> dict:
+    path = os.path.join(directory, f"{layout}.duckdb")
+    con = duckdb.connect()
+    attach_warehouse(con, path)
+    start = time.perf_counter()
+    rows = 0
+    for index in range(args.runs):
+        fetched_at = args.start + timedelta(hours=index)
+        batch(con, args, index, fetched_at)
+        if layout == "append":
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS warehouse.wind AS"
+                " SELECT *, $fetched_at AS fetched_at FROM wind LIMIT 0",
+                {"fetched_at": fetched_at},
+            )
+            con.execute(
+                "INSERT INTO warehouse.wind SELECT *, $fetched_at FROM wind",
+                {"fetched_at": fetched_at},
+            )
+        else:
+            upsert_forecast(
+                con, "wind", source="wind", fetched_at=fetched_at, layout=layout
+            )
+        rows += args.spots * args.hours
+    seconds = time.perf_counter() - start
+    con.execute("CHECKPOINT warehouse")
+    stored = con.execute("SELECT count(*) FROM warehouse.wind").fetchone()[0]
+    con.close()
+
+    result = {"fetched": rows, "stored": stored, "bytes": os.path.getsize(path)}
+    result["seconds"] = seconds
+    if layout != "append":
+        compaction = compact_warehouse(
+            path,
+            hourly_days=args.hourly_days,
+            now=args.start + timedelta(hours=args.runs),
+        )
+        result["compacted"] = sum(compaction.rows_after.values())
+        result["compacted MB"] = f"{compaction.bytes_after / 1e6:.1f}"
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=240, help="Hourly runs")
+    parser.add_argument("--spots", type=int, default=10)
+    parser.add_argument(
+        "--hours", type=int, default=72, help="Records per spot per run"
+    )
+    parser.add_argument(
+        "--change-rate",
+        type=float,
+        default=0.1,
+        help="Fraction of records changed per run",
+    )
+    parser.add_argument("--hourly-days", type=float, default=7)
+    args = parser.parse_args()
+    args.start = datetime(2024, 10, 1)
+
+    print(
+        f"{args.runs} hourly runs of {args.spots} spots x {args.hours} records,"
+        f" ~{args.change_rate:.0%} changed per run\n"
+    )
+    print(f"{'':<10}{'stored':>10}{'MB':>8}{'seconds':>9}{'compacted':>11}{'MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in ["append", "versions", "ranges"]:
+            r = run(args, directory, layout)
+            print(
+                f"{layout:<10}{r['stored']:>10}{r['bytes'] / 1e6:>8.1f}{r['seconds']:>9.2f}"
+                f"{r.get('compacted', '-'):>11}{r.get('compacted MB', '-'):>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
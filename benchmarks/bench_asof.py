@@ -0,0 +1,140 @@
+"""
+Latency of as-of queries over months of stored forecast versions.
+
+Builds a warehouse "wind" table with hourly issues over --days days for
+--spots spots (each valid hour forecast --horizon hours ahead, revised by
+about one issue in --period), in both layouts and in two row orders:
+the order runs append in (by issue time) and the order `duckdive compact`
+writes (by spot, valid time, issue time). Then times forecast_asof,
+forecast_evolution and forecast_skill for one spot.
+
+    python benchmarks/bench_asof.py --spots 50 --days 90
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import duckdb
+
+from duckdive.asof import forecast_asof, forecast_evolution, forecast_skill
+from duckdive.warehouse import create_table
+
+
+def build(con, args, layout: str, order: str) -> int:
+    """
+    Create the wind table of a layout with every simulated version, in a row order.
+    """
+    issued = "valid_from" if layout == "ranges" else "fetched_at"
+    columns = [
+        ("spot_id", "VARCHAR"),
+        ("forecast_type", "VARCHAR"),
+        (issued, "TIMESTAMP"),
+        *([("valid_to", "TIMESTAMP")] if layout == "ranges" else []),
+        ("row_hash", "UBIGINT"),
+        ("timestamp", "BIGINT"),
+        ("speed", "DOUBLE"),
+        ("direction", "DOUBLE"),
+        ("directionType", "VARCHAR"),
+    ]
+    con.execute("DROP TABLE IF EXISTS wind")
+    create_table(con, "wind", "wind", columns)
+    sort = {"issue": issued, "compacted": f'spot_id, "timestamp", {issued}'}[order]
+    start = int(args.start.timestamp())
+    con.execute(
+        f"""
+        INSERT INTO wind BY NAME
+        SELECT *, hash(speed) AS row_hash FROM (
+            SELECT 'spot' || spot AS spot_id, 'wind' AS forecast_type,
+                to_timestamp(issue)::TIMESTAMP AS {issued},
+                {"to_timestamp(lead(issue) OVER (PARTITION BY spot, ts ORDER BY issue))::TIMESTAMP AS valid_to," if layout == "ranges" else ""}
+                ts AS "timestamp",
+                round(10 + sin(ts / 20000 + spot) * 5 + (hash(spot, ts, issue) % 7) * 0.3, 2) AS speed,
+                (ts / 100) % 360 AS direction, 'Offshore' AS directionType
+            FROM (
+                SELECT spot, ts, ts - (k * 3600) AS issue
+                FROM range({args.spots}) s(spot),
+                    range({start}, {start + args.days * 86400}, 3600) t(ts),
+                    range(0, {args.horizon + 1}) h(k)
+                WHERE k = {args.horizon} OR hash(spot, ts, k) % {args.period} = 0
+            )
+            WHERE issue >= {start}
+        )
+        ORDER BY {sort}
+        """
+    )
+    return con.execute("SELECT count(*) FROM wind").fetchone()[0]
+
+
+def timed(query, con, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query(con).fetchall()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--horizon", type=int, default=168, help="Hours forecast ahead")
+    parser.add_argument(
+        "--period", type=int, default=10, help="Issues per revision of a record"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    args.start = datetime(2024, 7, 1)
+
+    issued_at = args.start + timedelta(days=args.days - 10, hours=20)
+    valid_at = issued_at + timedelta(days=2, hours=10)
+    spot = ["spot7"]
+    queries = {
+        "asof": lambda con: forecast_asof(
+            con,
+            "wind",
+            issued_at,
+            spot_ids=spot,
+            valid_to=issued_at + timedelta(days=7),
+        ),
+        "asof all spots": lambda con: forecast_asof(
+            con, "wind", issued_at, valid_to=issued_at + timedelta(days=7)
+        ),
+        "evolution": lambda con: forecast_evolution(
+            con, "wind", valid_at, spot_ids=spot
+        ),
+        "skill 30d": lambda con: forecast_skill(
+            con,
+            "wind",
+            "speed",
+            spot_ids=spot,
+            valid_from=issued_at - timedelta(days=30),
+            valid_to=issued_at,
+        ),
+    }
+
+    print(f"{'':<26}{'rows':>10}" + "".join(f"{name:>16}" for name in queries))
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in ["versions", "ranges"]:
+            for order in ["issue", "compacted"]:
+                path = os.path.join(directory, f"{layout}_{order}.duckdb")
+                con = duckdb.connect(path)
+                rows = build(con, args, layout, order)
+                con.close()
+                con = duckdb.connect(path, read_only=True)
+                latencies = [timed(q, con, args.repeat) for q in queries.values()]
+                con.close()
+                print(
+                    f"{f'{layout}, {order} order':<26}{rows:>10}"
+                    + "".join(f"{ms:>13.1f} ms" for ms in latencies)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-call cost of a fresh DuckDB connection + extension load per request
+(the old query_surfline behavior) versus one long-lived SurflineClient.
+
+    python benchmarks/bench_client.py --calls 50 --transport requests
+"""
+
+import argparse
+import statistics
+import time
+
+from stub_server import StubServer
+
+from duckdive.api import construct_surfline_api_url
+from duckdive.client import SurflineClient, transports
+
+
+def time_calls(calls: int, fn) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    print(
+        f"{label:<28} mean {statistics.mean(timings):8.2f} ms"
+        f"   p50 {statistics.median(timings):8.2f} ms"
+        f"   max {max(timings):8.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("-t", "--forecast-type", default="wind")
+    parser.add_argument("--transport", choices=transports, action="append")
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        url = construct_surfline_api_url(
+            days=args.days,
+            interval_hours=1,
+            forecast_type=args.forecast_type,
+            base_url=server.base_url,
+        )
+
+        for transport in args.transport or transports:
+            try:
+                SurflineClient(transport=transport).close()
+            except Exception as e:
+                print(f"[{transport}] skipped: {e}")
+                continue
+
+            def per_call(transport=transport):
+                with SurflineClient(transport=transport) as client:
+                    client.query(url)
+
+            client = SurflineClient(transport=transport)
+            before = time_calls(args.calls, per_call)
+            after = time_calls(args.calls, lambda client=client: client.query(url))
+            client.close()
+
+            print(
+                f"[{transport}] {args.calls} calls, {args.forecast_type}, {args.days} days"
+            )
+            report("connection per call", before)
+            report("long-lived client", after)
+            print(f"speedup {statistics.mean(before) / statistics.mean(after):.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
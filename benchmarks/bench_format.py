@@ -0,0 +1,88 @@
+"""
+Row-at-a-time formatting (the previous util.format_dataframe implementation)
+versus the vectorized formatting engine, on multi-spot, multi-day frames.
+
+    python benchmarks/bench_format.py --rows 10000 --rows 100000 --rows 1000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from stub_server import make_records
+
+from duckdive import util
+
+
+def row_at_a_time(df: pd.DataFrame) -> pd.DataFrame:
+    """The previous implementation: .apply per cell and iterrows for swells."""
+    if "timestamp" in df.columns:
+        df["timestamp"] = df["timestamp"].apply(util.format_timestamp)
+    if "optimalScore" in df.columns:
+        df["optimalScore"] = df["optimalScore"].map(util.optimal_score_mapping)
+    if "swells" in df.columns and "surf" not in df.columns:
+        for idx, row in df.iterrows():
+            swells = row["swells"]
+            if isinstance(swells, list) and len(swells) > 0:
+                for key, value in swells[0].items():
+                    df.at[idx, key] = value
+        df = df.drop(columns=["swells"])
+    elif "rating" in df.columns:
+        for key in ["key", "value"]:
+            df[f"rating_{key}"] = df["rating"].apply(
+                lambda x, k=key: x.get(k) if isinstance(x, dict) else None
+            )
+        df = df.drop(columns=["rating"])
+    for column, unit in util.units_mapping.items():
+        if column in df.columns:
+            df[column] = df[column].apply(
+                lambda x, u=unit: f"{x} {u}" if pd.notnull(x) else x
+            )
+    return df
+
+
+def make_frame(forecast_type: str, rows: int) -> pd.DataFrame:
+    """Repeat one 17-day hourly spot forecast over as many spots as needed."""
+    records = make_records(forecast_type, days=17, interval_hours=1)
+    spots = max(rows // len(records), 1)
+    frame = pd.DataFrame(records * spots).head(rows)
+    frame.insert(0, "spot_id", [str(i // len(records)) for i in range(len(frame))])
+    return frame
+
+
+def measure(fn, frame: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    fn(frame.copy())
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, action="append")
+    parser.add_argument("-t", "--forecast-type", action="append")
+    parser.add_argument(
+        "--skip-baseline-above",
+        type=int,
+        default=200_000,
+        help="Skip the row-at-a-time baseline for larger frames",
+    )
+    args = parser.parse_args()
+
+    for forecast_type in args.forecast_type or ["wind", "swells", "tides"]:
+        for rows in args.rows or [10_000, 100_000, 1_000_000]:
+            frame = make_frame(forecast_type, rows)
+            vectorized = measure(util.format_dataframe, frame)
+            if rows <= args.skip_baseline_above:
+                baseline = measure(row_at_a_time, frame)
+                speedup = f"{baseline / vectorized:6.1f}x"
+                baseline = f"{baseline * 1000:9.1f} ms"
+            else:
+                baseline, speedup = "  skipped   ", "     -"
+            print(
+                f"{forecast_type:<8} {rows:>9,} rows   row-at-a-time {baseline}"
+                f"   vectorized {vectorized * 1000:9.1f} ms   {speedup}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Startup cost of the CLI, measured from `python -X importtime` in fresh
+interpreters, and a guard for the startup budget.
+
+Each scenario is run --repeat times and the fastest run is kept. Modules the
+bare interpreter imports at startup (site, encodings, ...) are not counted.
+A scenario fails if its total import time exceeds its budget, or if it imports a heavy
+dependency it should never need (duckdb, pandas, pydantic, requests, rich).
+The script exits with status 1 on any failure, so it can gate CI.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget-ms 200 --top 15
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+heavy_modules = ["duckdb", "pandas", "numpy", "pydantic", "requests", "rich"]
+
+# name -> (code run in a fresh interpreter, heavy modules the scenario may
+# import, whether it is a CLI run held to --cli-budget-ms)
+scenarios = {
+    "import duckdive": ("import duckdive", [], False),
+    # typer renders help and errors with rich
+    "duckdive --help": (
+        "from duckdive import app; app(['--help'], prog_name='duckdive')",
+        ["rich"],
+        True,
+    ),
+    "bad forecast option": (
+        "from duckdive import app; app(['forecast', '--days', '99'], prog_name='duckdive')",
+        ["rich"],
+        True,
+    ),
+}
+
+line_pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(code: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Run code in a fresh interpreter and parse its -X importtime output.
+
+    :return: List of (module, depth, self us, cumulative us)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = line_pattern.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, len(indent) // 2, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure(
+    code: str, repeat: int, startup: Set[str]
+) -> List[Tuple[str, int, int, int]]:
+    """
+    Return the import times of the fastest of repeat runs, without startup imports.
+    """
+    runs = [without_startup(import_times(code), startup) for _ in range(repeat)]
+    return min(runs, key=total_us)
+
+
+def startup_modules() -> Set[str]:
+    """
+    Return the modules a bare interpreter imports before running any code.
+    """
+    return {name for name, *_ in import_times("pass")}
+
+
+def without_startup(
+    modules: List[Tuple[str, int, int, int]], startup: Set[str]
+) -> List[Tuple[str, int, int, int]]:
+    """
+    Drop the top-level startup imports, and everything they imported, from a run.
+    """
+    kept = []
+    # -X importtime lists a module after the modules it imported
+    skipping = False
+    for name, depth, self_us, cumulative in reversed(modules):
+        if depth == 0:
+            skipping = name in startup
+        if not skipping:
+            kept.append((name, depth, self_us, cumulative))
+    return kept[::-1]
+
+
+def total_us(modules: List[Tuple[str, int, int, int]]) -> int:
+    return sum(cumulative for _, depth, _, cumulative in modules if depth == 0)
+
+
+def heavy_imports(modules: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """
+    Return the cumulative import time of every heavy top-level package imported.
+    """
+    found = {}
+    for name, _, _, cumulative in modules:
+        if name in heavy_modules:
+            found[name] = max(found.get(name, 0), cumulative)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--cli-budget-ms", type=float, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    startup = startup_modules()
+    failures = []
+    for scenario, (code, allowed, cli) in scenarios.items():
+        modules = measure(code, args.repeat, startup)
+        total_ms = total_us(modules) / 1000
+        budget_ms = args.cli_budget_ms if cli else args.budget_ms
+        status = "ok" if total_ms <= budget_ms else "OVER BUDGET"
+        print(f"\n{scenario}: {total_ms:.1f} ms ({status}, budget {budget_ms:g} ms)")
+
+        for name, _, self_us, cumulative in sorted(
+            modules, key=lambda m: m[2], reverse=True
+        )[: args.top]:
+            print(
+                f"  {name:<40} self {self_us / 1000:7.1f} ms  cumulative {cumulative / 1000:7.1f} ms"
+            )
+
+        if total_ms > budget_ms:
+            failures.append(f"{scenario} took {total_ms:.1f} ms")
+        for name, cumulative in heavy_imports(modules).items():
+            if name not in allowed:
+                failures.append(
+                    f"{scenario} imported {name} ({cumulative / 1000:.1f} ms)"
+                )
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nAll scenarios within budget")
+
+
+if __name__ == "__main__":
+    main()
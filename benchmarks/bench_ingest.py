@@ -0,0 +1,86 @@
+"""
+Load-step cost of the pydantic -> dict -> json.dumps round trip versus
+DuckDB-native JSON ingest, for 17-day 1-hour pulls across many spots.
+
+    python benchmarks/bench_ingest.py --spots 20 -t wave
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import duckdb
+from stub_server import make_payload
+
+from duckdive.ingest import insert_json, validate_body
+from duckdive.models import FullResponse
+
+
+def python_roundtrip(con, bodies, forecast_type):
+    records = []
+    for body in bodies:
+        parsed = FullResponse(**json.loads(body)["data"])
+        records.extend(item.model_dump() for item in getattr(parsed, forecast_type))
+    payload = json.dumps(records)
+    structure = con.execute("SELECT json_structure($1::JSON)", [payload]).fetchone()[0]
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE roundtrip AS
+        SELECT unnest(record)
+        FROM (SELECT unnest(from_json($1, '{structure}')) AS record)
+        """,
+        [payload],
+    )
+
+
+def native(validate):
+    def load(con, bodies, forecast_type):
+        for i, body in enumerate(bodies):
+            validate_body(con, body, forecast_type, validate)
+            insert_json(
+                con,
+                "native",
+                body,
+                forecast_type,
+                tags={"spot_id": str(i)},
+                replace=i == 0,
+            )
+
+    return load
+
+
+def measure(label, fn, bodies, forecast_type):
+    con = duckdb.connect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(con, bodies, forecast_type)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} {elapsed * 1000:9.1f} ms   python peak {peak / 2**20:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spots", type=int, default=20)
+    parser.add_argument("--days", type=int, default=17)
+    parser.add_argument("-t", "--forecast-type", default="wave")
+    args = parser.parse_args()
+
+    body = make_payload(args.forecast_type, args.days, 1).decode()
+    bodies = [body] * args.spots
+    print(
+        f"{args.spots} spots x {args.days} days of hourly {args.forecast_type}"
+        f" ({len(body) * args.spots / 2**20:.1f} MiB of JSON)"
+    )
+
+    measure("pydantic round trip", python_roundtrip, bodies, args.forecast_type)
+    for validate in ["full", "sample", "none"]:
+        measure(
+            f"native, validate={validate}", native(validate), bodies, args.forecast_type
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Peak memory and time of loading many forecasts with fetch_report into a
+DuckDB file, with one INSERT per response body versus Arrow record batches
+(--batch-size, needs pyarrow).
+
+Each load runs in a fresh process so its peak resident set size is its own;
+the stand-in API runs in another process. Peak memory should stay roughly
+flat as --spots grows, since fetch_report keeps a bounded window of fetches
+in flight and the batch loader buffers at most --batch-size rows per table.
+
+    python benchmarks/bench_memory.py --spots 50 200 --days 17
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from duckdive.api import valid_types
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load(args: argparse.Namespace) -> None:
+    """
+    Run one load and print its outcome as JSON; runs in a child process.
+    """
+    from duckdive.client import SurflineClient
+    from duckdive.engine import fetch_report
+
+    spot_ids = [f"spot{i:04d}" for i in range(args.spots[0])]
+    with tempfile.TemporaryDirectory() as directory:
+        client = SurflineClient(
+            database=os.path.join(directory, "load.duckdb"), transport="requests"
+        )
+        start = time.perf_counter()
+        con = fetch_report(
+            spot_ids,
+            valid_types[: args.types],
+            days=args.days,
+            access_token="token",
+            client=client,
+            base_url=args.base_url,
+            validate=args.validate,
+            batch_size=args.batch_size or None,
+        )
+        seconds = time.perf_counter() - start
+        rows = sum(
+            con.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+            for table in valid_types[: args.types]
+        )
+        client.close()
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({"seconds": seconds, "rows": rows, "peak": peak * scale}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--types", type=int, default=4)
+    parser.add_argument("--days", type=int, default=17)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--validate", default="none")
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.base_url:
+        load(args)
+        return
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("stub_server.py"))]
+        + ["--port", str(port)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    server.stdout.readline()
+    base_url = f"http://127.0.0.1:{port}/kbyg/spots/forecasts"
+
+    print(
+        f"{args.types} types x {args.days} days, validate={args.validate},"
+        f" batch size {args.batch_size}\n"
+    )
+    print(
+        f"{'spots':>6}{'load':>8}{'rows':>10}{'seconds':>9}{'rows/s':>10}{'peak MB':>9}"
+    )
+    try:
+        for spots in args.spots:
+            for name, batch_size in [("insert", 0), ("arrow", args.batch_size)]:
+                child = subprocess.run(
+                    [sys.executable, __file__, "--base-url", base_url]
+                    + ["--spots", str(spots), "--types", str(args.types)]
+                    + ["--days", str(args.days), "--validate", args.validate]
+                    + ["--batch-size", str(batch_size)],
+                    capture_output=True,
+                    text=True,
+                )
+                if child.returncode:
+                    sys.exit(child.stderr)
+                result = json.loads(child.stdout.splitlines()[-1])
+                print(
+                    f"{spots:>6}{name:>8}{result['rows']:>10}{result['seconds']:>9.2f}"
+                    f"{result['rows'] / result['seconds']:>10,.0f}"
+                    f"{result['peak'] / 2**20:>9.0f}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
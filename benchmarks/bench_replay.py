@@ -0,0 +1,111 @@
+"""
+Time to load forecasts from the API versus from recorded captures.
+
+Records --runs runs of a report against a stand-in API that answers after
+--latency seconds, like the real one, into a CaptureStore. Then loads the
+latest run again by replaying it through the client, and reloads every run
+into a warehouse with replay_history. Replays never wait on the network, so
+they are limited by reading, decompressing and parsing the captures.
+
+    python benchmarks/bench_replay.py --spots 50 --runs 5 --latency 0.2
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from stub_server import StubHandler, StubServer
+
+from duckdive.api import valid_types
+from duckdive.captures import CaptureStore, replay_history
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report
+
+
+def slow_handler(latency: float) -> type:
+    """
+    Return a StubHandler answering every request after latency seconds.
+    """
+
+    def do_GET(self):
+        time.sleep(latency)
+        StubHandler.do_GET(self)
+
+    return type("SlowHandler", (StubHandler,), {"do_GET": do_GET, "payloads": {}})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, default=50)
+    parser.add_argument("--types", type=int, default=4)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("--validate", default="sample")
+    args = parser.parse_args()
+
+    spot_ids = [f"spot{i:04d}" for i in range(args.spots)]
+    forecast_types = valid_types[: args.types]
+    total = len(spot_ids) * len(forecast_types)
+    options = dict(days=args.days, max_workers=args.workers, validate=args.validate)
+    print(
+        f"{total} forecasts per run ({args.spots} spots x {args.types} types),"
+        f" {args.latency * 1000:.0f} ms API latency, {args.workers} workers\n"
+    )
+    print(f"{'load':<22}{'forecasts':>10}{'seconds':>9}{'forecasts/s':>13}")
+
+    def show(name: str, forecasts: int, seconds: float) -> None:
+        print(f"{name:<22}{forecasts:>10}{seconds:>9.2f}{forecasts / seconds:>13.1f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "captures.duckdb")
+        with StubServer(handler=slow_handler(args.latency)) as server:
+            seconds = 0.0
+            for _ in range(args.runs):
+                with CaptureStore(path) as captures:
+                    client = SurflineClient(
+                        transport="requests", pool_size=args.workers, capture=captures
+                    )
+                    start = time.perf_counter()
+                    fetch_report(
+                        spot_ids,
+                        forecast_types,
+                        client=client,
+                        base_url=server.base_url,
+                        **options,
+                    )
+                    seconds += time.perf_counter() - start
+                    client.close()
+            show("API, recording", total * args.runs, seconds)
+
+        with CaptureStore(path, replay=True) as captures:
+            client = SurflineClient(capture=captures)
+            start = time.perf_counter()
+            fetch_report(spot_ids, forecast_types, client=client, **options)
+            show("replay, latest run", total, time.perf_counter() - start)
+            client.close()
+
+            start = time.perf_counter()
+            runs = replay_history(
+                captures,
+                os.path.join(directory, "warehouse.duckdb"),
+                validate=args.validate,
+            )
+            replayed = sum(run.captures for run in runs)
+            show("replay_history", replayed, time.perf_counter() - start)
+
+            stored, raw = captures.con.execute(
+                "SELECT sum(octet_length(body)), sum(bytes) FROM captures"
+            ).fetchone()
+        print(
+            f"\n{raw / 2**20:.1f} MB of responses stored in {stored / 2**20:.1f} MB"
+            f" ({raw / stored:.1f}x), {os.path.getsize(path) / 2**20:.1f} MB on disk"
+        )
+
+
+if __name__ == "__main__":
+    main()
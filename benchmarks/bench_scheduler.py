@@ -0,0 +1,105 @@
+"""
+Report fetches against a throttling stand-in API, with and without the
+RequestScheduler (token-bucket rate limit, adaptive concurrency and retries
+with backoff).
+
+The stub accepts --server-rate requests per second and answers 429 with a
+Retry-After header beyond that, plus random 503s at --error-rate. Without a
+scheduler every throttled request is a failed forecast; with one, the report
+should complete with few throttled attempts.
+
+    python benchmarks/bench_scheduler.py --spots 20 --server-rate 20
+    python benchmarks/bench_scheduler.py --rate 15 --error-rate 0.1
+"""
+
+import argparse
+import time
+
+from stub_server import StubServer, throttling_handler
+
+from duckdive.api import valid_types
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report
+from duckdive.scheduler import RequestScheduler
+
+
+def run(args, scheduler) -> dict:
+    handler = throttling_handler(
+        args.server_rate, error_rate=args.error_rate, retry_after=1, seed=0
+    )
+    results = []
+    with StubServer(handler=handler) as server:
+        client = SurflineClient(
+            transport=args.transport, pool_size=args.workers, scheduler=scheduler
+        )
+        start = time.perf_counter()
+        fetch_report(
+            [f"spot{i:03d}" for i in range(args.spots)],
+            valid_types[: args.types],
+            days=args.days,
+            max_workers=args.workers,
+            client=client,
+            base_url=server.base_url,
+            validate="none",
+            on_result=results.append,
+        )
+        seconds = time.perf_counter() - start
+        client.close()
+
+    return {
+        "succeeded": sum(not r.error for r in results),
+        "failed": sum(bool(r.error) for r in results),
+        "attempts": sum(r.attempts for r in results),
+        "throttled": handler.stats["throttled"],
+        "server errors": handler.stats["errors"],
+        "seconds": seconds,
+        "concurrency": scheduler.concurrency.limit if scheduler else args.workers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, default=20)
+    parser.add_argument("--types", type=int, default=4)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("-w", "--workers", type=int, default=16)
+    parser.add_argument("--server-rate", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument(
+        "--rate", type=float, default=18, help="Scheduler requests per second"
+    )
+    parser.add_argument("--retries", type=int, default=6)
+    parser.add_argument("--transport", default="requests")
+    args = parser.parse_args()
+
+    total = args.spots * args.types
+    print(
+        f"{total} requests, {args.workers} workers, server allows {args.server_rate:g}/s"
+        f" with {args.error_rate:.0%} 503s\n"
+    )
+    runs = {
+        "no scheduler": None,
+        "scheduler": RequestScheduler(
+            rate=args.rate,
+            max_retries=args.retries,
+            base_delay=0.2,
+            max_concurrency=args.workers,
+        ),
+    }
+    print(
+        f"{'':<14}{'ok':>6}{'failed':>8}{'attempts':>10}{'429s':>7}{'503s':>7}"
+        f"{'seconds':>9}{'limit':>7}"
+    )
+    for label, scheduler in runs.items():
+        r = run(args, scheduler)
+        print(
+            f"{label:<14}{r['succeeded']:>6}{r['failed']:>8}{r['attempts']:>10}"
+            f"{r['throttled']:>7}{r['server errors']:>7}{r['seconds']:>9.2f}"
+            f"{r['concurrency']:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Requests per second of duckdive serve with concurrent readers, with and
+without the result cache, and how long a writer waits for the warehouse
+while they read.
+
+Builds a warehouse of --spots spots from the stand-in API, then starts the
+server in its own process, as in production. Client threads send a mix of
+--queries distinct /forecasts requests, first with the cache disabled and
+then enabled. During a third run a Watcher in this process polls the
+warehouse --polls times: each poll waits for the server to hand over the
+file, and the cache starts over after every commit.
+
+    python benchmarks/bench_serve.py --spots 50 --clients 8 --seconds 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from stub_server import StubServer
+
+from duckdive.watch import Watcher
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(database: str, cache_entries: int, pool_size: int) -> tuple:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-c", "from duckdive import app; app()", "serve"]
+        + ["--duckdb", database, "--port", str(port)]
+        + ["--cache-entries", str(cache_entries), "--pool-size", str(pool_size)],
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    process.stdout.readline()
+    return process, f"http://127.0.0.1:{port}"
+
+
+def hammer(urls: list, clients: int, seconds: float) -> dict:
+    """
+    Send the urls round-robin from clients threads for seconds seconds.
+    """
+    stats = {"ok": 0, "hit": 0, "busy": 0, "latency": 0.0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(offset: int) -> None:
+        index = offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urls[index % len(urls)]) as response:
+                    response.read()
+                    hit = response.headers["X-Cache"] == "hit"
+                busy = False
+            except urllib.error.HTTPError as e:
+                if e.code != 503:
+                    raise
+                hit, busy = False, True
+            with lock:
+                stats["ok"] += not busy
+                stats["busy"] += busy
+                stats["hit"] += hit
+                stats["latency"] += time.perf_counter() - start
+            index += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def poll(spot_ids: list, options: dict) -> float:
+    """
+    Poll the wind forecasts of every spot into the warehouse once, like a
+    running duckdive watch, and return the seconds it took.
+    """
+    start = time.perf_counter()
+    watcher = Watcher(spot_ids, ["wind"], **options)
+    watcher.run(max_polls=1)
+    watcher.close()
+    return time.perf_counter() - start
+
+
+def write(spot_ids: list, options: dict, polls: int, seconds: float, waits: list):
+    for _ in range(polls):
+        time.sleep(seconds / (polls + 1))
+        waits.append(poll(spot_ids, options))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--polls", type=int, default=3)
+    args = parser.parse_args()
+
+    spot_ids = [f"spot{i:04d}" for i in range(args.spots)]
+    formats = ["json", "csv", "arrow"]
+    print(
+        f"{args.spots} spots, {args.clients} clients, pool of {args.pool_size},"
+        f" {args.queries} distinct queries\n"
+    )
+    print(f"{'run':<16}{'requests':>9}{'req/s':>8}{'ms/req':>8}{'hits':>7}{'503s':>6}")
+
+    with tempfile.TemporaryDirectory() as directory, StubServer() as api:
+        database = str(Path(directory) / "serve.duckdb")
+        options = dict(database=database, transport="requests", base_url=api.base_url)
+        watcher = Watcher(spot_ids, ["wave", "wind"], **options)
+        watcher.run(max_polls=2)
+        watcher.close()
+        alone = poll(spot_ids, options)
+
+        # The stand-in API's forecasts start on 2024-09-28
+        urls = [
+            f"/forecasts/{['wave', 'wind'][i % 2]}?spot_id={spot_ids[i % args.spots]}"
+            f"&from=2024-09-28&format={formats[i % 3]}"
+            for i in range(args.queries)
+        ]
+        for name, cache_entries, polls in [
+            ("no cache", 0, 0),
+            ("cache", 256, 0),
+            ("cache + writer", 256, args.polls),
+        ]:
+            server, base_url = start_server(database, cache_entries, args.pool_size)
+            waits = []
+            writer = threading.Thread(
+                target=write, args=(spot_ids, options, polls, args.seconds, waits)
+            )
+            try:
+                writer.start()
+                stats = hammer(
+                    [base_url + url for url in urls], args.clients, args.seconds
+                )
+                writer.join()
+            finally:
+                server.terminate()
+                server.wait()
+            requests = stats["ok"] + stats["busy"]
+            print(
+                f"{name:<16}{requests:>9}{requests / args.seconds:>8.0f}"
+                f"{stats['latency'] / requests * 1000:>8.1f}"
+                f"{stats['hit'] / requests:>7.0%}{stats['busy']:>6}"
+            )
+            if waits:
+                print(
+                    f"{'':<16}{len(waits)} polls took"
+                    f" {', '.join(f'{wait:.2f}' for wait in waits)} s"
+                    f" ({alone:.2f} s without readers)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Throughput of a backfill into a warehouse with ingest_sharded, as the spots
+are split across more worker processes.
+
+The stand-in API runs in its own process, so serving payloads does not
+compete with the client for the GIL. Each run fetches every --types forecast
+for --spots spots into a fresh warehouse; with --validate full every record
+is validated, which makes ingestion CPU-bound. Speedup is relative to one
+shard and should stay close to the shard count up to the number of cores.
+
+    python benchmarks/bench_shards.py --spots 200 --shards 1 2 4 8
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from duckdive.api import valid_types
+from duckdive.shards import ingest_sharded
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, default=200)
+    parser.add_argument("--types", type=int, default=4)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("-w", "--workers", type=int, default=8, help="Per shard")
+    parser.add_argument("--validate", default="full")
+    parser.add_argument("--transport", default="requests")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("stub_server.py"))]
+        + ["--port", str(port)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    server.stdout.readline()
+    base_url = f"http://127.0.0.1:{port}/kbyg/spots/forecasts"
+
+    spot_ids = [f"spot{i:04d}" for i in range(args.spots)]
+    forecast_types = valid_types[: args.types]
+    total = len(spot_ids) * len(forecast_types)
+    print(
+        f"{total} forecasts ({args.spots} spots x {args.types} types),"
+        f" validate={args.validate}, {os.cpu_count()} CPUs\n"
+    )
+    print(f"{'shards':>6}{'seconds':>9}{'merge s':>9}{'forecasts/s':>13}{'speedup':>9}")
+    baseline = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for shards in args.shards:
+                result = ingest_sharded(
+                    spot_ids,
+                    forecast_types,
+                    database=os.path.join(directory, f"shards{shards}.duckdb"),
+                    shards=shards,
+                    days=args.days,
+                    max_workers=args.workers,
+                    transport=args.transport,
+                    validate=args.validate,
+                    cache=False,
+                    base_url=base_url,
+                )
+                failed = [shard.error for shard in result.shards if shard.error]
+                if failed:
+                    sys.exit(f"Shard failed: {failed[0]}")
+                baseline = baseline or result.seconds
+                print(
+                    f"{shards:>6}{result.seconds:>9.2f}{result.merge_seconds:>9.2f}"
+                    f"{total / result.seconds:>13.1f}{baseline / result.seconds:>8.2f}x"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Offline benchmark suite for the forecast pipeline, run against the local
+stand-in server for all 8 forecast types.
+
+Every scenario (spot count x days x interval) replays what the `forecast`
+command does once per spot and forecast type, timing each stage:
+
+    connect    duckdb.connect()
+    extension  client setup: http_client INSTALL/LOAD, or the requests session
+    http       GET through the client's transport
+    parse      JSON parse of the body (forecast type detection in DuckDB)
+    validate   pydantic validation (--validate mode)
+    table      table creation from the body
+    format     format_dataframe() of the table
+    render     rich table rendering (to an in-memory console)
+
+`query_surfline` is also timed end to end on the same client. Results are
+written to benchmarks/results/<timestamp>.json and compared against the
+previous run (or --compare FILE), flagging stages that slowed down.
+
+    python benchmarks/bench_suite.py --transport requests
+    python benchmarks/bench_suite.py --spots 1 10 --days 1 6 --intervals 1 3
+    python benchmarks/bench_suite.py --fixtures fixtures/ --compare results/base.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+
+import duckdb
+from rich.console import Console
+from stub_server import StubServer
+
+from duckdive import SurflineClient, construct_surfline_api_url, valid_types
+from duckdive.ingest import detect_forecast_type, insert_json, validate_body
+from duckdive.query_surfline import query_surfline
+from duckdive.util import create_pretty_table, format_dataframe
+
+results_dir = Path(__file__).parent / "results"
+
+stages = [
+    "connect",
+    "extension",
+    "http",
+    "parse",
+    "validate",
+    "table",
+    "format",
+    "render",
+]
+
+
+class Timer:
+    """Accumulate wall-clock time per stage across a scenario."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in stages}
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.samples[stage].append((now - self._last) * 1000)
+        self._last = now
+
+
+def run_forecast(timer, url, transport, validate):
+    """
+    Run one `forecast` command's worth of work for a url, lapping each stage.
+    """
+    timer.start()
+    con = duckdb.connect()
+    timer.lap("connect")
+    client = SurflineClient(transport=transport, con=con)
+    timer.lap("extension")
+    status, reason, body = client.fetch(url)
+    if status != 200:
+        raise RuntimeError(f"Stub server returned {status} {reason} for {url}")
+    timer.lap("http")
+    forecast_type = detect_forecast_type(con, body)
+    timer.lap("parse")
+    validate_body(con, body, forecast_type, validate)
+    timer.lap("validate")
+    insert_json(con, "surfline_data", body, forecast_type, replace=True)
+    timer.lap("table")
+    df = format_dataframe(con.execute("SELECT * FROM surfline_data").df())
+    timer.lap("format")
+    Console(file=io.StringIO(), width=200).print(create_pretty_table(df))
+    timer.lap("render")
+    client.close()
+    con.close()
+
+
+def run_scenario(base_url, spots, days, interval_hours, args):
+    """
+    Time every stage of the forecast pipeline for one scenario, per forecast type.
+    """
+    scenario = {"spots": spots, "days": days, "interval_hours": interval_hours}
+    types = {}
+    for forecast_type in args.types:
+        urls = [
+            construct_surfline_api_url(
+                spot_id=f"spot{i}",
+                days=days,
+                interval_hours=interval_hours,
+                forecast_type=forecast_type,
+                base_url=base_url,
+            )
+            for i in range(spots)
+        ]
+        timer = Timer()
+        end_to_end = []
+        for _ in range(args.repeat):
+            for url in urls:
+                start = time.perf_counter()
+                run_forecast(timer, url, args.transport, args.validate)
+                end_to_end.append((time.perf_counter() - start) * 1000)
+
+        client = SurflineClient(transport=args.transport)
+        query = []
+        # query_surfline echoes a line per call, which would drown the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(args.repeat):
+                for url in urls:
+                    start = time.perf_counter()
+                    query_surfline(url, client=client, validate=args.validate)
+                    query.append((time.perf_counter() - start) * 1000)
+        client.close()
+
+        types[forecast_type] = {
+            "stages": {
+                stage: statistics.median(samples)
+                for stage, samples in timer.samples.items()
+            },
+            "end_to_end": statistics.median(end_to_end),
+            "query_surfline": statistics.median(query),
+        }
+    return {**scenario, "types": types}
+
+
+def scenario_key(scenario):
+    return (scenario["spots"], scenario["days"], scenario["interval_hours"])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_scenario(scenario):
+    print(
+        f"\n{scenario['spots']} spots x {scenario['days']} days,"
+        f" every {scenario['interval_hours']}h (median ms per request)"
+    )
+    print(
+        f"{'type':<11}"
+        + "".join(f"{stage:>10}" for stage in stages)
+        + f"{'total':>10}{'query':>10}"
+    )
+    for forecast_type, timings in scenario["types"].items():
+        print(
+            f"{forecast_type:<11}"
+            + "".join(f"{timings['stages'][stage]:10.2f}" for stage in stages)
+            + f"{timings['end_to_end']:10.2f}{timings['query_surfline']:10.2f}"
+        )
+
+
+def compare(current, baseline, threshold):
+    """
+    Print the stages that got slower than the baseline run by more than threshold.
+    """
+    previous = {scenario_key(s): s for s in baseline["scenarios"]}
+    regressions = []
+    for scenario in current["scenarios"]:
+        before = previous.get(scenario_key(scenario))
+        if before is None:
+            continue
+        for forecast_type, timings in scenario["types"].items():
+            old = before["types"].get(forecast_type)
+            if old is None:
+                continue
+            pairs = [
+                (stage, timings["stages"][stage], old["stages"][stage])
+                for stage in stages
+            ]
+            pairs += [
+                ("end_to_end", timings["end_to_end"], old["end_to_end"]),
+                ("query_surfline", timings["query_surfline"], old["query_surfline"]),
+            ]
+            for stage, now, then in pairs:
+                # Ignore sub-millisecond stages whose ratios are mostly noise
+                if then > 0 and now > 0.5 and now / then > 1 + threshold:
+                    regressions.append(
+                        (scenario_key(scenario), forecast_type, stage, then, now)
+                    )
+
+    print(f"\nCompared with {baseline['started_at']} ({baseline.get('commit')})")
+    if not regressions:
+        print(f"No stage slowed down by more than {threshold:.0%}")
+        return
+    for (spots, days, interval), forecast_type, stage, then, now in regressions:
+        print(
+            f"  {spots} spots x {days}d/{interval}h {forecast_type:<11} {stage:<15}"
+            f" {then:8.2f} -> {now:8.2f} ms ({now / then - 1:+.0%})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--spots", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("-t", "--types", nargs="+", default=valid_types)
+    parser.add_argument("--transport", default="duckdb")
+    parser.add_argument("--validate", default="sample")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--fixtures", help="Directory of recorded {type}.json responses"
+    )
+    parser.add_argument("--compare", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    started_at = datetime.now()
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "transport": args.transport,
+        "validate": args.validate,
+        "repeat": args.repeat,
+        "fixtures": args.fixtures,
+        "scenarios": [],
+    }
+
+    with StubServer(fixtures=args.fixtures) as server:
+        for spots, days, interval_hours in product(
+            args.spots, args.days, args.intervals
+        ):
+            scenario = run_scenario(server.base_url, spots, days, interval_hours, args)
+            report["scenarios"].append(scenario)
+            print_scenario(scenario)
+
+    previous = sorted(results_dir.glob("*.json"))
+    baseline = (
+        Path(args.compare) if args.compare else (previous[-1] if previous else None)
+    )
+    if baseline is not None:
+        compare(report, json.loads(baseline.read_text()), args.threshold)
+
+    if not args.no_save:
+        results_dir.mkdir(exist_ok=True)
+        path = results_dir / f"{started_at:%Y%m%dT%H%M%S}.json"
+        path.write_text(json.dumps(report, indent=2))
+        print(f"\nResults saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
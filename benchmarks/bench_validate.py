@@ -0,0 +1,90 @@
+"""
+Records validated per second by the previous full validation path,
+FullResponse(**json.loads(body)) with a model_dump of every record, versus the
+batch TypeAdapter of validate_records in strict and lenient mode. The lenient
+run corrupts --bad-rate of the records, which are rejected rather than
+failing the body.
+
+    python benchmarks/bench_validate.py --days 17 -t wave -t wind
+"""
+
+import argparse
+import json
+import random
+import time
+
+from stub_server import make_payload
+
+from duckdive.api import valid_types
+from duckdive.models import FullResponse
+from duckdive.validation import validate_records
+
+
+def pydantic_models(body: str, forecast_type: str) -> int:
+    parsed = FullResponse(**json.loads(body)["data"])
+    records = [item.model_dump() for item in getattr(parsed, forecast_type)]
+    return len(records)
+
+
+def strict(body: str, forecast_type: str) -> int:
+    return validate_records(body, forecast_type).records
+
+
+def lenient(body: str, forecast_type: str) -> int:
+    return validate_records(body, forecast_type, lenient=True).records
+
+
+def corrupt(body: str, forecast_type: str, rate: float) -> str:
+    """
+    Replace the first field of a fraction of the records with a string.
+    """
+    data = json.loads(body)
+    rng = random.Random(0)
+    for record in data["data"][forecast_type]:
+        if rng.random() < rate:
+            record[next(iter(record))] = "corrupt"
+    return json.dumps(data)
+
+
+def records_per_second(fn, body: str, forecast_type: str, seconds: float) -> float:
+    records, calls = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds or not calls:
+        records += fn(body, forecast_type)
+        calls += 1
+    return records / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-t", "--types", action="append", choices=valid_types)
+    parser.add_argument("--days", type=int, default=17)
+    parser.add_argument("--bad-rate", type=float, default=0.01)
+    parser.add_argument(
+        "--seconds", type=float, default=1.0, help="Time spent per measurement"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'type':<12}{'records':>8}{'models rec/s':>14}{'strict rec/s':>14}"
+        f"{'speedup':>9}{'lenient rec/s':>15}"
+    )
+    for forecast_type in args.types or valid_types:
+        body = make_payload(forecast_type, args.days, 1).decode()
+        count = strict(body, forecast_type)
+        baseline = records_per_second(
+            pydantic_models, body, forecast_type, args.seconds
+        )
+        batch = records_per_second(strict, body, forecast_type, args.seconds)
+        bad = corrupt(body, forecast_type, args.bad_rate)
+        rejecting = records_per_second(lenient, bad, forecast_type, args.seconds)
+        print(
+            f"{forecast_type:<12}{count:>8}{baseline:>14,.0f}{batch:>14,.0f}"
+            f"{batch / baseline:>8.1f}x{rejecting:>15,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
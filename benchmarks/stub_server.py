@@ -0,0 +1,343 @@
+"""
+Local stand-in for the Surfline forecasts API, used by the benchmarks.
+
+Serves synthetic payloads shaped like the real responses for every forecast
+type under /kbyg/spots/forecasts/{type}, honoring the days and intervalHours
+query parameters. Recorded responses can be served instead by pointing
+--fixtures at a directory of {type}.json files saved from the real API.
+With --rate-limit the server throttles like the real API under load,
+answering 429 with a Retry-After header, and --error-rate adds random 503s.
+
+    python benchmarks/stub_server.py --port 8765
+    python benchmarks/stub_server.py --fixtures fixtures/
+    python benchmarks/stub_server.py --rate-limit 20 --error-rate 0.05
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+START = 1727481600  # 2024-09-28 00:00 UTC
+
+
+def make_records(
+    forecast_type: str, days: int = 3, interval_hours: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Build deterministic synthetic records for a forecast type.
+
+    :param forecast_type: One of the Surfline forecast types
+    :param days: Number of forecast days
+    :param interval_hours: Interval hours between records
+    :return: List of record dicts
+    """
+    hours = range(0, days * 24, max(int(interval_hours), 1))
+    day_starts = [START + day * 86400 for day in range(days)]
+
+    def swell(i: int, n: int) -> Dict[str, Any]:
+        return {
+            "height": round(1 + math.sin(i / 6 + n), 2),
+            "period": 8 + n * 2,
+            "impact": 0.5,
+            "power": 10.0 + n,
+            "direction": 200 + n * 30,
+            "directionMin": 190 + n * 30,
+            "optimalScore": n % 3,
+        }
+
+    if forecast_type == "wave":
+        return [
+            {
+                "timestamp": START + h * 3600,
+                "probability": 100,
+                "surf": {"min": 1.0, "max": round(2 + math.sin(h / 6), 2)},
+                "power": 20.5,
+                "swells": [swell(h, n) for n in range(6)],
+            }
+            for h in hours
+        ]
+    if forecast_type == "swells":
+        return [
+            {
+                "timestamp": START + h * 3600,
+                "probability": 100,
+                "power": 20.5,
+                "swells": [swell(h, n) for n in range(6)],
+            }
+            for h in hours
+        ]
+    if forecast_type == "wind":
+        return [
+            {
+                "timestamp": START + h * 3600,
+                "speed": round(5 + 3 * math.sin(h / 4), 2),
+                "gust": round(8 + 3 * math.sin(h / 4), 2),
+                "direction": (h * 15) % 360,
+                "directionType": "Onshore" if h % 2 else "Offshore",
+                "optimalScore": h % 3,
+            }
+            for h in hours
+        ]
+    if forecast_type == "tides":
+        # Tides are irregular: hourly NORMAL points plus HIGH/LOW extremes
+        records = [
+            {
+                "timestamp": START + h * 3600,
+                "type": "NORMAL",
+                "height": round(2 + 2 * math.sin(h / 2), 2),
+            }
+            for h in hours
+        ]
+        records += [
+            {
+                "timestamp": START + int(m * 6.2 * 3600) + 1234,
+                "type": "HIGH" if m % 2 else "LOW",
+                "height": 4.0 if m % 2 else 0.1,
+            }
+            for m in range(days * 4)
+        ]
+        return sorted(records, key=lambda r: r["timestamp"])
+    if forecast_type == "weather":
+        return [
+            {
+                "timestamp": START + h * 3600,
+                "temperature": round(62 + 5 * math.sin(h / 12), 1),
+                "pressure": 1012.0,
+                "condition": "CLEAR" if h % 5 else "MOSTLY_CLOUDY",
+            }
+            for h in hours
+        ]
+    if forecast_type == "rating":
+        return [
+            {"timestamp": START + h * 3600, "rating": {"key": "FAIR", "value": 3.0}}
+            for h in hours
+        ]
+    if forecast_type == "sunlight":
+        return [
+            {
+                "midnight": day,
+                "dawn": day + 6 * 3600,
+                "sunrise": day + 6 * 3600 + 1800,
+                "sunset": day + 18 * 3600 + 1800,
+                "dusk": day + 19 * 3600,
+            }
+            for day in day_starts
+        ]
+    if forecast_type == "conditions":
+        observation = {
+            "observation": "Clean lines",
+            "rating": "FAIR",
+            "minHeight": 2,
+            "maxHeight": 3,
+            "plus": False,
+            "humanRelation": "Waist to chest",
+            "occasionalHeight": None,
+        }
+        return [
+            {
+                "timestamp": day,
+                "forecastDay": "2024-09-28",
+                "forecaster": {"name": "Stub Forecaster", "avatar": None},
+                "human": True,
+                "observation": "Small mix of swells.",
+                "am": observation,
+                "pm": observation,
+            }
+            for day in day_starts
+        ]
+    raise ValueError(f"Unknown forecast type {forecast_type}")
+
+
+def make_payload(forecast_type: str, days: int = 3, interval_hours: int = 1) -> bytes:
+    """
+    Build the full JSON response body for a forecast type.
+    """
+    body = {
+        "associated": {"units": {"waveHeight": "FT", "windSpeed": "KTS"}},
+        "data": {forecast_type: make_records(forecast_type, days, interval_hours)},
+    }
+    return json.dumps(body).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    payloads: Dict[Any, bytes] = {}
+    fixtures: Optional[Path] = None
+
+    def load_payload(self, forecast_type: str, days: int, interval_hours: int) -> bytes:
+        """
+        Return a recorded {type}.json fixture if there is one, else a synthetic payload.
+        """
+        if self.fixtures is not None:
+            path = self.fixtures / f"{forecast_type}.json"
+            if path.exists():
+                return path.read_bytes()
+        return make_payload(forecast_type, days, interval_hours)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        forecast_type = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+        params = parse_qs(parsed.query)
+        days = int(params.get("days", ["3"])[0])
+        interval_hours = int(float(params.get("intervalHours", ["1"])[0]))
+
+        key = (forecast_type, days, interval_hours)
+        if key not in self.payloads:
+            try:
+                self.payloads[key] = self.load_payload(*key)
+            except ValueError:
+                self.send_error(404)
+                return
+
+        body = self.payloads[key]
+        etag = f'"{hash(body) & 0xFFFFFFFF:08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def throttling_handler(
+    rate: float,
+    burst: Optional[float] = None,
+    error_rate: float = 0.0,
+    retry_after: float = 1.0,
+    seed: Optional[int] = None,
+    base: type = StubHandler,
+) -> type:
+    """
+    Build a handler class that rate limits requests with a token bucket shared
+    by every connection, answering 429 with a Retry-After header once the
+    bucket is empty, and fails a random fraction of the rest with 503.
+
+    :param rate: Requests per second the server accepts on average
+    :param burst: Requests accepted in a burst (defaults to rate)
+    :param error_rate: Fraction of accepted requests answered with 503
+    :param retry_after: Seconds sent in the Retry-After header of 429s
+    :param seed: Seed of the random 503s
+    :param base: Handler class to throttle
+    """
+    lock = threading.Lock()
+    capacity = burst or rate
+    state = {"tokens": capacity, "updated": time.monotonic()}
+    rng = random.Random(seed)
+
+    def admit() -> bool:
+        with lock:
+            now = time.monotonic()
+            state["tokens"] = min(
+                capacity, state["tokens"] + (now - state["updated"]) * rate
+            )
+            state["updated"] = now
+            if state["tokens"] < 1:
+                return False
+            state["tokens"] -= 1
+            return True
+
+    class ThrottlingHandler(base):
+        # Counters of the responses sent, shared by every connection
+        stats = {"ok": 0, "throttled": 0, "errors": 0}
+
+        def do_GET(self):
+            if not admit():
+                with lock:
+                    self.stats["throttled"] += 1
+                self.send_response(429)
+                self.send_header("Retry-After", f"{retry_after:g}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with lock:
+                failed = rng.random() < error_rate
+                self.stats["errors" if failed else "ok"] += 1
+            if failed:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            super().do_GET()
+
+    return ThrottlingHandler
+
+
+class StubServer:
+    """
+    Run the stand-in server on a background thread.
+
+    Usage:
+        with StubServer() as server:
+            url = construct_surfline_api_url(base_url=server.base_url)
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        handler: Optional[type] = None,
+        fixtures: Optional[str] = None,
+    ):
+        handler = handler or StubHandler
+        if fixtures is not None:
+            # Subclass so fixtures and their payload cache stay per server
+            handler = type(
+                "FixtureHandler",
+                (handler,),
+                {"fixtures": Path(fixtures), "payloads": {}},
+            )
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/kbyg/spots/forecasts"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--fixtures", help="Directory of recorded {type}.json responses"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, help="Requests per second before answering 429"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction answered with 503"
+    )
+    args = parser.parse_args()
+
+    handler = None
+    if args.rate_limit or args.error_rate:
+        handler = throttling_handler(args.rate_limit or 1e9, error_rate=args.error_rate)
+    with StubServer(args.port, handler=handler, fixtures=args.fixtures) as server:
+        print(f"Serving stand-in Surfline API at {server.base_url}")
+        server.thread.join()
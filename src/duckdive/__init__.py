@@ -1,20 +1,160 @@
-import json
+from contextlib import contextmanager
+from importlib import import_module
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-import duckdb
-import pandas as pd
 import typer
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from .api import construct_surfline_api_url
+from . import metrics
+from .api import construct_surfline_api_url, valid_types
+from .cache import ResponseCache
+from .constants import (
+    parquet_compressions,
+    transports,
+    validation_modes,
+    warehouse_layouts,
+)
 from .query_surfline import query_surfline
-from .util import create_pretty_table
+
+if TYPE_CHECKING:
+    from .captures import CaptureStore
 
 app = typer.Typer()
-console = Console()
+
+# Public names re-exported from modules that pull in duckdb, pandas, pydantic,
+# requests or rich. They are imported on first access so that starting the CLI
+# (or failing on a bad option) does not pay for dependencies it never uses.
+lazy_exports = {
+    "SurflineClient": "client",
+    "fetch_report": "engine",
+    "report_query": "engine",
+    "create_snapshot": "snapshot",
+    "fetch_snapshot": "snapshot",
+    "fetch": "relations",
+    "forecast_relation": "relations",
+    "export_csv": "export",
+    "export_parquet": "export",
+    "attach_warehouse": "warehouse",
+    "upsert_forecast": "warehouse",
+    "compact_warehouse": "compaction",
+    "ingest_sharded": "shards",
+    "CaptureStore": "captures",
+    "replay_history": "captures",
+    "ForecastServer": "serve",
+    "forecast_asof": "asof",
+    "forecast_evolution": "asof",
+    "forecast_skill": "asof",
+    "create_pretty_table": "util",
+    "format_dataframe": "util",
+    "load_spot_ids": "util",
+    "spot_dict": "util",
+}
+
+
+def __getattr__(name: str):
+    if name in lazy_exports:
+        module = import_module(f".{lazy_exports[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_console():
+    """
+    Return the console the commands render to, importing rich on first use.
+    """
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+_console = None
+
+
+@contextmanager
+def fetch_progress(total: int):
+    """
+    Show a spinner counting completed forecast fetches, printing failures
+    above it. Yields the on_result callback to pass to the fetch.
+    """
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+    with Progress(
+        SpinnerColumn(), TextColumn("{task.description}"), console=get_console()
+    ) as progress:
+        task = progress.add_task(f"Fetching 0/{total} forecasts...", total=total)
+
+        def on_result(result):
+            if result.error:
+                attempts = "s" if result.attempts != 1 else ""
+                progress.console.print(
+                    f"[red]{result.forecast_type} for {result.spot_id} failed"
+                    f" after {result.attempts} attempt{attempts}: {result.error}"
+                )
+            elif result.rejects:
+                progress.console.print(
+                    f"[yellow]{len(result.rejects)} invalid {result.forecast_type}"
+                    f" records for {result.spot_id} quarantined: {result.rejects[0].error}"
+                )
+            progress.advance(task)
+            completed = int(progress.tasks[0].completed)
+            progress.update(
+                task, description=f"Fetching {completed}/{total} forecasts..."
+            )
+
+        yield on_result
+
+
+def select_spots(
+    spot_ids: Optional[List[str]],
+    region: Optional[str],
+    near: Optional[str],
+    radius_km: float,
+    registry: Optional[str],
+) -> List[str]:
+    """
+    Return the spots a command runs for (see spots.select_spot_ids), exiting
+    if --region / --near match no registered spot.
+    """
+    from .spots import select_spot_ids
+
+    try:
+        selected = select_spot_ids(spot_ids, region, near, radius_km, registry)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--near") from e
+    if not selected:
+        typer.echo("No registered spots match --region / --near.", err=True)
+        raise typer.Exit(1)
+    return selected
+
+
+def open_captures(
+    record: Optional[str], replay: Optional[str], as_of: Optional[str]
+) -> Optional["CaptureStore"]:
+    """
+    Open the CaptureStore of --record or --replay, or return None if neither is set.
+    """
+    if record and replay:
+        raise typer.BadParameter(
+            "--record and --replay are mutually exclusive", param_hint="--replay"
+        )
+    if as_of and not replay:
+        raise typer.BadParameter("--as-of needs --replay", param_hint="--as-of")
+    if not (record or replay):
+        return None
+    from .asof import parse_time
+    from .captures import CaptureStore
+
+    try:
+        as_of = parse_time(as_of) if as_of else None
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--as-of") from e
+    try:
+        return CaptureStore(replay or record, replay=bool(replay), as_of=as_of)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--replay") from e
 
 
 @app.command()
@@ -27,49 +167,1152 @@ def forecast(
     interval_hours: float = typer.Option(
         1, "-i", "--interval-hours", help="Interval hours for forecast"
     ),
+    resample: bool = typer.Option(
+        True,
+        "--resample/--no-resample",
+        help="Fetch hourly data once and resample coarser intervals locally",
+    ),
     max_heights: bool = typer.Option(
         True, "-m", "--max-heights", help="Include max heights in output"
     ),
     sds: bool = typer.Option(True, "-s", "--sds", help="Use LOTUS forecast engine"),
+    limit: Optional[int] = typer.Option(
+        5, "-n", "--limit", help="Rows per preview page"
+    ),
+    page: int = typer.Option(1, "--page", help="Page of the preview to show"),
+    columns: Optional[List[str]] = typer.Option(
+        None, "-c", "--columns", help="Columns to show (repeat or comma-separate)"
+    ),
     access_token: Optional[str] = typer.Option(
         None, "-a", "--access-token", help="Access token for premium data"
     ),
-    save_to_duckdb: bool = typer.Option(
-        False, "-d", "--save-to-duckdb", help="Save data to DuckDB"
+    duckdb_file: Optional[str] = typer.Option(
+        None, "-d", "--duckdb", help="Upsert the data into a DuckDB warehouse file"
+    ),
+    layout: str = typer.Option(
+        "versions",
+        "--layout",
+        help=f"Layout of new warehouse tables, one of {warehouse_layouts}",
     ),
     csv: Optional[str] = typer.Option(
         None, "--csv", help="Save the data to a local CSV file"
     ),
+    parquet: Optional[str] = typer.Option(
+        None, "--parquet", help="Append to a Hive-partitioned Parquet archive directory"
+    ),
+    parquet_compression: str = typer.Option(
+        "zstd",
+        "--parquet-compression",
+        help=f"Parquet compression, one of {parquet_compressions}",
+    ),
+    row_group_size: int = typer.Option(
+        122880, "--row-group-size", help="Rows per Parquet row group"
+    ),
+    cache: bool = typer.Option(
+        True, "--cache/--no-cache", help="Serve recent responses from the local cache"
+    ),
+    cache_ttl: Optional[float] = typer.Option(
+        None, "--cache-ttl", help="Cache TTL in seconds (defaults per forecast type)"
+    ),
+    validate: str = typer.Option(
+        "sample", "--validate", help=f"Record validation, one of {validation_modes}"
+    ),
+    retries: int = typer.Option(
+        4, "--retries", help="Retries of throttled, 5xx and failed requests"
+    ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every response into a capture store file"
+    ),
+    replay: Optional[str] = typer.Option(
+        None,
+        "--replay",
+        help="Serve every response from a capture store file instead of the API",
+    ),
+    as_of: Optional[str] = typer.Option(
+        None,
+        "--as-of",
+        help="With --replay, the latest captures fetched at or before this time",
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a breakdown of time spent per stage"
+    ),
+    metrics_json: Optional[str] = typer.Option(
+        None,
+        "--metrics-json",
+        help="Write run metrics as JSON to a file ('-' for stdout)",
+    ),
 ):
     """
     Query the Surfline API for forecast data.
     """
-    url = construct_surfline_api_url(
-        spot_id=spot_id,
+    with metrics.collect("forecast", profile, metrics_json):
+        # Coarser intervals are derived from the (cached) hourly response
+        resample_hours = interval_hours if resample and interval_hours > 1 else None
+        url = construct_surfline_api_url(
+            spot_id=spot_id,
+            days=days,
+            interval_hours=1 if resample_hours else interval_hours,
+            max_heights=max_heights,
+            sds=sds,
+            access_token=access_token,
+            forecast_type=forecast_type,
+        )
+
+        import duckdb
+
+        from .client import SurflineClient
+        from .export import export_csv, export_parquet
+        from .resample import resample_table
+        from .scheduler import RequestScheduler
+        from .util import project_columns, stream_pretty_table
+        from .warehouse import attach_warehouse, save_rejects, upsert_forecast
+
+        console = get_console()
+        captures = open_captures(record, replay, as_of)
+        client = SurflineClient(
+            cache=ResponseCache(ttl=cache_ttl) if cache else None,
+            scheduler=RequestScheduler(max_retries=retries),
+            capture=captures,
+        )
+        result = query_surfline(url, client=client, validate=validate)
+        if captures is not None:
+            captures.close()
+
+        if isinstance(result, duckdb.DuckDBPyConnection):
+            # The Parquet archive and the warehouse store the hourly records;
+            # the resampled copy is only shown and saved to CSV
+            shown = "surfline_data"
+            if resample_hours and resample_table(
+                result, forecast_type, resample_hours, shown, "surfline_resampled"
+            ):
+                shown = "surfline_resampled"
+
+            if csv:
+                # Export to CSV using DuckDB
+                export_csv(result, shown, csv)
+                typer.echo(f"Data saved to {csv}")
+
+            if parquet:
+                export_parquet(
+                    result,
+                    "surfline_data",
+                    parquet,
+                    forecast_type,
+                    spot_id=spot_id,
+                    compression=parquet_compression,
+                    row_group_size=row_group_size,
+                )
+                typer.echo(f"Data appended to the Parquet archive in {parquet}")
+
+            if duckdb_file:
+                attach_warehouse(result, duckdb_file)
+                inserted = upsert_forecast(
+                    result, forecast_type, spot_id=spot_id, layout=layout
+                )
+                typer.echo(
+                    f"{inserted} new or changed rows saved to the '{forecast_type}' table in {duckdb_file}"
+                )
+                rejected = save_rejects(result, spot_id=spot_id)
+                if rejected:
+                    typer.echo(
+                        f"{rejected} rejected records saved to the 'rejects' table"
+                    )
+
+            # Display one page of the preview, streamed from DuckDB
+            try:
+                query = project_columns(result, shown, columns)
+            except ValueError as e:
+                raise typer.BadParameter(str(e), param_hint="--columns") from e
+            table = stream_pretty_table(result, query, limit=limit, page=page)
+            with metrics.stage("render"):
+                console.print(table)
+        else:
+            typer.echo("No data was returned.", err=True)
+
+
+@app.command()
+def report(
+    spot_ids: Optional[List[str]] = typer.Option(
+        None, "-s", "--spot-ids", help="Surfline spot IDs"
+    ),
+    region: Optional[str] = typer.Option(
+        None, "--region", help="Use the registered spots of a region"
+    ),
+    near: Optional[str] = typer.Option(
+        None, "--near", help="Use the registered spots near a lat,lon coordinate"
+    ),
+    radius_km: float = typer.Option(30, "--radius-km", help="Radius of --near in km"),
+    registry: Optional[str] = typer.Option(
+        None, "--registry", help="Spot registry database (see duckdive spots)"
+    ),
+    days: int = typer.Option(3, help="Number of forecast days"),
+    interval_hours: float = typer.Option(
+        1, "-i", "--interval-hours", help="Interval hours for forecast"
+    ),
+    resample: bool = typer.Option(
+        True,
+        "--resample/--no-resample",
+        help="Fetch hourly data once and resample coarser intervals locally",
+    ),
+    types: Optional[List[str]] = typer.Option(
+        None, "-t", "--types", help="Forecast types to fetch"
+    ),
+    simplify: bool = typer.Option(
+        True, "--simplify/--no-simplify", help="Return simplified column subset"
+    ),
+    today: bool = typer.Option(
+        True, "--today/--no-today", help="Only include today's data (7am-8pm)"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "-n", "--limit", help="Rows per page of each table (all rows if unset)"
+    ),
+    page: int = typer.Option(1, "--page", help="Page of the preview to show"),
+    columns: Optional[List[str]] = typer.Option(
+        None,
+        "-c",
+        "--columns",
+        help="Columns to show (repeat or comma-separate)",
+    ),
+    max_workers: int = typer.Option(
+        8, "-w", "--max-workers", help="Maximum number of concurrent requests"
+    ),
+    transport: str = typer.Option(
+        "duckdb", "--transport", help=f"HTTP transport, one of {transports}"
+    ),
+    access_token: Optional[str] = typer.Option(
+        None, "-a", "--access-token", help="Access token for premium data"
+    ),
+    csv: Optional[str] = typer.Option(
+        None, "--csv", help="Save the report to local CSV files (one per type)"
+    ),
+    parquet: Optional[str] = typer.Option(
+        None, "--parquet", help="Append to a Hive-partitioned Parquet archive directory"
+    ),
+    parquet_compression: str = typer.Option(
+        "zstd",
+        "--parquet-compression",
+        help=f"Parquet compression, one of {parquet_compressions}",
+    ),
+    row_group_size: int = typer.Option(
+        122880, "--row-group-size", help="Rows per Parquet row group"
+    ),
+    duckdb_file: Optional[str] = typer.Option(
+        None, "--duckdb", help="Upsert the report into a DuckDB warehouse file"
+    ),
+    layout: str = typer.Option(
+        "versions",
+        "--layout",
+        help=f"Layout of new warehouse tables, one of {warehouse_layouts}",
+    ),
+    cache: bool = typer.Option(
+        True, "--cache/--no-cache", help="Serve recent responses from the local cache"
+    ),
+    cache_ttl: Optional[float] = typer.Option(
+        None, "--cache-ttl", help="Cache TTL in seconds (defaults per forecast type)"
+    ),
+    validate: str = typer.Option(
+        "sample", "--validate", help=f"Record validation, one of {validation_modes}"
+    ),
+    batch_size: int = typer.Option(
+        0,
+        "--batch-size",
+        help="Load records in Arrow batches of this many rows, needs pyarrow"
+        " (0 inserts each response on its own)",
+    ),
+    rate: float = typer.Option(
+        10, "--rate", help="Maximum average requests per second (0 for no limit)"
+    ),
+    retries: int = typer.Option(
+        4, "--retries", help="Retries of throttled, 5xx and failed requests"
+    ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every response into a capture store file"
+    ),
+    replay: Optional[str] = typer.Option(
+        None,
+        "--replay",
+        help="Serve every response from a capture store file instead of the API",
+    ),
+    as_of: Optional[str] = typer.Option(
+        None,
+        "--as-of",
+        help="With --replay, the latest captures fetched at or before this time",
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a breakdown of time spent per stage"
+    ),
+    metrics_json: Optional[str] = typer.Option(
+        None,
+        "--metrics-json",
+        help="Write run metrics as JSON to a file ('-' for stdout)",
+    ),
+):
+    """
+    Generate a surf report with multiple forecast types across multiple spots.
+    """
+    with metrics.collect("report", profile, metrics_json):
+        from .client import SurflineClient
+        from .engine import fetch_report, report_query
+        from .export import export_csv, export_parquet
+        from .resample import hourly_table
+        from .scheduler import RequestScheduler
+        from .util import stream_pretty_table
+        from .warehouse import attach_warehouse, save_rejects, upsert_forecast
+
+        console = get_console()
+        spot_ids = select_spots(spot_ids, region, near, radius_km, registry)
+        forecast_types = types or valid_types
+        captures = open_captures(record, replay, as_of)
+        client = SurflineClient(
+            transport=transport,
+            pool_size=max_workers,
+            cache=ResponseCache(ttl=cache_ttl) if cache else None,
+            scheduler=RequestScheduler(
+                rate=rate or None, max_retries=retries, max_concurrency=max_workers
+            ),
+            capture=captures,
+        )
+        con = client.con
+
+        with fetch_progress(len(spot_ids) * len(forecast_types)) as on_result:
+            try:
+                fetch_report(
+                    spot_ids,
+                    forecast_types,
+                    days=days,
+                    interval_hours=interval_hours,
+                    access_token=access_token,
+                    max_workers=max_workers,
+                    client=client,
+                    validate=validate,
+                    on_result=on_result,
+                    resample=resample,
+                    batch_size=batch_size or None,
+                )
+            except ImportError as e:
+                typer.echo(str(e), err=True)
+                raise typer.Exit(1) from e
+            finally:
+                if captures is not None:
+                    captures.close()
+
+        stats = client.scheduler.stats
+        if stats["throttled"]:
+            typer.echo(
+                f"Throttled {stats['throttled']} times, {stats['attempts'] - stats['requests']}"
+                " retries in total",
+                err=True,
+            )
+
+        tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+        # The warehouse and the Parquet archive store the fetched records,
+        # never resampled aggregates keyed on the same timestamps
+        stored = {
+            forecast_type: (
+                hourly_table(forecast_type)
+                if hourly_table(forecast_type) in tables
+                else forecast_type
+            )
+            for forecast_type in forecast_types
+        }
+        if duckdb_file:
+            attach_warehouse(con, duckdb_file)
+            for forecast_type in forecast_types:
+                if forecast_type in tables:
+                    inserted = upsert_forecast(
+                        con, forecast_type, source=stored[forecast_type], layout=layout
+                    )
+                    typer.echo(f"{inserted} new or changed {forecast_type} rows saved")
+            rejected = save_rejects(con)
+            if rejected:
+                typer.echo(f"{rejected} rejected records saved to the 'rejects' table")
+        for forecast_type in forecast_types:
+            if forecast_type not in tables:
+                continue
+            query = report_query(
+                con,
+                forecast_type,
+                simplify=simplify,
+                today=today,
+                columns=[name for entry in columns or [] for name in entry.split(",")],
+            )
+
+            if csv:
+                path = Path(csv)
+                csv_file = path.with_name(f"{path.stem}_{forecast_type}{path.suffix}")
+                export_csv(con, f"({query})", csv_file)
+                typer.echo(f"{forecast_type} data saved to {csv_file}")
+
+            if parquet:
+                export_parquet(
+                    con,
+                    stored[forecast_type],
+                    parquet,
+                    forecast_type,
+                    compression=parquet_compression,
+                    row_group_size=row_group_size,
+                )
+
+            table = stream_pretty_table(con, query, limit=limit, page=page)
+            with metrics.stage("render"):
+                console.rule(forecast_type)
+                console.print(table)
+
+        if parquet:
+            typer.echo(f"Report appended to the Parquet archive in {parquet}")
+        client.close()
+
+
+@app.command()
+def snapshot(
+    spot_ids: Optional[List[str]] = typer.Option(
+        None, "-s", "--spot-ids", help="Surfline spot IDs"
+    ),
+    region: Optional[str] = typer.Option(
+        None, "--region", help="Use the registered spots of a region"
+    ),
+    near: Optional[str] = typer.Option(
+        None, "--near", help="Use the registered spots near a lat,lon coordinate"
+    ),
+    radius_km: float = typer.Option(30, "--radius-km", help="Radius of --near in km"),
+    registry: Optional[str] = typer.Option(
+        None, "--registry", help="Spot registry database (see duckdive spots)"
+    ),
+    days: int = typer.Option(1, help="Number of forecast days"),
+    interval_hours: float = typer.Option(
+        1, "-i", "--interval-hours", help="Interval hours for forecast"
+    ),
+    resample: bool = typer.Option(
+        True,
+        "--resample/--no-resample",
+        help="Fetch hourly data once and resample coarser intervals locally",
+    ),
+    today: bool = typer.Option(
+        True, "--today/--no-today", help="Only include today's data (7am-8pm)"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "-n", "--limit", help="Rows per page of each spot (all rows if unset)"
+    ),
+    page: int = typer.Option(1, "--page", help="Page of each spot to show"),
+    columns: Optional[List[str]] = typer.Option(
+        None, "-c", "--columns", help="Columns to show (repeat or comma-separate)"
+    ),
+    max_workers: int = typer.Option(
+        8, "-w", "--max-workers", help="Maximum number of concurrent requests"
+    ),
+    transport: str = typer.Option(
+        "duckdb", "--transport", help=f"HTTP transport, one of {transports}"
+    ),
+    access_token: Optional[str] = typer.Option(
+        None, "-a", "--access-token", help="Access token for premium data"
+    ),
+    csv: Optional[str] = typer.Option(
+        None, "--csv", help="Save the whole snapshot table to a local CSV file"
+    ),
+    validate: str = typer.Option(
+        "sample", "--validate", help=f"Record validation, one of {validation_modes}"
+    ),
+    rate: float = typer.Option(
+        10, "--rate", help="Maximum average requests per second (0 for no limit)"
+    ),
+    retries: int = typer.Option(
+        4, "--retries", help="Retries of throttled, 5xx and failed requests"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a breakdown of time spent per stage"
+    ),
+    metrics_json: Optional[str] = typer.Option(
+        None,
+        "--metrics-json",
+        help="Write run metrics as JSON to a file ('-' for stdout)",
+    ),
+):
+    """
+    Fetch every forecast type for spots and join them into one wide table on a common time axis.
+    """
+    with metrics.collect("snapshot", profile, metrics_json):
+        from .client import SurflineClient
+        from .engine import today_bounds
+        from .export import export_csv
+        from .scheduler import RequestScheduler
+        from .snapshot import fetch_snapshot, preview_columns
+        from .util import project_columns, spot_dict, stream_pretty_table
+
+        console = get_console()
+        spot_ids = select_spots(spot_ids, region, near, radius_km, registry)
+        client = SurflineClient(
+            transport=transport,
+            pool_size=max_workers,
+            scheduler=RequestScheduler(
+                rate=rate or None, max_retries=retries, max_concurrency=max_workers
+            ),
+        )
+
+        def on_result(result):
+            if result.error:
+                typer.echo(
+                    f"{result.forecast_type} for {result.spot_id} failed: {result.error}",
+                    err=True,
+                )
+
+        with console.status("[bold green]Fetching forecasts..."):
+            relation = fetch_snapshot(
+                spot_ids,
+                days=days,
+                interval_hours=interval_hours,
+                access_token=access_token,
+                max_workers=max_workers,
+                client=client,
+                validate=validate,
+                on_result=on_result,
+                resample=resample,
+            )
+        if relation is None:
+            typer.echo("No data was returned.", err=True)
+            client.close()
+            raise typer.Exit(1)
+
+        if csv:
+            export_csv(client.con, "snapshot", csv)
+            typer.echo(f"Snapshot saved to {csv}")
+
+        if not columns:
+            columns = [name for name in preview_columns if name in relation.columns]
+        try:
+            query = project_columns(client.con, "snapshot", columns)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--columns") from e
+
+        where = "spot_id = $spot_id"
+        bounds = {}
+        if today:
+            start_ts, end_ts = today_bounds()
+            where += ' AND "timestamp" BETWEEN $start_ts AND $end_ts'
+            bounds = {"start_ts": start_ts, "end_ts": end_ts}
+        for spot_id in spot_ids:
+            table = stream_pretty_table(
+                client.con,
+                f"{query} WHERE {where}",
+                limit=limit,
+                page=page,
+                params={"spot_id": spot_id, **bounds},
+            )
+            with metrics.stage("render"):
+                console.rule(spot_dict.get(spot_id, spot_id))
+                console.print(table)
+        client.close()
+
+
+@app.command()
+def watch(
+    spot_ids: Optional[List[str]] = typer.Option(
+        None, "-s", "--spot-ids", help="Surfline spot IDs"
+    ),
+    types: Optional[List[str]] = typer.Option(
+        None, "-t", "--types", help="Forecast types to poll"
+    ),
+    duckdb_file: str = typer.Option(
+        "duckdive.duckdb", "--duckdb", help="DuckDB warehouse file to upsert into"
+    ),
+    layout: str = typer.Option(
+        "versions",
+        "--layout",
+        help=f"Layout of new warehouse tables, one of {warehouse_layouts}",
+    ),
+    every: Optional[List[str]] = typer.Option(
+        None,
+        "-e",
+        "--every",
+        help="Poll interval override as type=duration, e.g. wind=15m or tides=12h",
+    ),
+    jitter: float = typer.Option(
+        0.1, "--jitter", help="Random +/- fraction applied to every poll interval"
+    ),
+    days: int = typer.Option(3, help="Number of forecast days"),
+    interval_hours: float = typer.Option(
+        1, "-i", "--interval-hours", help="Interval hours for forecast"
+    ),
+    max_workers: int = typer.Option(
+        8, "-w", "--max-workers", help="Maximum number of concurrent requests"
+    ),
+    transport: str = typer.Option(
+        "duckdb", "--transport", help=f"HTTP transport, one of {transports}"
+    ),
+    access_token: Optional[str] = typer.Option(
+        None, "-a", "--access-token", help="Access token for premium data"
+    ),
+    validate: str = typer.Option(
+        "sample", "--validate", help=f"Record validation, one of {validation_modes}"
+    ),
+    rate: float = typer.Option(
+        10, "--rate", help="Maximum average requests per second (0 for no limit)"
+    ),
+    retries: int = typer.Option(
+        4, "--retries", help="Retries of throttled, 5xx and failed requests"
+    ),
+):
+    """
+    Poll spots on per-type schedules and upsert them into a DuckDB warehouse until stopped.
+    """
+    import signal
+
+    from .scheduler import RequestScheduler
+    from .util import load_spot_ids, spot_dict
+    from .watch import Watcher, format_duration, parse_intervals
+
+    watcher = Watcher(
+        spot_ids or load_spot_ids() or list(spot_dict),
+        types or valid_types,
+        database=duckdb_file,
+        layout=layout,
+        intervals=parse_intervals(every or []),
+        jitter=jitter,
         days=days,
         interval_hours=interval_hours,
-        max_heights=max_heights,
-        sds=sds,
         access_token=access_token,
-        forecast_type=forecast_type,
+        max_workers=max_workers,
+        transport=transport,
+        validate=validate,
+        scheduler=RequestScheduler(
+            rate=rate or None, max_retries=retries, max_concurrency=max_workers
+        ),
     )
-    print("url here sir", url)
 
-    result = query_surfline(url, duckdb_file=duckdb)
+    # Finish the poll in progress and close the warehouse cleanly on Ctrl-C / kill
+    def shutdown(signum, frame):
+        typer.echo("Stopping after the current poll...", err=True)
+        watcher.stop()
 
-    if isinstance(result, duckdb.DuckDBPyConnection):
-        if csv:
-            # Export to CSV using DuckDB
-            result.execute(f"COPY surfline_data TO '{csv}' (HEADER, DELIMITER ',')")
-            typer.echo(f"Data saved to {csv}")
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
 
-        # Display preview
-        preview_data = result.execute("SELECT * FROM surfline_data LIMIT 5").fetchall()
-        console.print(create_pretty_table(preview_data))
+    def on_poll(result):
+        status = f"{result.fetched} spots, {result.inserted} new or changed rows"
+        if result.rejected:
+            status += f", {result.rejected} rejected"
+        if result.errors:
+            status += f", {result.errors} failed"
+        if result.error:
+            status = f"failed: {result.error}"
+        typer.echo(
+            f"{result.started_at:%Y-%m-%d %H:%M:%S} {result.forecast_type}: {status}"
+            f" ({result.seconds:.1f}s), next poll in {format_duration(result.next_poll_in)}"
+        )
+        for message in result.messages:
+            typer.echo(f"  {message}", err=True)
 
-        if save_to_duckdb:
-            typer.echo(
-                "DuckDB connection returned. You can now run SQL queries on the 'surfline_data' table."
+    typer.echo(
+        f"Watching {len(watcher.spot_ids)} spots ({', '.join(watcher.forecast_types)})"
+        f" into {duckdb_file}"
+    )
+    try:
+        watcher.run(on_poll=on_poll)
+    finally:
+        watcher.close()
+    typer.echo("Stopped.")
+
+
+@app.command()
+def asof(
+    forecast_type: str = typer.Option(
+        ..., "-t", "--type", help="Forecast type (warehouse table) to query"
+    ),
+    duckdb_file: str = typer.Option(
+        "duckdive.duckdb", "--duckdb", help="DuckDB warehouse file to query"
+    ),
+    spot_ids: Optional[List[str]] = typer.Option(
+        None, "-s", "--spot-ids", help="Surfline spot IDs (all stored spots if unset)"
+    ),
+    issued: Optional[str] = typer.Option(
+        None, "--issued", help="Point in time of the forecast, e.g. '2024-10-03 20:00'"
+    ),
+    valid_from: Optional[str] = typer.Option(
+        None,
+        "--valid-from",
+        help="Earliest valid time (the valid time with --evolution)",
+    ),
+    valid_to: Optional[str] = typer.Option(
+        None, "--valid-to", help="Latest valid time"
+    ),
+    evolution: bool = typer.Option(
+        False, "--evolution", help="Show every version of the forecast for --valid-from"
+    ),
+    skill: Optional[str] = typer.Option(
+        None,
+        "--skill",
+        help="Score a numeric column (e.g. speed, surf.max) by lead time",
+    ),
+    leads: Optional[List[float]] = typer.Option(
+        None,
+        "--lead",
+        help="Lead times in hours scored by --skill (default 24, 48, 72)",
+    ),
+    columns: Optional[List[str]] = typer.Option(
+        None, "-c", "--columns", help="Columns to show (repeat or comma-separate)"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "-n", "--limit", help="Rows per page (all rows if unset)"
+    ),
+    page: int = typer.Option(1, "--page", help="Page of the result to show"),
+    csv: Optional[str] = typer.Option(
+        None, "--csv", help="Save the whole result to a local CSV file"
+    ),
+):
+    """
+    Query stored forecasts as of an issue time, their evolution, or their skill by lead time.
+    """
+    import duckdb
+
+    from .asof import forecast_asof, forecast_evolution, forecast_skill
+    from .export import export_csv
+    from .util import project_columns, stream_pretty_table
+    from .warehouse import quote_literal
+
+    if evolution and not valid_from:
+        raise typer.BadParameter(
+            "--evolution needs a valid time", param_hint="--valid-from"
+        )
+    if not Path(duckdb_file).exists():
+        typer.echo(f"No warehouse at {duckdb_file}", err=True)
+        raise typer.Exit(1)
+
+    con = duckdb.connect()
+    con.execute(f"ATTACH {quote_literal(duckdb_file)} AS warehouse (READ_ONLY)")
+    try:
+        if skill:
+            relation = forecast_skill(
+                con,
+                forecast_type,
+                skill,
+                leads,
+                spot_ids,
+                valid_from,
+                valid_to,
+                "warehouse",
+            )
+        elif evolution:
+            relation = forecast_evolution(
+                con, forecast_type, valid_from, valid_to, spot_ids, catalog="warehouse"
+            )
+        else:
+            relation = forecast_asof(
+                con, forecast_type, issued, spot_ids, valid_from, valid_to, "warehouse"
+            )
+        relation.create("asof")
+        query = project_columns(con, "asof", columns)
+    except (ValueError, duckdb.Error) as e:
+        con.close()
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1) from e
+
+    if csv:
+        export_csv(con, f"({query})", csv)
+        typer.echo(f"Result saved to {csv}")
+    get_console().print(
+        stream_pretty_table(con, query, limit=limit, page=page, formatted=False)
+    )
+    con.close()
+
+
+@app.command()
+def ingest(
+    spot_ids: Optional[List[str]] = typer.Option(
+        None, "-s", "--spot-ids", help="Surfline spot IDs"
+    ),
+    region: Optional[str] = typer.Option(
+        None, "--region", help="Use the registered spots of a region"
+    ),
+    near: Optional[str] = typer.Option(
+        None, "--near", help="Use the registered spots near a lat,lon coordinate"
+    ),
+    radius_km: float = typer.Option(30, "--radius-km", help="Radius of --near in km"),
+    registry: Optional[str] = typer.Option(
+        None, "--registry", help="Spot registry database (see duckdive spots)"
+    ),
+    types: Optional[List[str]] = typer.Option(
+        None, "-t", "--types", help="Forecast types to fetch"
+    ),
+    duckdb_file: str = typer.Option(
+        "duckdive.duckdb", "--duckdb", help="DuckDB warehouse file to upsert into"
+    ),
+    layout: str = typer.Option(
+        "versions",
+        "--layout",
+        help=f"Layout of new warehouse tables, one of {warehouse_layouts}",
+    ),
+    shards: int = typer.Option(
+        0, "--shards", help="Worker processes to split spots across (0 for one per CPU)"
+    ),
+    shard_dir: Optional[str] = typer.Option(
+        None,
+        "--shard-dir",
+        help="Directory of the shard databases (kept after merging)",
+    ),
+    days: int = typer.Option(3, help="Number of forecast days"),
+    interval_hours: float = typer.Option(
+        1, "-i", "--interval-hours", help="Interval hours for forecast"
+    ),
+    resample: bool = typer.Option(
+        True,
+        "--resample/--no-resample",
+        help="Fetch hourly data once for every interval; the warehouse stores it hourly",
+    ),
+    max_workers: int = typer.Option(
+        8, "-w", "--max-workers", help="Maximum number of concurrent requests per shard"
+    ),
+    transport: str = typer.Option(
+        "duckdb", "--transport", help=f"HTTP transport, one of {transports}"
+    ),
+    access_token: Optional[str] = typer.Option(
+        None, "-a", "--access-token", help="Access token for premium data"
+    ),
+    cache: bool = typer.Option(
+        True, "--cache/--no-cache", help="Serve recent responses from the local cache"
+    ),
+    cache_ttl: Optional[float] = typer.Option(
+        None, "--cache-ttl", help="Cache TTL in seconds (defaults per forecast type)"
+    ),
+    validate: str = typer.Option(
+        "sample", "--validate", help=f"Record validation, one of {validation_modes}"
+    ),
+    batch_size: int = typer.Option(
+        0,
+        "--batch-size",
+        help="Load records in Arrow batches of this many rows, needs pyarrow"
+        " (0 inserts each response on its own)",
+    ),
+    rate: float = typer.Option(
+        10,
+        "--rate",
+        help="Maximum average requests per second across shards (0 for no limit)",
+    ),
+    retries: int = typer.Option(
+        4, "--retries", help="Retries of throttled, 5xx and failed requests"
+    ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every response into a capture store file"
+    ),
+    replay: Optional[str] = typer.Option(
+        None,
+        "--replay",
+        help="Serve every response from a capture store file instead of the API",
+    ),
+    as_of: Optional[str] = typer.Option(
+        None,
+        "--as-of",
+        help="With --replay, the latest captures fetched at or before this time",
+    ),
+    history: bool = typer.Option(
+        False,
+        "--history",
+        help="With --replay, reload every recorded run with its own fetch time",
+    ),
+    since: Optional[str] = typer.Option(
+        None, "--since", help="With --history, only runs recorded at or after this time"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a breakdown of time spent per stage"
+    ),
+    metrics_json: Optional[str] = typer.Option(
+        None,
+        "--metrics-json",
+        help="Write run metrics as JSON to a file ('-' for stdout)",
+    ),
+):
+    """
+    Backfill many spots into a warehouse, fetching shards of spots in parallel processes.
+    """
+    with metrics.collect("ingest", profile, metrics_json):
+        from .ingest import rejects_table
+        from .shards import ingest_sharded
+
+        if history:
+            if not replay:
+                raise typer.BadParameter(
+                    "--history needs --replay", param_hint="--history"
+                )
+            replay_runs(
+                replay,
+                duckdb_file,
+                types,
+                # Every recorded spot, unless spots are selected
+                select_spots(spot_ids, region, near, radius_km, registry)
+                if spot_ids or region or near
+                else None,
+                since,
+                as_of,
+                layout,
+                validate,
+                batch_size,
+            )
+            return
+
+        spot_ids = select_spots(spot_ids, region, near, radius_km, registry)
+        forecast_types = types or valid_types
+
+        with fetch_progress(len(spot_ids) * len(forecast_types)) as on_result:
+            try:
+                result = ingest_sharded(
+                    spot_ids,
+                    forecast_types,
+                    database=duckdb_file,
+                    shards=shards or None,
+                    layout=layout,
+                    days=days,
+                    interval_hours=interval_hours,
+                    access_token=access_token,
+                    max_workers=max_workers,
+                    transport=transport,
+                    validate=validate,
+                    rate=rate or None,
+                    retries=retries,
+                    cache=cache,
+                    cache_ttl=cache_ttl,
+                    resample=resample,
+                    batch_size=batch_size or None,
+                    on_result=on_result,
+                    shard_dir=shard_dir,
+                    keep_shards=shard_dir is not None,
+                    record=record,
+                    replay=replay,
+                    as_of=as_of,
+                )
+            except (ValueError, ImportError) as e:
+                typer.echo(str(e), err=True)
+                raise typer.Exit(1) from e
+
+        for shard in result.shards:
+            if shard.error:
+                typer.echo(f"Shard {shard.index} failed: {shard.error}", err=True)
+        rejected = result.inserted.pop(rejects_table, 0)
+        for forecast_type, inserted in result.inserted.items():
+            typer.echo(f"{inserted} new or changed {forecast_type} rows saved")
+        if rejected:
+            typer.echo(f"{rejected} rejected records saved to the 'rejects' table")
+        typer.echo(
+            f"Ingested {len(spot_ids)} spots in {len(result.shards)} shards"
+            f" in {result.seconds:.1f}s (merge {result.merge_seconds:.1f}s)"
+        )
+        if record:
+            typer.echo(f"{result.captured} responses recorded to {record}")
+        if any(shard.error for shard in result.shards):
+            raise typer.Exit(1)
+
+
+def replay_runs(
+    replay: str,
+    duckdb_file: str,
+    types: Optional[List[str]],
+    spot_ids: Optional[List[str]],
+    since: Optional[str],
+    until: Optional[str],
+    layout: str,
+    validate: str,
+    batch_size: int,
+) -> None:
+    """
+    Reload every run recorded in a capture store into a warehouse, printing
+    a line per run (see captures.replay_history).
+    """
+    from .captures import CaptureStore, replay_history
+
+    def on_run(run):
+        inserted = ", ".join(f"{n} {t}" for t, n in run.inserted.items()) or "no rows"
+        failed = f", {run.errors} failed" if run.errors else ""
+        typer.echo(
+            f"{run.recorded_at:%Y-%m-%d %H:%M:%S}: {run.captures} responses,"
+            f" {inserted} saved{failed}"
+        )
+
+    try:
+        with CaptureStore(replay, replay=True) as captures:
+            runs = replay_history(
+                captures,
+                duckdb_file,
+                forecast_types=types,
+                spot_ids=spot_ids,
+                since=since,
+                until=until,
+                layout=layout,
+                validate=validate,
+                batch_size=batch_size or None,
+                on_run=on_run,
             )
+    except (ValueError, ImportError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1) from e
+    typer.echo(f"Replayed {len(runs)} recorded runs into {duckdb_file}")
+
+
+@app.command()
+def compact(
+    duckdb_file: str = typer.Argument(..., help="DuckDB warehouse file to compact"),
+    hourly_days: float = typer.Option(
+        7, "--hourly-days", help="Days of versions kept at hourly granularity"
+    ),
+    max_days: Optional[float] = typer.Option(
+        None,
+        "--max-days",
+        help="Days after which replaced versions are dropped (kept if unset)",
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Print a breakdown of time spent per stage"
+    ),
+    metrics_json: Optional[str] = typer.Option(
+        None,
+        "--metrics-json",
+        help="Write run metrics as JSON to a file ('-' for stdout)",
+    ),
+):
+    """
+    Apply the retention policy to a warehouse and rewrite it into sorted, compacted tables.
+    """
+    with metrics.collect("compact", profile, metrics_json):
+        import duckdb
+
+        from .compaction import compact_warehouse
+
+        try:
+            result = compact_warehouse(
+                duckdb_file, hourly_days=hourly_days, max_days=max_days
+            )
+        except (FileNotFoundError, ValueError, RuntimeError, duckdb.IOException) as e:
+            typer.echo(str(e), err=True)
+            raise typer.Exit(1) from e
+
+        for table, rows in result.rows_after.items():
+            typer.echo(f"{table}: {result.rows_before[table]} -> {rows} rows")
+        typer.echo(
+            f"Compacted {duckdb_file} from {result.bytes_before / 1e6:.1f} MB"
+            f" to {result.bytes_after / 1e6:.1f} MB in {result.seconds:.1f}s"
+        )
+
+
+@app.command()
+def serve(
+    duckdb_file: str = typer.Option(
+        "duckdive.duckdb", "--duckdb", help="DuckDB warehouse file to serve"
+    ),
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface to listen on"),
+    port: int = typer.Option(8000, "-p", "--port", help="Port to listen on"),
+    pool_size: int = typer.Option(
+        4, "--pool-size", help="Maximum number of queries run at once"
+    ),
+    cache_entries: int = typer.Option(
+        256,
+        "--cache-entries",
+        help="Responses kept in the result cache (0 disables it)",
+    ),
+    release_after: float = typer.Option(
+        5,
+        "--release-after",
+        help="Idle seconds after which the warehouse is released to writers",
+    ),
+    log: bool = typer.Option(False, "--log", help="Log every request to stderr"),
+):
+    """
+    Serve stored forecasts read-only over local HTTP as JSON, CSV or Arrow.
+    """
+    from .serve import ForecastServer
+
+    try:
+        server = ForecastServer(
+            duckdb_file,
+            host=host,
+            port=port,
+            pool_size=pool_size,
+            cache_entries=cache_entries,
+            release_after=release_after,
+            log_requests=log,
+        )
+    except (ValueError, OSError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1) from e
+
+    typer.echo(f"Serving {duckdb_file} at {server.url} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        typer.echo("Stopped.")
+    finally:
+        server.server_close()
+
+
+spots_app = typer.Typer(help="Manage the spot registry used by --region and --near.")
+app.add_typer(spots_app, name="spots")
+
+
+@spots_app.command("import")
+def import_spots(
+    path: str = typer.Argument(..., help="CSV or JSON file of spots"),
+    registry: Optional[str] = typer.Option(
+        None, "--registry", help="Spot registry database"
+    ),
+):
+    """
+    Bulk import spots (spot_id, name, region, lat, lon, timezone) into the registry.
+    """
+    from .spots import default_registry, import_spots, open_registry
+
+    con = open_registry(registry)
+    try:
+        count = import_spots(con, path)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="PATH") from e
+    finally:
+        con.close()
+    typer.echo(f"{count} spots imported into {registry or default_registry}")
+
+
+@spots_app.command("list")
+def list_spots(
+    region: Optional[str] = typer.Option(None, "--region", help="Region of the spots"),
+    near: Optional[str] = typer.Option(
+        None, "--near", help="Only spots near a lat,lon coordinate, nearest first"
+    ),
+    radius_km: float = typer.Option(30, "--radius-km", help="Radius of --near in km"),
+    limit: Optional[int] = typer.Option(
+        None, "-n", "--limit", help="Rows per page (all rows if unset)"
+    ),
+    page: int = typer.Option(1, "--page", help="Page of the list to show"),
+    ids: bool = typer.Option(
+        False, "--ids", help="Only print the spot ids, one per line"
+    ),
+    registry: Optional[str] = typer.Option(
+        None, "--registry", help="Spot registry database"
+    ),
+):
+    """
+    List registered spots, by region and/or within a radius of a coordinate.
+    """
+    from .spots import nearby_spots, open_registry, parse_coordinate, region_spots
+    from .util import stream_pretty_table
+
+    try:
+        point = parse_coordinate(near) if near else None
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--near") from e
+    con = open_registry(registry)
+    if point is not None:
+        relation = nearby_spots(con, *point, radius_km=radius_km, region=region)
+    elif region:
+        relation = region_spots(con, region)
+    else:
+        relation = con.table("spots").project("* EXCLUDE (cell)").order("region, name")
+
+    if ids:
+        for (spot_id,) in relation.project("spot_id").fetchall():
+            typer.echo(spot_id)
     else:
-        typer.echo("No data was returned.", err=True)
+        # Queries with a bound region are not plain SQL, list them through a view
+        relation.to_view("listed_spots")
+        get_console().print(
+            stream_pretty_table(
+                con,
+                "SELECT * FROM listed_spots",
+                limit=limit,
+                page=page,
+                formatted=False,
+            )
+        )
+    con.close()
@@ -1,5 +1,18 @@
 from urllib.parse import urlencode
 
+surfline_api_url = "https://services.surfline.com/kbyg/spots/forecasts"
+
+valid_types = [
+    "rating",
+    "conditions",
+    "swells",
+    "sunlight",
+    "wave",
+    "wind",
+    "tides",
+    "weather",
+]
+
 
 def construct_surfline_api_url(
     spot_id="5842041f4e65fad6a7708839",
@@ -9,6 +22,7 @@ def construct_surfline_api_url(
     sds=None,
     access_token=None,
     forecast_type="wave",
+    base_url=surfline_api_url,
 ):
     """
     Construct the Surfline API URL based on user input parameters.
@@ -21,20 +35,9 @@ def construct_surfline_api_url(
     :param sds: Boolean, if True, uses the new LOTUS forecast engine (optional)
     :param access_token: String, auth token for premium data access (optional)
     :param forecast_type: String, type of data to include (must be one of the valid types)
+    :param base_url: String, base url of the forecasts API (optional, e.g. a local stand-in server)
     :return: String, constructed API URL
     """
-    base_url = "https://services.surfline.com/kbyg/spots/forecasts"
-
-    valid_types = [
-        "rating",
-        "conditions",
-        "swells",
-        "sunlight",
-        "wave",
-        "wind",
-        "tides",
-        "weather",
-    ]
     if forecast_type not in valid_types:
         raise ValueError(f"Invalid forecast_type. Must be one of {valid_types}")
 
@@ -0,0 +1,270 @@
+from datetime import datetime
+from typing import List, Optional, Union
+
+import duckdb
+
+from .constants import meta_columns, range_columns
+from .views import table_columns
+from .warehouse import issue_column, time_column
+
+# Lead times in hours compared by forecast_skill unless others are given
+default_leads = [24, 48, 72]
+
+Time = Union[str, datetime]
+
+
+def parse_time(value: Time) -> datetime:
+    """
+    Parse an ISO 8601 date or date and time, e.g. "2024-10-03 20:00".
+    Times with a UTC offset are converted to naive local time, like fetched_at.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(
+                f"Invalid time '{value}'. Use ISO 8601, e.g. 2024-10-03 or 2024-10-03 20:00"
+            ) from None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def timestamp_literal(value: Time) -> str:
+    """
+    Return the SQL TIMESTAMP literal of a time, e.g. TIMESTAMP '2024-10-03 20:00:00'.
+    """
+    return f"TIMESTAMP '{parse_time(value).isoformat(sep=' ')}'"
+
+
+def history_table(
+    con: duckdb.DuckDBPyConnection, forecast_type: str, catalog: Optional[str] = None
+) -> tuple:
+    """
+    Return the qualified name, column names, time column and fetch time column
+    of a warehouse table.
+
+    :raises ValueError: If the warehouse has no table for the forecast type
+    """
+    columns = table_columns(con, forecast_type, catalog)
+    if not columns:
+        raise ValueError(f"No '{forecast_type}' table in the warehouse")
+    source = f'"{catalog}"."{forecast_type}"' if catalog else f'"{forecast_type}"'
+    return source, columns, time_column(forecast_type), issue_column(columns)
+
+
+def _filters(
+    key: str,
+    spot_ids: Optional[List[str]],
+    valid_from: Optional[Time],
+    valid_to: Optional[Time],
+) -> List[str]:
+    """
+    Build the filters on spot_id and the raw time column, which DuckDB checks
+    against the min/max statistics of each row group before reading it.
+    """
+    filters = []
+    if spot_ids:
+        # Spot ids are DuckDB constants rendered by DuckDB, so the relation
+        # stays plain, lazily evaluated SQL (bound parameters materialize it)
+        constants = [duckdb.ConstantExpression(spot_id) for spot_id in spot_ids]
+        filters.append(str(duckdb.ColumnExpression("spot_id").isin(*constants)))
+    if valid_from is not None:
+        filters.append(f'"{key}" >= {int(parse_time(valid_from).timestamp())}')
+    if valid_to is not None:
+        filters.append(f'"{key}" <= {int(parse_time(valid_to).timestamp())}')
+    return filters
+
+
+def _data_columns(columns: List[str], key: str) -> str:
+    return "".join(
+        f', "{column}"'
+        for column in columns
+        if column not in meta_columns and column not in range_columns and column != key
+    )
+
+
+def forecast_asof(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    issued_at: Optional[Time] = None,
+    spot_ids: Optional[List[str]] = None,
+    valid_from: Optional[Time] = None,
+    valid_to: Optional[Time] = None,
+    catalog: Optional[str] = None,
+) -> duckdb.DuckDBPyRelation:
+    """
+    Return the forecast as it stood at a point in time: for every spot and
+    valid time, the latest version fetched at or before issued_at.
+
+    Rows carry spot_id, valid_at (the forecast time) and issued_at (when the
+    version was fetched), then the forecast columns. In the "ranges" layout
+    this is a plain filter on valid_from / valid_to; in the "versions" layout
+    the latest version per record is picked with a window.
+
+    Usage:
+        forecast_asof(con, "wave", "2024-10-03 20:00", valid_from="2024-10-05 06:00")
+
+    :param con: DuckDB connection to the warehouse
+    :param forecast_type: Forecast type (and warehouse table)
+    :param issued_at: Point in time, naive local time like fetched_at (defaults to now)
+    :param spot_ids: Only these spots
+    :param valid_from: Earliest valid time (defaults to the start of issued_at's day)
+    :param valid_to: Latest valid time
+    :param catalog: Catalog the warehouse is attached as (defaults to the current one)
+    :return: DuckDB relation ordered by spot_id and valid_at
+    """
+    source, columns, key, issued = history_table(con, forecast_type, catalog)
+    issued_at = parse_time(issued_at) if issued_at is not None else datetime.now()
+    if valid_from is None:
+        valid_from = issued_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    filters = _filters(key, spot_ids, valid_from, valid_to)
+
+    at = timestamp_literal(issued_at)
+    if issued == "valid_from":
+        filters.append(f"valid_from <= {at}")
+        filters.append(f"(valid_to IS NULL OR valid_to > {at})")
+        latest = ""
+    else:
+        filters.append(f"fetched_at <= {at}")
+        latest = (
+            f'QUALIFY row_number() OVER (PARTITION BY spot_id, "{key}"'
+            " ORDER BY fetched_at DESC) = 1"
+        )
+    return con.sql(
+        f"""
+        SELECT spot_id, to_timestamp("{key}")::TIMESTAMP AS valid_at,
+            {issued} AS issued_at{_data_columns(columns, key)}
+        FROM {source}
+        WHERE {" AND ".join(filters)}
+        {latest}
+        ORDER BY spot_id, "{key}"
+        """
+    )
+
+
+def forecast_evolution(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    valid_from: Time,
+    valid_to: Optional[Time] = None,
+    spot_ids: Optional[List[str]] = None,
+    issued_from: Optional[Time] = None,
+    issued_to: Optional[Time] = None,
+    catalog: Optional[str] = None,
+) -> duckdb.DuckDBPyRelation:
+    """
+    Return every stored version of the forecast for a valid time (or range),
+    oldest first, showing how it changed as the time approached.
+
+    Rows carry spot_id, valid_at, issued_at, replaced_at (when the next version
+    was fetched, NULL for the current one) and lead_hours (hours between
+    issue and valid time), then the forecast columns.
+
+    Usage:
+        forecast_evolution(con, "wave", "2024-10-05 06:00", spot_ids=[spot_id])
+
+    :param con: DuckDB connection to the warehouse
+    :param forecast_type: Forecast type (and warehouse table)
+    :param valid_from: Valid time, or start of the valid time range
+    :param valid_to: End of the valid time range (defaults to valid_from)
+    :param spot_ids: Only these spots
+    :param issued_from: Only versions fetched at or after this time
+    :param issued_to: Only versions fetched at or before this time
+    :param catalog: Catalog the warehouse is attached as (defaults to the current one)
+    :return: DuckDB relation ordered by spot_id, valid_at and issued_at
+    """
+    source, columns, key, issued = history_table(con, forecast_type, catalog)
+    filters = _filters(key, spot_ids, valid_from, valid_to or valid_from)
+    # Issue time filters apply after replaced_at is known
+    issue_filters = ["true"]
+    if issued_from is not None:
+        issue_filters.append(f"issued_at >= {timestamp_literal(issued_from)}")
+    if issued_to is not None:
+        issue_filters.append(f"issued_at <= {timestamp_literal(issued_to)}")
+
+    replaced_at = (
+        "valid_to"
+        if issued == "valid_from"
+        else f'lead(fetched_at) OVER (PARTITION BY spot_id, "{key}" ORDER BY fetched_at)'
+    )
+    return con.sql(
+        f"""
+        SELECT * FROM (
+            SELECT spot_id, to_timestamp("{key}")::TIMESTAMP AS valid_at,
+                {issued} AS issued_at, {replaced_at} AS replaced_at,
+                round(("{key}" - epoch({issued}::TIMESTAMPTZ)) / 3600, 1) AS lead_hours
+                {_data_columns(columns, key)}
+            FROM {source}
+            WHERE {" AND ".join(filters)}
+        )
+        WHERE {" AND ".join(issue_filters)}
+        ORDER BY spot_id, valid_at, issued_at
+        """
+    )
+
+
+def forecast_skill(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    column: str,
+    leads: Optional[List[float]] = None,
+    spot_ids: Optional[List[str]] = None,
+    valid_from: Optional[Time] = None,
+    valid_to: Optional[Time] = None,
+    catalog: Optional[str] = None,
+) -> duckdb.DuckDBPyRelation:
+    """
+    Compare forecasts made lead hours ahead with what was eventually reported.
+
+    The API has no observations, so the reference for each spot and valid time
+    is the last version fetched at or before the valid time, the closest
+    stored thing to an observation. Each lead time's forecast is the version
+    that was current lead hours before it. Both are found with ASOF joins.
+
+    :param con: DuckDB connection to the warehouse
+    :param forecast_type: Forecast type (and warehouse table)
+    :param column: Numeric column to score, e.g. "speed" or "surf.max"
+    :param leads: Lead times in hours (defaults to default_leads)
+    :param spot_ids: Only these spots
+    :param valid_from: Earliest valid time
+    :param valid_to: Latest valid time (defaults to now)
+    :param catalog: Catalog the warehouse is attached as (defaults to the current one)
+    :return: DuckDB relation with spot_id, lead_hours, count, bias, mae and rmse
+    """
+    source, columns, key, issued = history_table(con, forecast_type, catalog)
+    name, *fields = column.split(".")
+    if name not in columns:
+        raise ValueError(f"No column '{name}' in the '{forecast_type}' table")
+    value = ".".join(f'"{part}"' for part in [name, *fields])
+    filters = _filters(key, spot_ids, valid_from, valid_to or datetime.now())
+    leads = ", ".join(str(float(lead)) for lead in leads or default_leads)
+
+    return con.sql(
+        f"""
+        WITH history AS (
+            SELECT spot_id, "{key}", {issued} AS issued_at, {value} AS value
+            FROM {source}
+            WHERE {" AND ".join(filters)}
+        ),
+        targets AS (
+            SELECT DISTINCT spot_id, "{key}", lead_hours,
+                to_timestamp("{key}")::TIMESTAMP AS valid_at,
+                to_timestamp("{key}" - lead_hours * 3600)::TIMESTAMP AS forecast_at
+            FROM history, unnest([{leads}]::DOUBLE[]) AS leads(lead_hours)
+        )
+        SELECT t.spot_id, t.lead_hours, count(*) AS count,
+            round(avg(f.value - o.value), 3) AS bias,
+            round(avg(abs(f.value - o.value)), 3) AS mae,
+            round(sqrt(avg(pow(f.value - o.value, 2))), 3) AS rmse
+        FROM targets t
+        ASOF JOIN history f
+            ON f.spot_id = t.spot_id AND f."{key}" = t."{key}"
+            AND t.forecast_at >= f.issued_at
+        ASOF JOIN history o
+            ON o.spot_id = t.spot_id AND o."{key}" = t."{key}"
+            AND t.valid_at >= o.issued_at
+        GROUP BY ALL
+        ORDER BY t.spot_id, t.lead_hours
+        """
+    )
@@ -0,0 +1,257 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union, get_args, get_origin
+
+import duckdb
+from pydantic import BaseModel
+
+from . import metrics
+from .ingest import insert_json
+from .models import forecast_models
+
+# Rows buffered per table before they are appended to DuckDB
+default_batch_size = 50_000
+
+# pyarrow type of each scalar field annotation, matching models.duckdb_types
+arrow_types = {int: "int64", float: "float64", str: "string", bool: "bool_"}
+
+
+def import_pyarrow(feature: str = "Loading in Arrow batches"):
+    """
+    Import pyarrow, which the batch loader and Arrow responses of duckdive
+    serve need but duckdive does not depend on.
+
+    :param feature: What needs pyarrow, for the error message
+    :raises ImportError: If pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.json
+    except ImportError:
+        raise ImportError(
+            f"{feature} needs pyarrow: pip install 'duckdive[arrow]'"
+        ) from None
+    return pyarrow
+
+
+def arrow_type(annotation: Any) -> Any:
+    """
+    Convert a model (or field annotation) into a pyarrow type, the Arrow
+    counterpart of models.json_structure, e.g. WindData -> struct<timestamp:
+    int64, speed: double, ...>.
+
+    :param annotation: Pydantic model class or field annotation
+    :return: pyarrow DataType
+    """
+    pa = import_pyarrow()
+    origin = get_origin(annotation)
+    if origin is Union:
+        return arrow_type(
+            next(arg for arg in get_args(annotation) if arg is not type(None))
+        )
+    if origin in (list, List):
+        return pa.list_(arrow_type(get_args(annotation)[0]))
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return pa.struct(
+            [
+                (name, arrow_type(field.annotation))
+                for name, field in annotation.model_fields.items()
+            ]
+        )
+    return getattr(pa, arrow_types[annotation])()
+
+
+@lru_cache(maxsize=None)
+def response_schema(forecast_type: str) -> Any:
+    """
+    Return the explicit pyarrow schema of a response body of a forecast type,
+    {"data": {forecast_type: [record, ...]}}. Other keys are ignored when
+    reading, and values are typed like the json_transform path of insert_json
+    rather than inferred from the first records.
+
+    :param forecast_type: One of the Surfline forecast types
+    """
+    pa = import_pyarrow()
+    records = pa.list_(arrow_type(forecast_models[forecast_type]))
+    return pa.schema([("data", pa.struct([(forecast_type, records)]))])
+
+
+@metrics.timed("parse")
+def body_table(
+    body: Union[str, bytes],
+    forecast_type: str,
+    tags: Optional[Dict[str, str]] = None,
+    skip: Optional[List[int]] = None,
+) -> Any:
+    """
+    Convert the records of a response body into a pyarrow Table with one
+    column per top-level field, parsed by pyarrow's JSON reader in C++.
+
+    :param body: Raw JSON response body
+    :param forecast_type: Forecast type of the body
+    :param tags: Constant string columns prepended to every row, e.g. {"spot_id": ...}
+    :param skip: Indices of records to leave out, e.g. those rejected by validation
+    :return: pyarrow Table
+    :raises pyarrow.ArrowInvalid: If a value does not fit its field's type, e.g.
+        a fractional number in an integer field
+    """
+    pa = import_pyarrow()
+    data = body.encode() if isinstance(body, str) else body
+    table = pa.json.read_json(
+        pa.BufferReader(data),
+        read_options=pa.json.ReadOptions(
+            use_threads=False, block_size=max(len(data) + 1, 1 << 20)
+        ),
+        parse_options=pa.json.ParseOptions(
+            explicit_schema=response_schema(forecast_type),
+            newlines_in_values=True,
+            unexpected_field_behavior="ignore",
+        ),
+    )
+    lists = table.column("data").combine_chunks().field(forecast_type)
+    records = pa.compute.list_flatten(lists)
+    if skip:
+        skipped = set(skip)
+        records = records.filter(
+            pa.array([index not in skipped for index in range(len(records))])
+        )
+    columns = {
+        name: pa.repeat(value, len(records)) for name, value in (tags or {}).items()
+    }
+    for field, column in zip(records.type, records.flatten()):
+        columns[field.name] = column
+    return pa.table(columns)
+
+
+class BatchLoader:
+    """
+    Load response bodies into DuckDB tables in Arrow record batches.
+
+    Each body is converted into Arrow on arrival and its rows are buffered
+    per table; once batch_size rows are buffered they are appended to the
+    table in one INSERT. Memory therefore holds at most about batch_size rows
+    per table, however many bodies a load spans, and DuckDB is entered once
+    per batch rather than once per body.
+
+    Each table is replaced by its first batch, like insert_json with replace.
+    Bodies pyarrow cannot read with the table's schema are loaded with
+    insert_json instead, after the buffered rows.
+
+    Usage:
+        with BatchLoader(con) as loader:
+            loader.add("wave", body, "wave", tags={"spot_id": spot_id})
+    """
+
+    def __init__(
+        self, con: duckdb.DuckDBPyConnection, batch_size: int = default_batch_size
+    ):
+        """
+        :param con: DuckDB connection the tables are written to
+        :param batch_size: Rows buffered per table before they are appended
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        import_pyarrow()
+        self.con = con
+        self.batch_size = batch_size
+        # Tables created by this loader, in the order they were created
+        self.created: List[str] = []
+        self._pending: Dict[str, list] = {}
+        self._rows: Dict[str, int] = {}
+
+    def add(
+        self,
+        table: str,
+        body: Union[str, bytes],
+        forecast_type: str,
+        tags: Optional[Dict[str, str]] = None,
+        skip: Optional[List[int]] = None,
+    ) -> int:
+        """
+        Convert a response body and buffer its rows, appending the table's
+        buffered rows once there are batch_size of them.
+
+        :param table: Name of the table to load the records into
+        :param body: Raw JSON response body
+        :param forecast_type: Forecast type of the body
+        :param tags: Constant string columns prepended to every row
+        :param skip: Indices of records to leave out
+        :return: Number of rows of the body
+        """
+        pa = import_pyarrow()
+        try:
+            data = body_table(body, forecast_type, tags, skip)
+        except pa.ArrowInvalid:
+            self.flush(table)
+            rows = insert_json(
+                self.con,
+                table,
+                body,
+                forecast_type,
+                tags=tags,
+                replace=table not in self.created,
+                skip=skip,
+            )
+            self._created(table)
+            return rows
+        self._pending.setdefault(table, []).append(data)
+        self._rows[table] = self._rows.get(table, 0) + data.num_rows
+        if self._rows[table] >= self.batch_size:
+            self.flush(table)
+        return data.num_rows
+
+    def flush(self, table: Optional[str] = None) -> None:
+        """
+        Append the buffered rows of a table, or of every table, to DuckDB.
+        """
+        pa = import_pyarrow()
+        for name in [table] if table is not None else list(self._pending):
+            pending = self._pending.pop(name, None)
+            if not pending:
+                continue
+            rows = self._rows.pop(name)
+            batch = pa.concat_tables(pending)
+            del pending
+            view = f"{name}_batch"
+            with metrics.stage("insert"):
+                self.con.register(view, batch)
+                try:
+                    if name in self.created:
+                        self.con.execute(
+                            f'INSERT INTO "{name}" BY NAME SELECT * FROM "{view}"'
+                        )
+                    else:
+                        self.con.execute(
+                            f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM "{view}"'
+                        )
+                finally:
+                    self.con.unregister(view)
+            self._created(name)
+            metrics.count("records_parsed", rows)
+
+    def close(self) -> None:
+        """
+        Append every table's remaining buffered rows.
+        """
+        self.flush()
+
+    def discard(self) -> None:
+        """
+        Drop every table's buffered rows without appending them.
+        """
+        self._pending.clear()
+        self._rows.clear()
+
+    def __enter__(self) -> "BatchLoader":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        # A failed load keeps what was appended so far but not a partial batch
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _created(self, table: str) -> None:
+        if table not in self.created:
+            self.created.append(table)
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import parse_qsl, urlparse
+
+default_cache_dir = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "duckdive"
+)
+
+# Seconds a cached response stays fresh, per forecast type
+cache_ttls = {
+    "rating": 60 * 60,
+    "conditions": 3 * 60 * 60,
+    "swells": 60 * 60,
+    "sunlight": 24 * 60 * 60,
+    "wave": 60 * 60,
+    "wind": 30 * 60,
+    "tides": 12 * 60 * 60,
+    "weather": 60 * 60,
+}
+
+# Query parameters holding credentials. Cache keys carry a hash of their value
+# instead of the value itself, so responses are never shared between tokens.
+secret_params = {"accesstoken"}
+
+# Numeric query parameters, written the same way in keys whatever their format,
+# e.g. intervalHours=1.0 as intervalHours=1
+numeric_params = {"days", "intervalHours"}
+
+
+def normalize_url(url: str, drop_secrets: bool = False) -> str:
+    """
+    Normalize a Surfline API url into a stable cache key string.
+    Query parameters are sorted, numeric parameters are written in one
+    format and the access token is replaced by its hash.
+
+    :param url: Surfline API url
+    :param drop_secrets: Drop the access token instead, for keys that match
+        whatever token a response was fetched with (see captures.CaptureStore)
+    :return: Normalized "host/path?params" string
+    """
+    parsed = urlparse(url)
+    params = sorted(
+        (key, _param(key, value))
+        for key, value in parse_qsl(parsed.query)
+        if not (drop_secrets and key.lower() in secret_params)
+    )
+    query = "&".join(f"{key}={value}" for key, value in params)
+    return f"{parsed.netloc}{parsed.path.rstrip('/')}?{query}"
+
+
+def _param(key: str, value: str) -> str:
+    if key.lower() in secret_params:
+        return _digest(value)
+    if key in numeric_params:
+        return _number(value)
+    return value
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:16]
+
+
+def _number(value: str) -> str:
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def forecast_type_of(url: str) -> str:
+    """
+    Return the forecast type (last path segment) of a Surfline API url.
+    """
+    return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+@dataclass
+class CacheEntry:
+    """A cached Surfline response body and its revalidation headers."""
+
+    body: str
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def validators(self) -> Dict[str, str]:
+        """
+        Return the conditional request headers for revalidating this entry.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of Surfline responses with per-forecast-type TTLs and
+    size-bounded LRU eviction.
+
+    Each entry is one file named after the hash of its normalized url. The
+    first line holds the entry metadata and the rest is the raw response body.
+    A file's mtime is bumped on every hit, so eviction removes the least
+    recently used entries first.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = default_cache_dir,
+        ttl: Optional[float] = None,
+        max_bytes: int = 100 * 1024 * 1024,
+    ):
+        """
+        :param directory: Directory holding the cache files
+        :param ttl: TTL in seconds for every forecast type, overriding cache_ttls
+        :param max_bytes: Maximum total size of the cache before evicting entries
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, url: str) -> Path:
+        key = hashlib.sha256(normalize_url(url).encode()).hexdigest()
+        return self.directory / f"{key}.json"
+
+    def ttl_for(self, url: str) -> float:
+        """
+        Return the TTL in seconds for a url's forecast type.
+        """
+        if self.ttl is not None:
+            return self.ttl
+        return cache_ttls.get(forecast_type_of(url), 60 * 60)
+
+    def is_fresh(self, url: str, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl_for(url)
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """
+        Return the cached entry for a url, fresh or not, or None if it is not cached.
+        """
+        path = self.path(url)
+        try:
+            with open(path) as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(body=body, **meta)
+
+    def put(
+        self,
+        url: str,
+        body: Union[str, Dict[str, Any]],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> CacheEntry:
+        """
+        Store a response body for a url and evict old entries if the cache is full.
+        """
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        entry = CacheEntry(
+            body=body, fetched_at=time.time(), etag=etag, last_modified=last_modified
+        )
+        self._write(url, entry)
+        self.evict()
+        return entry
+
+    def refresh(self, url: str, entry: CacheEntry) -> None:
+        """
+        Mark an entry as fetched now, e.g. after the server answered 304 Not Modified.
+        """
+        entry.fetched_at = time.time()
+        self._write(url, entry)
+
+    def _write(self, url: str, entry: CacheEntry) -> None:
+        path = self.path(url)
+        meta = {
+            "fetched_at": entry.fetched_at,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+        }
+        # Write to a temporary file first so readers never see a partial entry
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(json.dumps(meta) + "\n")
+            f.write(entry.body)
+        os.replace(tmp, path)
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            files = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        """
+        Remove every cached entry.
+        """
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
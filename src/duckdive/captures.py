@@ -0,0 +1,427 @@
+import threading
+import zlib
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+from urllib.parse import parse_qsl, urlparse
+
+import duckdb
+
+from . import metrics
+from .asof import Time, parse_time
+from .cache import forecast_type_of, normalize_url
+from .warehouse import quote_literal
+
+# Table of a capture store holding the raw response bodies
+captures_table = "captures"
+
+
+@dataclass
+class Capture:
+    """A raw Surfline response body recorded by a CaptureStore."""
+
+    # Normalized url, see cache.normalize_url
+    url: str
+    spot_id: Optional[str]
+    forecast_type: str
+    # When the body was fetched from the API, and when its run started
+    fetched_at: datetime
+    recorded_at: datetime
+    body: str
+
+
+def spot_id_of(url: str) -> Optional[str]:
+    """
+    Return the spotId parameter of a Surfline API url, if it has one.
+    """
+    return dict(parse_qsl(urlparse(url).query)).get("spotId")
+
+
+def create_captures_table(
+    con: duckdb.DuckDBPyConnection, catalog: Optional[str] = None
+) -> None:
+    """
+    Create the captures table (and its url index) if it does not exist.
+
+    :param con: DuckDB connection
+    :param catalog: Catalog to create it in (defaults to the current one)
+    """
+    table = f'"{catalog}"."{captures_table}"' if catalog else f'"{captures_table}"'
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            url VARCHAR,
+            spot_id VARCHAR,
+            forecast_type VARCHAR,
+            fetched_at TIMESTAMP,
+            recorded_at TIMESTAMP,
+            bytes BIGINT,
+            body BLOB,
+            PRIMARY KEY (url, recorded_at)
+        )
+        """
+    )
+    con.execute(f"CREATE INDEX IF NOT EXISTS captures_url ON {table} (url)")
+
+
+class CaptureStore:
+    """
+    Store of raw Surfline response bodies in a DuckDB table, for reproducible
+    reruns of ingestion and formatting without the network.
+
+    Bodies are zlib-compressed and keyed by normalized url (the request's
+    parameters without the access token) and the start of the run that
+    recorded them, so every run keeps its own copy of each response. When
+    replaying, a url is answered with its latest capture fetched at or
+    before as_of.
+
+    Usage:
+        with CaptureStore("captures.duckdb") as captures:
+            client = SurflineClient(capture=captures)
+            ...
+        with CaptureStore("captures.duckdb", replay=True) as captures:
+            client = SurflineClient(capture=captures)
+    """
+
+    def __init__(
+        self,
+        database: Union[str, Path] = "captures.duckdb",
+        replay: bool = False,
+        as_of: Optional[Time] = None,
+        con: Optional[duckdb.DuckDBPyConnection] = None,
+        recorded_at: Optional[datetime] = None,
+        level: int = 6,
+    ):
+        """
+        :param database: DuckDB file of the store (ignored when con is given)
+        :param replay: Serve captures instead of recording them; the file is
+            opened read-only, so several processes can replay from it at once
+        :param as_of: When replaying, the latest captures fetched at or before
+            this time (defaults to the latest)
+        :param con: Existing DuckDB connection to record into instead, e.g. a
+            shard database whose captures are copied into the store later
+        :param recorded_at: Start time of the recording run (defaults to now)
+        :param level: zlib compression level of recorded bodies
+        :raises ValueError: If the file to replay from does not exist or has
+            no captures table
+        """
+        self.database = str(database)
+        self.replay = replay
+        self.as_of = parse_time(as_of) if as_of is not None else None
+        self.recorded_at = recorded_at or datetime.now()
+        self.level = level
+        self._owned = con is None
+        self._lock = threading.Lock()
+        if replay:
+            if con is None and not Path(self.database).exists():
+                raise ValueError(f"No capture store at {self.database}")
+            self.con = con or duckdb.connect(self.database, read_only=True)
+            tables = self.con.execute(
+                "SELECT count(*) FROM duckdb_tables() WHERE table_name = $1",
+                [captures_table],
+            ).fetchone()[0]
+            if not tables:
+                self.close()
+                raise ValueError(f"No captures in {self.database}")
+        else:
+            self.con = con or duckdb.connect(self.database)
+            create_captures_table(self.con)
+        self._cursor = self.con.cursor()
+
+    def record(self, url: str, body: str, fetched_at: Optional[float] = None) -> None:
+        """
+        Store a response body, replacing the run's earlier capture of the url.
+
+        :param url: Surfline API url the body was fetched from
+        :param body: Raw JSON response body
+        :param fetched_at: Unix time the body was fetched (defaults to now)
+        """
+        data = body.encode()
+        compressed = zlib.compress(data, self.level)
+        row = [
+            normalize_url(url, drop_secrets=True),
+            spot_id_of(url),
+            forecast_type_of(url),
+            datetime.fromtimestamp(fetched_at) if fetched_at else datetime.now(),
+            self.recorded_at,
+            len(data),
+            compressed,
+        ]
+        with self._lock:
+            self._cursor.execute(
+                f'INSERT OR REPLACE INTO "{captures_table}" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                row,
+            )
+        metrics.count("captures_recorded")
+
+    def get(self, url: str) -> Optional[Capture]:
+        """
+        Return the latest capture of a url fetched at or before as_of, or
+        None if there is none.
+        """
+        as_of = "AND fetched_at <= $as_of" if self.as_of is not None else ""
+        params = {"url": normalize_url(url, drop_secrets=True)}
+        if self.as_of is not None:
+            params["as_of"] = self.as_of
+        with self._lock:
+            row = self._cursor.execute(
+                f"""
+                SELECT url, spot_id, forecast_type, fetched_at, recorded_at, body
+                FROM "{captures_table}"
+                WHERE url = $url {as_of}
+                ORDER BY fetched_at DESC
+                LIMIT 1
+                """,
+                params,
+            ).fetchone()
+        return _capture(row) if row else None
+
+    def runs(
+        self, since: Optional[Time] = None, until: Optional[Time] = None
+    ) -> List[datetime]:
+        """
+        Return the start times of the recorded runs, oldest first.
+
+        :param since: Only runs recorded at or after this time
+        :param until: Only runs recorded at or before this time
+        """
+        filters, params = _range("recorded_at", since, until)
+        return [
+            row[0]
+            for row in self._cursor.execute(
+                f"""
+                SELECT DISTINCT recorded_at FROM "{captures_table}"
+                WHERE {filters} ORDER BY recorded_at
+                """,
+                params,
+            ).fetchall()
+        ]
+
+    def captures(
+        self,
+        recorded_at: datetime,
+        forecast_types: Optional[List[str]] = None,
+        spot_ids: Optional[List[str]] = None,
+        chunk_size: int = 64,
+    ) -> Iterator[Capture]:
+        """
+        Iterate over the captures of one run, reading chunk_size bodies at a
+        time, so memory stays flat however large the run.
+
+        :param recorded_at: Start time of the run, see runs()
+        :param forecast_types: Only these forecast types
+        :param spot_ids: Only these spots
+        :param chunk_size: Captures read from the store at once
+        """
+        filters = ["recorded_at = $recorded_at"]
+        params: Dict[str, object] = {"recorded_at": recorded_at}
+        if forecast_types:
+            filters.append("list_contains($types, forecast_type)")
+            params["types"] = list(forecast_types)
+        if spot_ids:
+            filters.append("list_contains($spots, spot_id)")
+            params["spots"] = list(spot_ids)
+        cursor = self.con.cursor()
+        try:
+            cursor.execute(
+                f"""
+                SELECT url, spot_id, forecast_type, fetched_at, recorded_at, body
+                FROM "{captures_table}"
+                WHERE {" AND ".join(filters)}
+                ORDER BY forecast_type, spot_id
+                """,
+                params,
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _capture(row)
+        finally:
+            cursor.close()
+
+    def close(self) -> None:
+        """
+        Close the store's connection, unless it was passed in.
+        """
+        if self._owned:
+            self.con.close()
+
+    def __enter__(self) -> "CaptureStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _capture(row: tuple) -> Capture:
+    url, spot_id, forecast_type, fetched_at, recorded_at, body = row
+    return Capture(
+        url=url,
+        spot_id=spot_id,
+        forecast_type=forecast_type,
+        fetched_at=fetched_at,
+        recorded_at=recorded_at,
+        body=zlib.decompress(body).decode(),
+    )
+
+
+def _range(column: str, since: Optional[Time], until: Optional[Time]) -> tuple:
+    filters, params = ["true"], {}
+    if since is not None:
+        filters.append(f"{column} >= $since")
+        params["since"] = parse_time(since)
+    if until is not None:
+        filters.append(f"{column} <= $until")
+        params["until"] = parse_time(until)
+    return " AND ".join(filters), params
+
+
+def copy_captures(database: Union[str, Path], sources: List[Union[str, Path]]) -> int:
+    """
+    Copy the captures recorded into other databases, e.g. the shards of a
+    sharded ingestion, into a capture store.
+
+    :param database: DuckDB file of the capture store
+    :param sources: DuckDB files holding captures tables; files without one
+        are skipped
+    :return: Number of captures copied
+    """
+    copied = 0
+    with duckdb.connect(str(database)) as con:
+        create_captures_table(con)
+        for index, source in enumerate(sources):
+            con.execute(f"ATTACH {quote_literal(source)} AS source{index} (READ_ONLY)")
+            exists = con.execute(
+                """
+                SELECT count(*) FROM duckdb_tables()
+                WHERE database_name = $1 AND table_name = $2
+                """,
+                [f"source{index}", captures_table],
+            ).fetchone()[0]
+            if exists:
+                copied += con.execute(
+                    f"""
+                    INSERT OR REPLACE INTO "{captures_table}"
+                    SELECT * FROM source{index}."{captures_table}"
+                    """
+                ).fetchone()[0]
+            con.execute(f"DETACH source{index}")
+    return copied
+
+
+@dataclass
+class ReplayedRun:
+    """
+    Outcome of reprocessing one recorded run into a warehouse.
+    """
+
+    recorded_at: datetime
+    captures: int = 0
+    # Captures that failed validation or loading, and were left out
+    errors: int = 0
+    # Rows written per forecast type, and records rejected under "rejects"
+    inserted: Dict[str, int] = field(default_factory=dict)
+
+
+def replay_history(
+    store: CaptureStore,
+    database: Union[str, Path],
+    forecast_types: Optional[List[str]] = None,
+    spot_ids: Optional[List[str]] = None,
+    since: Optional[Time] = None,
+    until: Optional[Time] = None,
+    layout: str = "versions",
+    validate: str = "sample",
+    batch_size: Optional[int] = None,
+    on_run: Optional[Callable[[ReplayedRun], None]] = None,
+) -> List[ReplayedRun]:
+    """
+    Reprocess every recorded run of a capture store into a warehouse, oldest
+    first, e.g. after a schema change in models.py. Each run is upserted with
+    its start time as fetch time, so the warehouse holds the versions it
+    would have held had the runs been loaded with the current code. Nothing
+    is fetched: the time taken is that of reading, parsing and upserting.
+
+    :param store: CaptureStore to read the runs from
+    :param database: Warehouse database file
+    :param forecast_types: Only these forecast types
+    :param spot_ids: Only these spots
+    :param since: Only runs recorded at or after this time
+    :param until: Only runs recorded at or before this time
+    :param layout: Layout of new warehouse tables, see upsert_forecast
+    :param validate: How records are validated, one of ingest.validation_modes
+    :param batch_size: Load records through pyarrow in batches of this many
+        rows, see batches.BatchLoader
+    :param on_run: Callback invoked with each ReplayedRun once it is upserted
+    :return: ReplayedRun of each run
+    """
+    from .ingest import insert_json, insert_rejects, rejects_table, validate_body
+    from .warehouse import attach_warehouse, save_rejects, upsert_forecast
+
+    replayed = []
+    con = duckdb.connect()
+    try:
+        catalog = attach_warehouse(con, str(database))
+        for recorded_at in store.runs(since, until):
+            run = ReplayedRun(recorded_at=recorded_at)
+            loader = None
+            if batch_size:
+                from .batches import BatchLoader
+
+                loader = BatchLoader(con, batch_size)
+            created = set()
+            with loader or nullcontext():
+                for capture in store.captures(recorded_at, forecast_types, spot_ids):
+                    run.captures += 1
+                    forecast_type = capture.forecast_type
+                    tags = {"spot_id": capture.spot_id, "forecast_type": forecast_type}
+                    try:
+                        report = validate_body(
+                            con, capture.body, forecast_type, validate
+                        )
+                        rejects = report.rejects if report else []
+                        skip = [reject.index for reject in rejects]
+                        if loader is not None:
+                            loader.add(
+                                forecast_type, capture.body, forecast_type, tags, skip
+                            )
+                        else:
+                            insert_json(
+                                con,
+                                forecast_type,
+                                capture.body,
+                                forecast_type,
+                                tags=tags,
+                                replace=forecast_type not in created,
+                                skip=skip,
+                            )
+                        created.add(forecast_type)
+                        insert_rejects(con, forecast_type, rejects, tags)
+                    except Exception:
+                        run.errors += 1
+
+            for forecast_type in sorted(created):
+                run.inserted[forecast_type] = upsert_forecast(
+                    con,
+                    forecast_type,
+                    source=forecast_type,
+                    fetched_at=recorded_at,
+                    catalog=catalog,
+                    layout=layout,
+                )
+                con.execute(f'DROP TABLE "{forecast_type}"')
+            rejected = save_rejects(con, rejects_table, catalog)
+            if rejected:
+                run.inserted[rejects_table] = rejected
+            con.execute(f'DROP TABLE IF EXISTS "{rejects_table}"')
+            replayed.append(run)
+            if on_run:
+                on_run(run)
+        con.execute(f'CHECKPOINT "{catalog}"')
+    finally:
+        con.close()
+    return replayed
@@ -0,0 +1,265 @@
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+import duckdb
+
+from . import metrics
+from .cache import ResponseCache
+from .captures import CaptureStore
+from .constants import transports
+from .errors import (
+    CaptureMissingError,
+    SurflineAPIError,
+    TransportError,
+    error_for_status,
+    parse_retry_after,
+)
+from .query_surfline import fetch_surfline, load_http_client
+from .scheduler import RequestOutcome, RequestScheduler
+
+
+class SurflineClient:
+    """
+    Long-lived Surfline client that owns one DuckDB connection.
+
+    The http_client extension is installed and loaded once when the client is
+    created, and with the "requests" transport a pooled keep-alive session is
+    reused for every request. The client is safe to share between threads:
+    each thread sends its DuckDB requests on its own cursor of the connection.
+
+    Usage:
+        with SurflineClient() as client:
+            for url in urls:
+                client.query(url)
+    """
+
+    def __init__(
+        self,
+        database: str = ":memory:",
+        transport: str = "duckdb",
+        con: Optional[duckdb.DuckDBPyConnection] = None,
+        pool_size: int = 10,
+        timeout: float = 30,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        capture: Optional[CaptureStore] = None,
+    ):
+        """
+        :param database: DuckDB database file to connect to (ignored when con is given)
+        :param transport: How requests are sent, "duckdb" (http_client extension) or "requests"
+        :param con: Existing DuckDB connection to use instead of opening a new
+            one; it stays open when the client is closed
+        :param pool_size: Number of keep-alive connections kept by the requests session
+        :param timeout: Request timeout in seconds for the requests transport
+        :param cache: ResponseCache to serve fresh responses from (no caching if None)
+        :param scheduler: RequestScheduler rate limiting and retrying requests (one attempt each if None)
+        :param capture: CaptureStore recording every response body served, or
+            answering every request when it replays (no transport is set up then)
+        """
+        if transport not in transports:
+            raise ValueError(f"Invalid transport. Must be one of {transports}")
+
+        self._owned = con is None
+        with metrics.stage("connect"):
+            self.con = con or duckdb.connect(database)
+        self.transport = transport
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.capture = capture
+        self._local = threading.local()
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self.session = None
+
+        # A replaying client answers every request from its captures
+        replaying = capture is not None and capture.replay
+        if transport == "duckdb" and not replaying:
+            with metrics.stage("extension_load"):
+                load_http_client(self.con)
+        elif not replaying:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """
+        Return this thread's cursor of the client's connection, creating it on first use.
+        """
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            with self._lock:
+                # Close the cursors of finished threads, e.g. the workers of an
+                # earlier thread pool, so long-running clients do not pile them up
+                for thread in [t for t in self._cursors if not t.is_alive()]:
+                    self._cursors.pop(thread).close()
+                cursor = self._local.cursor = self.con.cursor()
+                self._cursors[threading.current_thread()] = cursor
+        return cursor
+
+    def fetch(self, url: str) -> Tuple[int, str, Optional[Union[str, Dict[str, Any]]]]:
+        """
+        Send a GET request for the given Surfline API url.
+        With a cache, fresh entries are returned without a request and stale
+        entries are revalidated with their ETag / Last-Modified headers.
+
+        :param url: Surfline API url
+        :return: Tuple of (status, reason, body) where body is the raw JSON response body
+        :raises TransportError: If no response was received
+        """
+        try:
+            body, outcome = self.request(url)
+        except SurflineAPIError as e:
+            if e.status is None:
+                raise
+            return e.status, e.reason, None
+        return outcome.status, outcome.reason, body
+
+    def request(self, url: str) -> Tuple[str, RequestOutcome]:
+        """
+        Fetch a Surfline API url, through the client's scheduler if it has one.
+        Uses the cache like fetch(), but raises a typed error on failure.
+
+        :param url: Surfline API url
+        :return: Tuple of (body, RequestOutcome) where body is the raw JSON response body
+        :raises SurflineAPIError: RateLimitedError, ServerError, ClientError or
+            TransportError if the request failed, CaptureMissingError if a
+            replayed url was never captured
+        """
+        if self.capture is not None and self.capture.replay:
+            capture = self.capture.get(url)
+            if capture is None:
+                raise CaptureMissingError(f"No capture of {url}", url=url)
+            metrics.count("captures_replayed")
+            outcome = RequestOutcome(
+                url=url, status=200, reason="OK (replayed)", cached=True
+            )
+            return capture.body, outcome
+
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(url, entry):
+            metrics.count("cache_hits")
+            outcome = RequestOutcome(
+                url=url, status=200, reason="OK (cached)", cached=True
+            )
+            self._record(url, entry.body, entry.fetched_at)
+            return entry.body, outcome
+
+        def send():
+            return self._send(url, entry.validators() if entry is not None else {})
+
+        if self.scheduler is not None:
+            (status, reason, body, headers), outcome = self.scheduler.call(url, send)
+        else:
+            outcome = RequestOutcome(url=url, attempts=1)
+            try:
+                status, reason, body, headers = send()
+            except Exception as e:
+                raise TransportError(f"Request failed: {e}", url=url) from e
+            outcome.status, outcome.reason = status, reason
+            if status not in (200, 304):
+                error = error_for_status(
+                    status, reason, url, parse_retry_after(headers.get("Retry-After"))
+                )
+                outcome.error = type(error).__name__
+                error.outcome = outcome
+                raise error
+
+        if self.cache is not None:
+            if status == 304 and entry is not None:
+                metrics.count("not_modified")
+                self.cache.refresh(url, entry)
+                outcome.status, outcome.reason = 200, "Not Modified (cached)"
+                outcome.cached = True
+                self._record(url, entry.body, entry.fetched_at)
+                return entry.body, outcome
+            if status == 200 and body is not None:
+                self.cache.put(
+                    url,
+                    body,
+                    etag=headers.get("ETag"),
+                    last_modified=headers.get("Last-Modified"),
+                )
+        if status == 200 and body is not None:
+            self._record(url, body)
+        return body, outcome
+
+    def _record(self, url: str, body: str, fetched_at: Optional[float] = None) -> None:
+        """
+        Record a response body served by the client, if it has a CaptureStore.
+        """
+        if self.capture is not None:
+            self.capture.record(url, body, fetched_at)
+
+    def _send(self, url: str, headers: Dict[str, str]) -> Tuple[int, str, Any, Any]:
+        """
+        Send the request over the client's transport.
+        Conditional request headers are only sent by the requests transport.
+
+        :return: Tuple of (status, reason, body, response headers)
+        """
+        with metrics.stage("http"):
+            if self.session is None:
+                status, reason, body = fetch_surfline(self.cursor(), url)
+                headers = {}
+            else:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                status, reason = response.status_code, response.reason
+                body = response.text if status == 200 else None
+                headers = response.headers
+
+        metrics.count("requests")
+        if body is not None:
+            metrics.count("bytes_received", len(body))
+        return status, reason, body, headers
+
+    def query(
+        self, url: str, table: str = "surfline_data", validate: str = "sample"
+    ) -> Optional[str]:
+        """
+        Fetch a Surfline API url and store its records in a table of the client's connection.
+
+        :param url: Surfline API url
+        :param table: Name of the table to create
+        :param validate: How records are validated, one of ingest.validation_modes
+        :return: The forecast type that was stored, or None if no data was found
+        :raises SurflineAPIError: If the API request fails
+        """
+        from .ingest import ingest_body
+
+        body, _ = self.request(url)
+
+        return ingest_body(self.cursor(), table, body, validate=validate, replace=True)
+
+    def release(self) -> duckdb.DuckDBPyConnection:
+        """
+        Close the HTTP session and the per-thread cursors, and hand the DuckDB
+        connection over to the caller, who closes it once done with its tables.
+        """
+        if self.session is not None:
+            self.session.close()
+        for cursor in self._cursors.values():
+            cursor.close()
+        self._cursors = {}
+        self._owned = False
+        return self.con
+
+    def close(self) -> None:
+        """
+        Close the HTTP session, the per-thread cursors and the DuckDB
+        connection, unless the connection was passed in.
+        """
+        owned = self._owned
+        self.release()
+        if owned:
+            self.con.close()
+
+    def __enter__(self) -> "SurflineClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,200 @@
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import duckdb
+
+from . import metrics
+from .api import valid_types
+from .views import create_views
+from .warehouse import (
+    attach_warehouse,
+    create_table,
+    describe,
+    generation,
+    issue_column,
+    lock_timeout,
+    quote_literal,
+    time_column,
+)
+
+# Default retention: every version younger than this many days is kept at
+# hourly granularity (the last version fetched in each hour), older ones at
+# daily granularity (the last version fetched in each day)
+default_hourly_days = 7
+
+
+@dataclass
+class CompactionResult:
+    """
+    Outcome of compacting a warehouse file.
+    """
+
+    path: str
+    bytes_before: int = 0
+    bytes_after: int = 0
+    rows_before: Dict[str, int] = field(default_factory=dict)
+    rows_after: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def rows_removed(self) -> int:
+        return sum(self.rows_before.values()) - sum(self.rows_after.values())
+
+
+def retention_sql(
+    source: str,
+    columns: list,
+    forecast_type: str,
+    drop_replaced: bool = False,
+) -> str:
+    """
+    Build the query returning the versions of a warehouse table kept by the
+    retention policy, sorted by (spot_id, time column, fetch time):
+
+    - versions fetched after $hourly_cutoff: the last one of each hour
+    - older versions: the last one of each day
+    - with drop_replaced, versions replaced before $max_cutoff are dropped
+    - the current version of every record is always kept
+
+    In the "ranges" layout valid_to is recomputed so that the kept versions
+    still form an unbroken chain.
+
+    :param source: Fully qualified table name
+    :param columns: Column names of the table
+    :param forecast_type: Forecast type stored in the table
+    :param drop_replaced: Drop the versions replaced before $max_cutoff
+    :return: SQL query with $hourly_cutoff (and $max_cutoff) parameters
+    """
+    key = time_column(forecast_type)
+    issued = issue_column(columns)
+    record = f'spot_id, "{key}"'
+    bucket = (
+        f"CASE WHEN {issued} >= $hourly_cutoff THEN date_trunc('hour', {issued})"
+        f" ELSE date_trunc('day', {issued}) END"
+    )
+    where = "replaced_at IS NULL OR replaced_at >= $max_cutoff"
+    query = f"""
+        SELECT * EXCLUDE (replaced_at) FROM (
+            SELECT *, lead({issued}) OVER (PARTITION BY {record} ORDER BY {issued})
+                AS replaced_at
+            FROM {source}
+        )
+        {f"WHERE {where}" if drop_replaced else ""}
+        QUALIFY row_number() OVER (
+            PARTITION BY {record}, {bucket} ORDER BY {issued} DESC
+        ) = 1
+    """
+    if issued == "valid_from":
+        query = f"""
+            SELECT * REPLACE (
+                lead(valid_from) OVER (PARTITION BY {record} ORDER BY valid_from)
+                    AS valid_to
+            )
+            FROM ({query})
+        """
+    return f"{query} ORDER BY {record}, {issued}"
+
+
+@metrics.timed("compact")
+def compact_warehouse(
+    path: Union[str, Path],
+    hourly_days: float = default_hourly_days,
+    max_days: Optional[float] = None,
+    now: Optional[datetime] = None,
+    timeout: float = lock_timeout,
+) -> CompactionResult:
+    """
+    Apply the retention policy to a warehouse file and rewrite it compacted.
+
+    Every forecast table is copied, thinned by retention_sql, into a new
+    database file sorted by (spot_id, time column, fetch time), and any other
+    table (e.g. rejects) is copied as it is. The small batches written
+    by each run end up in large sorted row groups whose min/max statistics
+    let spot and time filters skip most of the file. The new file then
+    replaces the old one, which also returns the space of deleted and updated
+    rows. The source stays attached, and locked against other writers, until
+    it is replaced; if its file changes anyway, nothing is replaced.
+
+    :param path: Warehouse database file
+    :param hourly_days: Days of versions kept at hourly granularity
+    :param max_days: Days after which replaced versions are dropped (kept forever if None)
+    :param now: Reference time of the retention cutoffs (defaults to now)
+    :param timeout: Seconds to wait for other processes (e.g. duckdive serve)
+        to release the warehouse file
+    :return: CompactionResult
+    :raises RuntimeError: If the warehouse file changed during compaction
+    :raises duckdb.IOException: If the warehouse is still open in another process
+        after timeout seconds
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"No warehouse at {path}")
+    if max_days is not None and max_days < hourly_days:
+        raise ValueError("max_days must be at least hourly_days")
+    now = now or datetime.now()
+    params = {"hourly_cutoff": now - timedelta(days=hourly_days)}
+    if max_days is not None:
+        params["max_cutoff"] = now - timedelta(days=max_days)
+
+    compacted = path.with_name(f"{path.name}.compact")
+    compacted.unlink(missing_ok=True)
+    wal = Path(f"{path}.wal")
+    start = datetime.now()
+
+    con = duckdb.connect()
+    try:
+        # Attached read-write, the source holds DuckDB's file lock until it has
+        # been replaced, so no other process can write to it in the meantime
+        attach_warehouse(con, str(path), "source", timeout=timeout)
+        # Fold the write-ahead log into the file: a log left next to the
+        # replaced file would be replayed onto the compacted copy
+        con.execute('CHECKPOINT "source"')
+        if wal.exists():
+            raise RuntimeError(f"Could not checkpoint the write-ahead log of {path}")
+        stamp = generation(str(path))
+        result = CompactionResult(path=str(path), bytes_before=path.stat().st_size)
+
+        con.execute(f"ATTACH {quote_literal(compacted)} AS compacted")
+        tables = [
+            row[0]
+            for row in con.execute(
+                "SELECT table_name FROM duckdb_tables() WHERE database_name = 'source'"
+            ).fetchall()
+        ]
+        for table in tables:
+            source, target = f'source."{table}"', f'compacted."{table}"'
+            if table not in valid_types:
+                # e.g. the rejects table, which is copied as it is
+                con.execute(f"CREATE TABLE {target} AS FROM {source}")
+            else:
+                columns = describe(con, source)
+                names = [name for name, _ in columns]
+                query = retention_sql(source, names, table, max_days is not None)
+                create_table(con, target, table, columns)
+                con.execute(f"INSERT INTO {target} {query}", params)
+            result.rows_before[table] = con.execute(
+                f"SELECT count(*) FROM {source}"
+            ).fetchone()[0]
+            result.rows_after[table] = con.execute(
+                f"SELECT count(*) FROM {target}"
+            ).fetchone()[0]
+        create_views(con, "compacted")
+        con.execute('CHECKPOINT "compacted"')
+        con.execute("DETACH compacted")
+
+        if generation(str(path)) != stamp:
+            raise RuntimeError(f"{path} changed while it was compacted")
+        os.replace(compacted, path)
+    except Exception:
+        con.close()
+        compacted.unlink(missing_ok=True)
+        raise
+    con.close()
+
+    result.bytes_after = path.stat().st_size
+    result.seconds = (datetime.now() - start).total_seconds()
+    metrics.count("rows_removed", result.rows_removed)
+    return result
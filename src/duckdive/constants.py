@@ -0,0 +1,54 @@
+"""
+Option choices, forecast type groups and warehouse columns shared by the CLI
+and the modules implementing them.
+
+This module must stay free of third-party imports: the CLI reads these lists
+while building its options, before any heavy dependency is loaded.
+"""
+
+# How requests are sent: through DuckDB's http_client extension or a requests session
+transports = ["duckdb", "requests"]
+
+# How records are validated with the pydantic models before they are stored:
+# "full" validates every record and fails the response on any invalid one,
+# "lenient" validates every record and quarantines the invalid ones in a
+# rejects table, "sample" lets DuckDB parse the body and validates a few
+# records, "none" skips pydantic entirely (e.g. for trusted replays)
+validation_modes = ["full", "lenient", "sample", "none"]
+
+# Compression codecs accepted by DuckDB's Parquet writer
+parquet_compressions = ["zstd", "snappy", "gzip", "lz4", "uncompressed"]
+
+# Forecast types reported once per day rather than per interval
+daily_types = ["sunlight", "conditions"]
+
+# DuckDB type ids of the numeric columns that can be interpolated
+numeric_types = {"double", "float", "decimal"}
+
+# How warehouse tables store forecast versions: "versions" keeps a row per
+# changed version keyed on its fetched_at, "ranges" keeps a row per version
+# with the valid_from / valid_to fetch times it was current between
+warehouse_layouts = ["versions", "ranges"]
+
+# Columns added to every warehouse table on top of the forecast data
+meta_columns = {
+    "spot_id": "VARCHAR",
+    "forecast_type": "VARCHAR",
+    "fetched_at": "TIMESTAMP",
+    "row_hash": "UBIGINT",
+}
+
+# Columns of "ranges" layout tables, which store each version once with the
+# fetch time it was first seen (valid_from) and the fetch time it was replaced
+# (valid_to, NULL for the current version) instead of a fetched_at per version
+range_columns = {
+    "spot_id": "VARCHAR",
+    "forecast_type": "VARCHAR",
+    "valid_from": "TIMESTAMP",
+    "valid_to": "TIMESTAMP",
+    "row_hash": "UBIGINT",
+}
+
+# Response formats of duckdive serve: a JSON array of row objects, CSV with a
+# header row, or an Arrow IPC stream (needs pyarrow)
+serve_formats = ["json", "csv", "arrow"]
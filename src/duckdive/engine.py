@@ -0,0 +1,278 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, time
+from itertools import islice
+from typing import Callable, List, Optional, Tuple
+
+import duckdb
+
+from .api import construct_surfline_api_url, surfline_api_url, valid_types
+from .client import SurflineClient
+from .constants import daily_types
+from .errors import SurflineAPIError
+from .ingest import insert_json, insert_rejects, rejects_table, validate_body
+from .resample import base_interval_hours, hourly_table, resample_tables
+from .scheduler import RequestScheduler
+from .validation import Reject
+from .views import create_views
+
+# Column subset returned for each forecast type when simplifying a report
+simple_columns = {
+    "rating": ["timestamp", "rating"],
+    "conditions": ["timestamp", "forecastDay", "observation"],
+    "swells": ["timestamp", "swells"],
+    "sunlight": ["midnight", "sunrise", "sunset"],
+    "wave": ["timestamp", "surf"],
+    "wind": ["timestamp", "speed", "gust", "directionType"],
+    "tides": ["timestamp", "type", "height"],
+    "weather": ["timestamp", "temperature", "condition"],
+}
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a single forecast type for a single spot."""
+
+    spot_id: str
+    forecast_type: str
+    url: str
+    body: Optional[str] = None
+    rows: int = 0
+    error: Optional[str] = None
+    # HTTP status of the last attempt, number of attempts and the error's type name
+    status: Optional[int] = None
+    attempts: int = 0
+    error_type: Optional[str] = None
+    # Records left out by lenient validation
+    rejects: List[Reject] = field(default_factory=list)
+
+
+def fetch_job(
+    client: SurflineClient,
+    spot_id: str,
+    forecast_type: str,
+    url: str,
+    validate: str = "sample",
+) -> FetchResult:
+    """
+    Fetch and validate one Surfline url with the shared client.
+
+    :param client: SurflineClient shared by every worker
+    :param spot_id: Surfline spot id
+    :param forecast_type: Forecast type of the url
+    :param url: Surfline API url
+    :param validate: How records are validated, one of ingest.validation_modes
+    :return: FetchResult holding the response body or the error
+    """
+    result = FetchResult(spot_id=spot_id, forecast_type=forecast_type, url=url)
+    try:
+        body, outcome = client.request(url)
+        result.status, result.attempts = outcome.status, outcome.attempts
+        report = validate_body(client.cursor(), body, forecast_type, validate)
+        if report is not None:
+            result.rejects = report.rejects
+        result.body = body
+    except SurflineAPIError as e:
+        result.error, result.error_type = str(e), type(e).__name__
+        result.status = e.status
+        result.attempts = e.outcome.attempts if e.outcome is not None else 1
+    except Exception as e:
+        result.error, result.error_type = str(e), type(e).__name__
+    return result
+
+
+def fetch_report(
+    spot_ids: List[str],
+    forecast_types: Optional[List[str]] = None,
+    days: Optional[int] = 3,
+    interval_hours: Optional[float] = 1,
+    max_heights: Optional[bool] = True,
+    sds: Optional[bool] = True,
+    access_token: Optional[str] = None,
+    max_workers: int = 8,
+    client: Optional[SurflineClient] = None,
+    base_url: str = surfline_api_url,
+    validate: str = "sample",
+    on_result: Optional[Callable[[FetchResult], None]] = None,
+    resample: bool = False,
+    batch_size: Optional[int] = None,
+) -> duckdb.DuckDBPyConnection:
+    """
+    Fetch every forecast type for every spot over a bounded thread pool and
+    land the results in one DuckDB database, one table per forecast type.
+    Each row is tagged with its spot_id and forecast_type.
+
+    At most twice max_workers fetches are in flight or waiting to be loaded
+    at once, so bodies do not pile up in memory when loading falls behind.
+
+    :param spot_ids: List of Surfline spot ids
+    :param forecast_types: List of forecast types to fetch (defaults to all valid types)
+    :param days: Number of forecast days
+    :param interval_hours: Interval hours for forecast
+    :param max_heights: Include max heights in output
+    :param sds: Use LOTUS forecast engine
+    :param access_token: Access token for premium data
+    :param max_workers: Maximum number of requests in flight at once
+    :param client: SurflineClient to fetch with and write into (defaults to a new
+        in-memory client whose RequestScheduler rate limits and retries requests,
+        and whose HTTP session is closed before returning)
+    :param base_url: Base url of the forecasts API
+    :param validate: How records are validated, one of ingest.validation_modes;
+        records rejected by "lenient" validation go to the rejects table
+    :param on_result: Callback invoked with each FetchResult as it completes
+    :param resample: Fetch at the base interval and resample the tables to
+        interval_hours locally, so every interval shares one cacheable response;
+        the fetched records stay in resample.hourly_table of each type
+    :param batch_size: Load records through pyarrow in batches of this many rows
+        (see batches.BatchLoader) instead of one INSERT per body; needs pyarrow
+    :return: DuckDB connection holding one table per fetched forecast type
+    """
+    forecast_types = forecast_types or valid_types
+    resample_hours = None
+    if resample and interval_hours and interval_hours > base_interval_hours:
+        resample_hours, interval_hours = interval_hours, base_interval_hours
+    owned = client is None
+    client = client or SurflineClient(
+        pool_size=max_workers, scheduler=RequestScheduler(max_concurrency=max_workers)
+    )
+
+    # Construct every url up front so invalid parameters fail before any request
+    jobs = [
+        (
+            spot_id,
+            forecast_type,
+            construct_surfline_api_url(
+                spot_id=spot_id,
+                days=days,
+                interval_hours=interval_hours,
+                max_heights=max_heights,
+                sds=sds,
+                access_token=access_token,
+                forecast_type=forecast_type,
+                base_url=base_url,
+            ),
+        )
+        for forecast_type in forecast_types
+        for spot_id in spot_ids
+    ]
+
+    # Bodies are parsed into their table as soon as they arrive, replacing
+    # each table from a previous report on its first insert
+    created = set()
+    loader = None
+    if batch_size:
+        from .batches import BatchLoader
+
+        loader = BatchLoader(client.con, batch_size)
+    client.con.execute(f'DROP TABLE IF EXISTS "{rejects_table}"')
+    # Hourly tables left by an earlier resampled report on the same connection
+    for forecast_type in forecast_types:
+        client.con.execute(f'DROP TABLE IF EXISTS "{hourly_table(forecast_type)}"')
+    queued = iter(jobs)
+    # The executor is shut down before the loader appends its last batches
+    with loader or nullcontext(), ThreadPoolExecutor(max_workers) as executor:
+
+        def submit(job: Tuple[str, str, str]):
+            return executor.submit(fetch_job, client, *job, validate=validate)
+
+        pending = {submit(job) for job in islice(queued, max_workers * 2)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = next(queued, None)
+                if job is not None:
+                    pending.add(submit(job))
+                result = future.result()
+                if result.body is not None:
+                    tags = {
+                        "spot_id": result.spot_id,
+                        "forecast_type": result.forecast_type,
+                    }
+                    skip = [reject.index for reject in result.rejects]
+                    try:
+                        if loader is not None:
+                            result.rows = loader.add(
+                                result.forecast_type,
+                                result.body,
+                                result.forecast_type,
+                                tags=tags,
+                                skip=skip,
+                            )
+                        else:
+                            result.rows = insert_json(
+                                client.con,
+                                result.forecast_type,
+                                result.body,
+                                result.forecast_type,
+                                tags=tags,
+                                replace=result.forecast_type not in created,
+                                skip=skip,
+                            )
+                        created.add(result.forecast_type)
+                        insert_rejects(
+                            client.con, result.forecast_type, result.rejects, tags
+                        )
+                    except Exception as e:
+                        result.error = str(e)
+                    result.body = None
+                if on_result:
+                    on_result(result)
+
+    if resample_hours:
+        resample_tables(client.con, sorted(created), resample_hours)
+    create_views(client.con)
+    return client.release() if owned else client.con
+
+
+def today_bounds(daily: bool = False) -> Tuple[int, int]:
+    """
+    Return the Unix timestamps bounding today's report window: 7am-8pm local
+    time, or the whole day for daily forecast types.
+    """
+    date = datetime.now().date()
+    start, end = (time.min, time.max) if daily else (time(7), time(20))
+    return (
+        int(datetime.combine(date, start).timestamp()),
+        int(datetime.combine(date, end).timestamp()),
+    )
+
+
+def report_query(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    simplify: bool = True,
+    today: bool = True,
+    columns: Optional[List[str]] = None,
+) -> str:
+    """
+    Build the SQL selecting a report table with the requested subset of columns and rows.
+
+    :param con: DuckDB connection holding the report tables
+    :param forecast_type: Forecast type (and table name) to select
+    :param simplify: Return only the simplified column subset
+    :param today: Only include today's data (7am-8pm, or the whole day for daily types)
+    :param columns: Columns to select besides spot_id, overriding simplify; names
+        the table does not have are skipped, since report tables differ by type
+    :return: SQL query string
+    """
+    available = [
+        row[0] for row in con.execute(f'DESCRIBE "{forecast_type}"').fetchall()
+    ]
+    if columns:
+        keep = {"spot_id", *columns}
+    elif simplify:
+        keep = {"spot_id", *simple_columns.get(forecast_type, available)}
+    else:
+        keep = set(available)
+    columns = [column for column in available if column in keep]
+
+    projection = ", ".join(f'"{column}"' for column in columns)
+    query = f'SELECT {projection} FROM "{forecast_type}"'
+    time_column = "midnight" if forecast_type == "sunlight" else "timestamp"
+
+    if today:
+        start_ts, end_ts = today_bounds(daily=forecast_type in daily_types)
+        query += f" WHERE {time_column} BETWEEN {start_ts} AND {end_ts}"
+
+    return f"{query} ORDER BY spot_id, {time_column}"
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class SurflineAPIError(RuntimeError):
+    """
+    A Surfline API request that did not return data.
+
+    Subclasses RuntimeError, which is what failed requests raised before the
+    error types were introduced.
+    """
+
+    # Whether sending the same request again may succeed
+    retryable = False
+
+    def __init__(
+        self,
+        message: str,
+        url: Optional[str] = None,
+        status: Optional[int] = None,
+        reason: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        # RequestOutcome of the request, set by the RequestScheduler that gave up on it
+        self.outcome = None
+
+
+class RateLimitedError(SurflineAPIError):
+    """The API answered 429 Too Many Requests."""
+
+    retryable = True
+
+
+class ServerError(SurflineAPIError):
+    """The API answered with a 5xx status."""
+
+    retryable = True
+
+
+class ClientError(SurflineAPIError):
+    """The API rejected the request with a 4xx status other than 429."""
+
+
+class TransportError(SurflineAPIError):
+    """The request failed before a response arrived, e.g. a refused connection or timeout."""
+
+    retryable = True
+
+
+class CaptureMissingError(SurflineAPIError):
+    """A replayed request whose url has no capture in the CaptureStore."""
+
+
+class RecordValidationError(ValueError):
+    """
+    Records of a response body that do not match their forecast type's model.
+    """
+
+    # Number of invalid records described in the message
+    shown = 5
+
+    def __init__(self, forecast_type: str, errors: Dict[Optional[int], str]):
+        """
+        :param forecast_type: Forecast type of the response
+        :param errors: Error messages by record index, or by None for errors
+            outside the records (e.g. a body that is not a response)
+        """
+        self.forecast_type = forecast_type
+        self.errors = errors
+        if None in errors:
+            message = f"Invalid {forecast_type} response: {errors[None]}"
+        else:
+            invalid = sorted(errors)
+            message = f"{len(invalid)} invalid {forecast_type} records: " + "; ".join(
+                f"#{index} {errors[index]}" for index in invalid[: self.shown]
+            )
+            if len(invalid) > self.shown:
+                message += f"; and {len(invalid) - self.shown} more"
+        super().__init__(message)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header, given either as seconds or as an HTTP date.
+
+    :return: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def error_for_status(
+    status: int,
+    reason: Optional[str],
+    url: Optional[str] = None,
+    retry_after: Optional[float] = None,
+) -> SurflineAPIError:
+    """
+    Return the typed error for a failed response status.
+    """
+    message = f"API request failed with status {status}: {reason}"
+    if status == 429:
+        error_type = RateLimitedError
+    elif status >= 500:
+        error_type = ServerError
+    else:
+        error_type = ClientError
+    return error_type(
+        message, url=url, status=status, reason=reason, retry_after=retry_after
+    )
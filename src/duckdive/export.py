@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Optional
+
+import duckdb
+
+from . import metrics
+from .constants import parquet_compressions
+from .warehouse import quote_literal, time_column
+
+# Hive partition columns of Parquet exports, outermost first
+partition_columns = ["spot_id", "forecast_type", "forecast_date"]
+
+
+@metrics.timed("export")
+def export_csv(con: duckdb.DuckDBPyConnection, source: str, path: str) -> None:
+    """
+    Export a table or query to a CSV file with a header row.
+
+    :param con: DuckDB connection
+    :param source: Table name or parenthesized query to export
+    :param path: Path of the CSV file
+    """
+    con.execute(f"COPY {source} TO {quote_literal(path)} (HEADER, DELIMITER ',')")
+
+
+@metrics.timed("export")
+def export_parquet(
+    con: duckdb.DuckDBPyConnection,
+    source: str,
+    directory: str,
+    forecast_type: str,
+    spot_id: Optional[str] = None,
+    fetched_at: Optional[datetime] = None,
+    compression: str = "zstd",
+    row_group_size: int = 122880,
+) -> None:
+    """
+    Append a forecast table to a Hive-partitioned Parquet archive laid out as
+    <directory>/spot_id=.../forecast_type=.../forecast_date=.../data_<uuid>.parquet.
+
+    Every export writes new files next to the existing ones, so repeated runs
+    add partitions (or files within a partition) without rewriting old data.
+    Files get unique names rather than relying on COPY's APPEND option, which
+    needs DuckDB 1.1.
+
+    :param con: DuckDB connection
+    :param source: Name of the table holding the forecast records
+    :param directory: Root directory of the Parquet archive
+    :param forecast_type: Forecast type of the records
+    :param spot_id: Spot id of the records, if the source has no spot_id column
+    :param fetched_at: Fetch time recorded on every row (defaults to now)
+    :param compression: Parquet compression codec, one of parquet_compressions
+    :param row_group_size: Number of rows per Parquet row group
+    """
+    if compression not in parquet_compressions:
+        raise ValueError(f"Invalid compression. Must be one of {parquet_compressions}")
+
+    columns = [row[0] for row in con.execute(f'DESCRIBE "{source}"').fetchall()]
+    key = time_column(forecast_type)
+
+    # Tag rows with the partition and fetch columns the source does not have
+    tags = {
+        "spot_id": ("VARCHAR", spot_id),
+        "forecast_type": ("VARCHAR", forecast_type),
+        "fetched_at": ("TIMESTAMP", fetched_at or datetime.now()),
+    }
+    projection = ["*"]
+    params = {}
+    for name, (type_, value) in tags.items():
+        if name not in columns:
+            projection.append(f"${name}::{type_} AS {name}")
+            params[name] = value
+    projection.append(f'to_timestamp("{key}")::DATE AS forecast_date')
+
+    con.execute(
+        f"""
+        COPY (
+            SELECT {", ".join(projection)}
+            FROM "{source}"
+            ORDER BY "{key}"
+        ) TO {quote_literal(directory)} (
+            FORMAT parquet,
+            PARTITION_BY ({", ".join(partition_columns)}),
+            OVERWRITE_OR_IGNORE,
+            FILENAME_PATTERN 'data_{{uuid}}',
+            COMPRESSION {compression},
+            ROW_GROUP_SIZE {int(row_group_size)}
+        )
+        """,
+        params,
+    )
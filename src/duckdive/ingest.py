@@ -0,0 +1,283 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import duckdb
+from pydantic import ValidationError
+
+from . import metrics
+from .constants import validation_modes
+from .errors import RecordValidationError
+from .models import forecast_models, json_structure
+from .validation import Reject, ValidationReport, record_errors, validate_records
+
+# Table the records rejected by lenient validation are quarantined in
+rejects_table = "rejects"
+
+
+def forecast_structure(forecast_type: str) -> str:
+    """
+    Return the json_transform structure of a forecast type's list of records,
+    with column types derived from its model in models.py.
+
+    :param forecast_type: One of the Surfline forecast types
+    :return: JSON structure string, e.g. '[{"timestamp": "BIGINT", ...}]'
+    """
+    return json.dumps([json_structure(forecast_models[forecast_type])])
+
+
+@metrics.timed("parse")
+def detect_forecast_type(con: duckdb.DuckDBPyConnection, body: str) -> Optional[str]:
+    """
+    Return the forecast type held in a response body's 'data' object.
+
+    :param con: DuckDB connection
+    :param body: Raw JSON response body
+    :return: The first forecast type with records, or None if there is none
+    """
+    keys = con.execute(
+        "SELECT json_keys(json_extract($1, '$.data'))", [body]
+    ).fetchone()[0]
+    for key in keys or []:
+        if key in forecast_models:
+            count = con.execute(
+                "SELECT json_array_length($1, $2)", [body, f"$.data.{key}"]
+            ).fetchone()[0]
+            if count:
+                return key
+    return None
+
+
+def validate_sample(
+    con: duckdb.DuckDBPyConnection,
+    body: str,
+    forecast_type: str,
+    sample_size: int = 3,
+) -> None:
+    """
+    Validate the first, middle and last records of a response body with the
+    forecast type's pydantic model, without parsing the whole body in Python.
+
+    :param con: DuckDB connection
+    :param body: Raw JSON response body
+    :param forecast_type: Forecast type of the body
+    :param sample_size: Number of records to validate
+    :raises RecordValidationError: If a sampled record is invalid
+    """
+    model = forecast_models[forecast_type]
+    samples = con.execute(
+        """
+        WITH records AS (
+            SELECT json_extract($1, $2) AS records
+        ),
+        indices AS (
+            SELECT DISTINCT (i * (json_array_length(records) - 1)
+                // greatest($3 - 1, 1))::BIGINT AS i
+            FROM records, range($3) AS r(i)
+            WHERE json_array_length(records) > 0
+        )
+        SELECT i, json_extract(records, '$[' || i || ']')::VARCHAR
+        FROM records, indices
+        """,
+        [body, f"$.data.{forecast_type}", sample_size],
+    ).fetchall()
+    for index, record in samples:
+        try:
+            model.model_validate_json(record)
+        except ValidationError as e:
+            errors = record_errors(e, forecast_type, index)
+            raise RecordValidationError(forecast_type, errors) from None
+    metrics.count("records_validated", len(samples))
+
+
+def table_exists(con: duckdb.DuckDBPyConnection, table: str) -> bool:
+    """
+    Return whether a table exists in the connection's current database.
+    """
+    return bool(
+        con.execute(
+            """
+            SELECT count(*) FROM duckdb_tables()
+            WHERE database_name = current_database() AND table_name = $1
+            """,
+            [table],
+        ).fetchone()[0]
+    )
+
+
+def insert_json(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    body: str,
+    forecast_type: str,
+    tags: Optional[Dict[str, str]] = None,
+    replace: bool = False,
+    skip: Optional[List[int]] = None,
+) -> int:
+    """
+    Load the records of a response body into a table, parsed and typed entirely
+    inside DuckDB. The table is created on first use with the column types of
+    the forecast type's model, and later bodies are appended to it.
+
+    :param con: DuckDB connection
+    :param table: Name of the table to create or append to
+    :param body: Raw JSON response body
+    :param forecast_type: Forecast type of the body
+    :param tags: Constant VARCHAR columns prepended to every row, e.g. {"spot_id": ...}
+    :param replace: Replace the table instead of appending to it
+    :param skip: Indices of records to leave out, e.g. those rejected by validation
+    :return: Number of rows loaded
+    """
+    tags = tags or {}
+    tag_columns = "".join(f'${name}::VARCHAR AS "{name}", ' for name in tags)
+    records = "json_transform(json_extract($body, $path), $structure)"
+    params = {
+        **tags,
+        "body": body,
+        "path": f"$.data.{forecast_type}",
+        "structure": forecast_structure(forecast_type),
+    }
+    if skip:
+        select = f"""
+            SELECT {tag_columns}unnest(record)
+            FROM (
+                SELECT unnest(records) AS record,
+                    generate_subscripts(records, 1) - 1 AS i
+                FROM (SELECT {records} AS records)
+            )
+            WHERE NOT list_contains($skip, i)
+        """
+        params["skip"] = list(skip)
+    else:
+        select = f"""
+            SELECT {tag_columns}unnest(record)
+            FROM (SELECT unnest({records}) AS record)
+        """
+
+    with metrics.stage("insert"):
+        if replace or not table_exists(con, table):
+            con.execute(f'CREATE OR REPLACE TABLE "{table}" AS {select}', params)
+            rows = con.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        else:
+            rows = con.execute(
+                f'INSERT INTO "{table}" BY NAME {select}', params
+            ).fetchone()[0]
+    metrics.count("records_parsed", rows)
+    return rows
+
+
+def insert_rejects(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    rejects: List[Reject],
+    tags: Optional[Dict[str, str]] = None,
+) -> int:
+    """
+    Quarantine records rejected by validation into the rejects table, created
+    on first use, with the spot they came from and why they were rejected.
+
+    :param con: DuckDB connection
+    :param forecast_type: Forecast type of the records
+    :param rejects: Rejected records, see validation.validate_records
+    :param tags: Tags of the response, of which spot_id is recorded
+    :return: Number of records quarantined
+    """
+    if not rejects:
+        return 0
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS "{rejects_table}" (
+            spot_id VARCHAR,
+            forecast_type VARCHAR,
+            record_index INTEGER,
+            record JSON,
+            error VARCHAR,
+            rejected_at TIMESTAMP
+        )
+        """
+    )
+    spot_id = (tags or {}).get("spot_id")
+    rejected_at = datetime.now()
+    con.executemany(
+        f'INSERT INTO "{rejects_table}" VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (spot_id, forecast_type, r.index, r.record, r.error, rejected_at)
+            for r in rejects
+        ],
+    )
+    return len(rejects)
+
+
+def count_rejects(con: duckdb.DuckDBPyConnection) -> int:
+    """
+    Return the number of records in the rejects table, 0 if there is none.
+    """
+    if not table_exists(con, rejects_table):
+        return 0
+    return con.execute(f'SELECT count(*) FROM "{rejects_table}"').fetchone()[0]
+
+
+@metrics.timed("validate")
+def validate_body(
+    con: duckdb.DuckDBPyConnection, body: str, forecast_type: str, validate: str
+) -> Optional[ValidationReport]:
+    """
+    Validate a response body's records according to the validation mode.
+
+    :param con: DuckDB connection
+    :param body: Raw JSON response body
+    :param forecast_type: Forecast type of the body
+    :param validate: One of validation_modes
+    :return: ValidationReport of the "full" and "lenient" modes, whose rejects
+        should be left out of the table; None for the other modes
+    :raises RecordValidationError: If a validated record is invalid ("full"
+        and "sample" modes) or the body is not a response ("lenient" mode)
+    """
+    if validate not in validation_modes:
+        raise ValueError(f"Invalid validate mode. Must be one of {validation_modes}")
+    if validate in ("full", "lenient"):
+        return validate_records(body, forecast_type, lenient=validate == "lenient")
+    if validate == "sample":
+        validate_sample(con, body, forecast_type)
+    return None
+
+
+def ingest_body(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    body: str,
+    validate: str = "sample",
+    tags: Optional[Dict[str, str]] = None,
+    replace: bool = False,
+) -> Optional[str]:
+    """
+    Validate a response body and load its records into a table. Records
+    rejected by "lenient" validation go to the rejects table instead, which
+    is emptied first when the table is replaced.
+
+    :param con: DuckDB connection
+    :param table: Name of the table to create or append to
+    :param body: Raw JSON response body
+    :param validate: One of validation_modes
+    :param tags: Constant VARCHAR columns prepended to every row
+    :param replace: Replace the table instead of appending to it
+    :return: The forecast type that was loaded, or None if the body held no data
+    """
+    forecast_type = detect_forecast_type(con, body)
+    if forecast_type is None:
+        return None
+    report = validate_body(con, body, forecast_type, validate)
+    rejects = report.rejects if report else []
+    if replace:
+        con.execute(f'DROP TABLE IF EXISTS "{rejects_table}"')
+    insert_json(
+        con,
+        table,
+        body,
+        forecast_type,
+        tags=tags,
+        replace=replace,
+        skip=[reject.index for reject in rejects],
+    )
+    insert_rejects(con, forecast_type, rejects, tags)
+    return forecast_type
@@ -0,0 +1,238 @@
+import functools
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Stage names in pipeline order, used to sort the --profile breakdown
+stage_order = [
+    "connect",
+    "extension_load",
+    "http",
+    "parse",
+    "validate",
+    "insert",
+    "upsert",
+    "merge",
+    "export",
+    "format",
+    "table_build",
+    "render",
+]
+
+
+class Metrics:
+    """
+    Thread-safe accumulator of per-stage timings and counters.
+
+    Stage timings are summed over every call, so stages that run on several
+    threads at once (e.g. report's concurrent HTTP requests) can add up to more
+    than the wall time of the run.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.seconds[name] += elapsed
+                self.calls[name] += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """
+        Add the stage timings and counters of another collector's to_dict(),
+        e.g. one that ran in a worker process.
+        """
+        with self._lock:
+            for name, stage in other["stages"].items():
+                self.seconds[name] += stage["total_ms"] / 1000
+                self.calls[name] += stage["calls"]
+            for name, value in other["counters"].items():
+                self.counters[name] += value
+
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Return the collected metrics as a JSON-serializable dict.
+        """
+        names = sorted(
+            self.seconds,
+            key=lambda n: (
+                stage_order.index(n) if n in stage_order else len(stage_order)
+            ),
+        )
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_ms": round(self.wall_seconds() * 1000, 3),
+            "stages": {
+                name: {
+                    "calls": self.calls[name],
+                    "total_ms": round(self.seconds[name] * 1000, 3),
+                }
+                for name in names
+            },
+            "counters": dict(self.counters),
+        }
+
+
+# The active collector, None while metrics are disabled
+_active: Optional[Metrics] = None
+_disabled = nullcontext()
+
+
+def enable() -> Metrics:
+    """
+    Start collecting metrics into a new collector and return it.
+    """
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def disable() -> None:
+    """
+    Stop collecting metrics.
+    """
+    global _active
+    _active = None
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+def stage(name: str):
+    """
+    Time a block as the named stage. A shared no-op context when disabled.
+
+    Usage:
+        with stage("http"):
+            response = session.get(url)
+    """
+    if _active is None:
+        return _disabled
+    return _active.stage(name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Add a value to the named counter. Does nothing when disabled.
+    """
+    if _active is not None:
+        _active.count(name, value)
+
+
+def merge(other: Dict[str, Any]) -> None:
+    """
+    Add the metrics of another collector's to_dict(). Does nothing when disabled.
+    """
+    if _active is not None:
+        _active.merge(other)
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator timing every call of a function as the named stage.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def print_profile(metrics: Metrics, command: str) -> None:
+    """
+    Print a breakdown of time per stage and the counters to stderr.
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    data = metrics.to_dict()
+    wall = data["wall_ms"]
+    table = Table(
+        title=f"{command} profile ({wall:.1f} ms wall)", header_style="bold magenta"
+    )
+    table.add_column("stage")
+    table.add_column("calls", justify="right")
+    table.add_column("total ms", justify="right")
+    table.add_column("% of wall", justify="right")
+    for name, timing in data["stages"].items():
+        share = timing["total_ms"] / wall * 100 if wall else 0
+        table.add_row(
+            name, str(timing["calls"]), f"{timing['total_ms']:.1f}", f"{share:.1f}"
+        )
+    for name, value in data["counters"].items():
+        table.add_row(f"[cyan]{name}", str(value), "", "")
+    Console(stderr=True).print(table)
+
+
+def write_metrics_json(metrics: Metrics, command: str, path: str) -> None:
+    """
+    Write the metrics as one JSON object to a file, or to stdout if path is "-".
+    """
+    line = json.dumps({"command": command, **metrics.to_dict()})
+    if path == "-":
+        sys.stdout.write(line + "\n")
+    else:
+        with open(path, "w") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def collect(
+    command: str, profile: bool = False, metrics_json: Optional[str] = None
+) -> Iterator[Optional[Metrics]]:
+    """
+    Collect metrics for the duration of a CLI command when --profile or
+    --metrics-json is set, and report them when the command ends.
+
+    :param command: Name of the command, recorded with the metrics
+    :param profile: Print a stage breakdown to stderr
+    :param metrics_json: Path to write the metrics JSON to ("-" for stdout, in
+        which case everything else the command prints goes to stderr)
+    """
+    if not profile and not metrics_json:
+        yield None
+        return
+
+    metrics = enable()
+    # Keep stdout for the metrics JSON alone, so it can be piped to a parser
+    output = redirect_stdout(sys.stderr) if metrics_json == "-" else nullcontext()
+    try:
+        with output:
+            yield metrics
+    finally:
+        disable()
+        if profile:
+            print_profile(metrics, command)
+        if metrics_json:
+            write_metrics_json(metrics, command, metrics_json)
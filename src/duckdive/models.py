@@ -1,6 +1,7 @@
-from typing import List, Optional
+from functools import lru_cache
+from typing import Any, List, Optional, Union, get_args, get_origin
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, create_model
 
 
 # conditions endpoint
@@ -75,7 +76,8 @@ class SurfData(BaseModel):
     # optimalScore: Optional[int] = None
 
 
-class SwellData(BaseModel):
+# swell component of a wave record
+class WaveSwellData(BaseModel):
     height: float
     period: float
     impact: Optional[float] = None
@@ -90,7 +92,7 @@ class WaveData(BaseModel):
     probability: Optional[float] = None
     surf: SurfData
     power: Optional[float] = None
-    swells: Optional[List[SwellData]] = None
+    swells: Optional[List[WaveSwellData]] = None
 
 
 class SunlightData(BaseModel):
@@ -101,6 +103,7 @@ class SunlightData(BaseModel):
     dusk: int
 
 
+# swells endpoint
 class SwellDetails(BaseModel):
     height: float
     period: float
@@ -127,3 +130,57 @@ class FullResponse(BaseModel):
     wave: Optional[List[WaveData]] = None
     wind: Optional[List[WindData]] = None
     weather: Optional[List[WeatherData]] = None
+
+
+# DuckDB types of the scalar field annotations used by the models
+duckdb_types = {int: "BIGINT", float: "DOUBLE", str: "VARCHAR", bool: "BOOLEAN"}
+
+
+def json_structure(annotation: Any) -> Any:
+    """
+    Convert a model (or field annotation) into a DuckDB json_transform structure,
+    e.g. WindData -> {"timestamp": "BIGINT", "speed": "DOUBLE", ...}.
+
+    :param annotation: Pydantic model class or field annotation
+    :return: Structure of nested dicts / lists of DuckDB type names
+    """
+    origin = get_origin(annotation)
+    if origin is Union:
+        return json_structure(
+            next(arg for arg in get_args(annotation) if arg is not type(None))
+        )
+    if origin in (list, List):
+        return [json_structure(get_args(annotation)[0])]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {
+            name: json_structure(field.annotation)
+            for name, field in annotation.model_fields.items()
+        }
+    return duckdb_types[annotation]
+
+
+# Record model of each forecast type, e.g. "wind" -> WindData
+forecast_models = {
+    name: get_args(get_args(field.annotation)[0])[0]
+    for name, field in FullResponse.model_fields.items()
+}
+
+
+@lru_cache(maxsize=None)
+def response_adapter(forecast_type: str) -> TypeAdapter:
+    """
+    Return the TypeAdapter validating a whole response body of a forecast type,
+    {"data": {forecast_type: List[model]}}, in one call. pydantic-core parses
+    the JSON and validates every record without building Python dicts first,
+    instead of a FullResponse(**json.loads(body)) round trip. Other keys of
+    the body are ignored.
+
+    :param forecast_type: One of the Surfline forecast types
+    :return: TypeAdapter of the response, built on first use
+    """
+    model = forecast_models[forecast_type]
+    name = model.__name__.removesuffix("Data")
+    data = create_model(
+        f"{name}ResponseData", **{forecast_type: (Optional[List[model]], None)}
+    )
+    return TypeAdapter(create_model(f"{name}Response", data=(Optional[data], None)))
@@ -1,87 +1,145 @@
-import typer
 import json
-import duckdb
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import duckdb
-import pandas as pd
-import requests
 import typer
-from rich.console import Console
-from .models import FullResponse
 
-console = Console()
+from . import metrics
+
+if TYPE_CHECKING:
+    import duckdb
+
+# Make HTTP request using DuckDB
+HTTP_QUERY = """
+WITH __input AS (
+    SELECT http_get($1) AS res
+)
+SELECT
+    (res->>'status')::INT AS status,
+    (res->>'reason') AS reason,
+    (res->>'body') AS body
+FROM __input;
+"""
+
+# Map each forecast type to the message echoed once its data is retrieved
+data_messages = {
+    "tides": "Tide",
+    "conditions": "Conditions",
+    "swells": "Swells",
+    "sunlight": "Sunlight",
+    "wave": "Wave",
+    "rating": "Rating",
+    "wind": "Wind",
+    "weather": "Weather",
+}
+
+
+def load_http_client(con: "duckdb.DuckDBPyConnection") -> None:
+    """
+    Install and load the http_client extension on the given connection.
+
+    :param con: DuckDB connection
+    """
+    con.execute("INSTALL http_client FROM community;")
+    con.execute("LOAD http_client;")
+
+
+def fetch_surfline(
+    con: "duckdb.DuckDBPyConnection", url: str
+) -> Tuple[int, str, Optional[str]]:
+    """
+    Send a GET request for the given Surfline API url through DuckDB.
+
+    :param con: DuckDB connection with the http_client extension loaded
+    :param url: Surfline API url
+    :return: Tuple of (status, reason, body) where body is the raw JSON response body
+    """
+    return con.execute(HTTP_QUERY, [url]).fetchone()
+
+
+def parse_records(
+    body: Union[str, Dict[str, Any]],
+) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Validate every record of a Surfline response body with the pydantic models.
+
+    :param body: The response body, either as a JSON string or already decoded
+    :return: Tuple of (forecast_type, records), or (None, []) if no data was found
+    """
+    # pydantic is only imported once records are actually validated
+    from .models import FullResponse
+
+    if isinstance(body, str):
+        body = json.loads(body)
+    parsed_data = FullResponse(**(body.get("data") or {}))
+
+    # Find which data type we have
+    for data_type in data_messages:
+        items = getattr(parsed_data, data_type)
+        if items:
+            metrics.count("records_validated", len(items))
+            return data_type, [item.model_dump() for item in items]
+
+    return None, []
 
 
 def query_surfline(
-    url: str, save_to_duckdb: bool = True
-) -> Optional[duckdb.DuckDBPyConnection]:
+    url: str, save_to_duckdb: bool = True, client=None, validate: str = "sample"
+) -> Optional["duckdb.DuckDBPyConnection"]:
+    """
+    Query a Surfline API url and store the records in a 'surfline_data' table.
+
+    :param url: Surfline API url
+    :param save_to_duckdb: Unused, kept for backwards compatibility
+    :param client: SurflineClient to reuse; a new one (with a fresh connection) is created if None
+    :param validate: How records are validated, one of ingest.validation_modes
+    :return: DuckDB connection holding the 'surfline_data' table, or None on failure
+    """
+    from rich.console import Console
+
+    from .client import SurflineClient
+    from .errors import RecordValidationError, SurflineAPIError
+    from .ingest import count_rejects, ingest_body
+
+    console = Console()
+
     try:
-        # Initialize DuckDB connection
-        con = duckdb.connect()
-
-        # Install and load HTTP client extension
-        con.execute("INSTALL http_client FROM community;")
-        con.execute("LOAD http_client;")
-
-        with console.status("[bold green]Querying Surfline API...") as status:
-            # Make HTTP request using DuckDB
-            query = """
-            WITH __input AS (
-                SELECT http_get($1) AS res
-            ),
-            __response AS (
-                SELECT 
-                    (res->>'status')::INT AS status,
-                    (res->>'reason') AS reason,
-                    (res->>'body')::JSON AS body
-                FROM __input
-            )
-            SELECT 
-                status,
-                reason,
-                body->>'data' AS data
-            FROM __response;
-            """
-            result = con.execute(query, [url]).fetchone()
-
-        if result[0] != 200:  # Check status code
-            typer.echo(f"API request failed with status {result[0]}: {result[1]}")
+        # Reuse the client's connection, HTTP session and loaded extension
+        client = client or SurflineClient()
+
+        with console.status("[bold green]Querying Surfline API..."):
+            body, _ = client.request(url)
+
+        # Parse the JSON response into a typed table inside DuckDB
+        data_type = ingest_body(
+            client.con, "surfline_data", body, validate=validate, replace=True
+        )
+
+        if data_type is None:
+            typer.echo("No data found.")
             return None
 
-        # Parse the JSON response into the FullResponse model
-        parsed_data = FullResponse(**json.loads(result[2]))
-
-        # Define data type mapping
-        data_types = {
-            "tides": (parsed_data.tides, "Tide"),
-            "conditions": (parsed_data.conditions, "Conditions"),
-            "swells": (parsed_data.swells, "Swells"),
-            "sunlight": (parsed_data.sunlight, "Sunlight"),
-            "wave": (parsed_data.wave, "Wave"),
-            "rating": (parsed_data.rating, "Rating"),
-            "wind": (parsed_data.wind, "Wind"),
-            "weather": (parsed_data.weather, "Weather"),
-        }
-
-        # Find which data type we have and create table
-        for data_type, (data, message) in data_types.items():
-            if data:
-                records = [item.dict() for item in data]
-                con.execute(
-                    "CREATE TABLE surfline_data AS SELECT * FROM json_array_to_table($1)",
-                    [json.dumps(records)],
-                )
-                typer.echo(f"{message} data retrieved successfully.")
-
-                if save_to_duckdb:
-                    return con
-                else:
-                    return con
-
-        typer.echo("No data found.")
-        return None
+        typer.echo(f"{data_messages[data_type]} data retrieved successfully.")
+        rejected = count_rejects(client.con)
+        if rejected:
+            typer.echo(
+                f"{rejected} invalid records left out and quarantined in the rejects table.",
+                err=True,
+            )
+
+        return client.con
 
+    except SurflineAPIError as e:
+        typer.echo(f"{type(e).__name__}: {e}", err=True)
+        return None
+    except RecordValidationError as e:
+        typer.echo(f"{type(e).__name__}: {e}", err=True)
+        if validate != "lenient":
+            typer.echo(
+                "Use --validate lenient to load the valid records and quarantine"
+                " the rest in the rejects table.",
+                err=True,
+            )
+        return None
     except Exception as e:
         typer.echo(f"An error occurred: {e}", err=True)
         return None
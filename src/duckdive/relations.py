@@ -0,0 +1,141 @@
+from typing import Callable, Dict, List, Optional, Union
+
+import duckdb
+
+from .api import surfline_api_url, valid_types
+from .client import SurflineClient
+from .engine import FetchResult, fetch_report
+from .scheduler import RequestScheduler
+from .views import table_columns
+
+
+def forecast_relation(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+) -> duckdb.DuckDBPyRelation:
+    """
+    Return a lazy relation over one forecast table, with an optional projection
+    and filter. Nothing is read until the relation is materialized, and DuckDB
+    pushes the projection and filter down into the table scan.
+
+    :param con: DuckDB connection holding the forecast table
+    :param forecast_type: Forecast type (and table name)
+    :param columns: Columns to keep besides spot_id; names the table does not have
+        are skipped, since forecast tables differ by type
+    :param where: SQL filter expression, e.g. "timestamp >= 1727481600"
+    :return: DuckDB relation
+    """
+    relation = con.table(forecast_type)
+    if where:
+        relation = relation.filter(where)
+    if columns:
+        keep = {"spot_id", *columns}
+        relation = relation.project(
+            ", ".join(
+                f'"{column}"'
+                for column in table_columns(con, forecast_type)
+                if column in keep
+            )
+        )
+    return relation
+
+
+def fetch(
+    spot_ids: Union[str, List[str]],
+    forecast_types: Optional[Union[str, List[str]]] = None,
+    days: Optional[int] = 3,
+    interval_hours: Optional[float] = 1,
+    columns: Optional[List[str]] = None,
+    where: Optional[Union[str, Dict[str, str]]] = None,
+    access_token: Optional[str] = None,
+    max_workers: int = 8,
+    transport: str = "duckdb",
+    validate: str = "sample",
+    client: Optional[SurflineClient] = None,
+    base_url: str = surfline_api_url,
+    on_result: Optional[Callable[[FetchResult], None]] = None,
+    resample: bool = False,
+) -> Dict[str, duckdb.DuckDBPyRelation]:
+    """
+    Fetch forecasts for one or more spots and return them as lazy DuckDB
+    relations, one per forecast type that returned data.
+
+    The responses are parsed into tables of an in-memory DuckDB database (or
+    the given client's). The relations only describe queries over them:
+    filter, project, join or aggregate them further, then materialize with
+    .arrow() (pyarrow), .pl() (polars), .df() (pandas) or .fetchall().
+    Arrow and polars exports hand over DuckDB's columnar buffers without a
+    row-wise copy.
+
+    Usage:
+        relations = duckdive.fetch(["5842041f4e65fad6a7708839"], ["wind", "tides"])
+        wind = relations["wind"].filter("speed > 10").project("timestamp, speed").arrow()
+
+    :param spot_ids: Surfline spot id or list of spot ids
+    :param forecast_types: Forecast type or list of types (defaults to all valid types)
+    :param days: Number of forecast days
+    :param interval_hours: Interval hours for forecast
+    :param columns: Columns to keep in every relation besides spot_id
+    :param where: SQL filter applied to every relation, or a dict of filters per forecast type
+    :param access_token: Access token for premium data
+    :param max_workers: Maximum number of requests in flight at once
+    :param transport: HTTP transport of the new client, "duckdb" or "requests"
+    :param validate: How records are validated, one of ingest.validation_modes
+    :param client: SurflineClient to fetch with (defaults to a new in-memory client,
+        whose HTTP session is closed before returning); its forecast tables are replaced
+    :param base_url: Base url of the forecasts API
+    :param on_result: Callback invoked with each FetchResult, e.g. to collect errors
+    :param resample: Fetch hourly data and resample it to interval_hours locally
+    :return: Dict of forecast type to relation
+    """
+    if isinstance(spot_ids, str):
+        spot_ids = [spot_ids]
+    if isinstance(forecast_types, str):
+        forecast_types = [forecast_types]
+    forecast_types = forecast_types or valid_types
+
+    owned = client is None
+    client = client or SurflineClient(
+        transport=transport,
+        pool_size=max_workers,
+        scheduler=RequestScheduler(max_concurrency=max_workers),
+    )
+    # Only types with at least one successful response get a table
+    fetched = set()
+
+    def collect(result: FetchResult) -> None:
+        if result.rows:
+            fetched.add(result.forecast_type)
+        if on_result:
+            on_result(result)
+
+    con = fetch_report(
+        spot_ids,
+        forecast_types,
+        days=days,
+        interval_hours=interval_hours,
+        access_token=access_token,
+        max_workers=max_workers,
+        client=client,
+        base_url=base_url,
+        validate=validate,
+        on_result=collect,
+        resample=resample,
+    )
+    if owned:
+        # The relations keep the connection alive, the rest of the client can go
+        client.release()
+
+    filters = where if isinstance(where, dict) else {}
+    return {
+        forecast_type: forecast_relation(
+            con,
+            forecast_type,
+            columns=columns,
+            where=filters.get(forecast_type) if filters else where,
+        )
+        for forecast_type in forecast_types
+        if forecast_type in fetched
+    }
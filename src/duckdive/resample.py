@@ -0,0 +1,244 @@
+from typing import List, Optional
+
+import duckdb
+
+from . import metrics
+from .constants import daily_types, numeric_types
+
+# Interval at which forecasts are fetched when coarser intervals are resampled
+# locally, so every interval is derived from one (cacheable) response
+base_interval_hours = 1
+
+# Types with irregular timestamps, resampled by interpolating onto the new grid
+interpolated_types = {"tides"}
+
+# Columns kept as group keys rather than aggregated
+key_columns = ["spot_id", "forecast_type", "fetched_at"]
+
+# Angles in degrees, averaged on the circle so 350 and 10 give 0 rather than 180
+circular_columns = {"direction", "directionMin"}
+
+# Columns (or struct fields) whose bucket maximum / minimum is kept
+max_columns = {"max", "gust"}
+min_columns = {"min"}
+
+# Decimal places averages are rounded to, matching the API's precision
+decimals = 2
+
+
+def aggregate_sql(
+    expression: str, name: str, type_: "duckdb.sqltypes.DuckDBPyType"
+) -> str:
+    """
+    Build the aggregate of one column over a resampling bucket:
+
+    - angles (direction) get a circular mean
+    - "max" / "gust" keep the maximum and "min" the minimum, so a surf range
+      stays the envelope of the bucket
+    - other floating point columns are averaged (rounded to `decimals`, the
+      precision of the API)
+    - structs are aggregated field by field with the same rules
+    - anything else (labels, scores, lists) keeps the bucket's first value
+
+    :param expression: SQL expression of the column
+    :param name: Column or struct field name the rules are chosen by
+    :param type_: DuckDB type of the column
+    :return: SQL aggregate expression
+    """
+    if type_.id == "struct":
+        fields = ", ".join(
+            f'"{field}" := {aggregate_sql(f"{expression}.{field}", field, child)}'
+            for field, child in type_.children
+        )
+        return f"struct_pack({fields})"
+    if name in circular_columns:
+        return (
+            f"round((degrees(atan2(avg(sin(radians({expression}))),"
+            f" avg(cos(radians({expression}))))) + 360) % 360, {decimals})"
+        )
+    if name in max_columns:
+        return f"max({expression})"
+    if name in min_columns:
+        return f"min({expression})"
+    if type_.id in numeric_types:
+        return f"round(avg({expression}), {decimals})"
+    return f'arg_min({expression}, "timestamp")'
+
+
+def interpolate_sql(expression: str, before: str, after: str, at: str) -> str:
+    """
+    Build the linear interpolation of a column at time `at` between the rows
+    aliased `before` and `after` (e.g. from ASOF joins), falling back to
+    whichever row exists at the ends of the series.
+
+    :param expression: SQL expression of the column on the `before` row
+    :param before: Alias of the row at or before `at`
+    :param after: Alias of the row at or after `at`
+    :param at: SQL expression of the time to interpolate at
+    :return: SQL expression
+    """
+    later = expression.replace(before, after, 1)
+    return f"""CASE
+        WHEN {after}."timestamp" IS NULL OR {after}."timestamp" = {before}."timestamp"
+            THEN {expression}
+        WHEN {before}."timestamp" IS NULL THEN {later}
+        ELSE {expression} + ({later} - {expression})
+            * ({at} - {before}."timestamp")
+            / ({after}."timestamp" - {before}."timestamp")
+    END"""
+
+
+def resample_sql(
+    con: duckdb.DuckDBPyConnection, source: str, forecast_type: str, hours: float
+) -> Optional[str]:
+    """
+    Build the query resampling a forecast table to a coarser interval.
+
+    Interval types are grouped into buckets of `hours`, aligned to each spot's
+    first timestamp, and aggregated per column (see aggregate_sql). Tides are
+    interpolated onto the new grid along the tide curve, keeping the HIGH and
+    LOW extremes as they are. Daily types are returned unchanged.
+
+    :param con: DuckDB connection holding the table
+    :param source: Table name, optionally catalog-qualified and quoted
+    :param forecast_type: Forecast type of the table
+    :param hours: Interval of the resampled table in hours
+    :return: SQL query, or None if the forecast type is not resampled
+    """
+    if forecast_type in daily_types:
+        return None
+    step = int(hours * 3600)
+    relation = con.table(source)
+    keys = [f'"{column}"' for column in key_columns if column in relation.columns]
+    data = [
+        (column, type_)
+        for column, type_ in zip(relation.columns, relation.types)
+        if column not in key_columns and column not in ("timestamp", "row_hash")
+    ]
+    # Without tag columns (a single-spot table) the whole table is one series
+    group_by = ", ".join(keys)
+    key_list = "".join(f"{key}, " for key in keys)
+    partition = f"PARTITION BY {group_by}" if keys else ""
+
+    if forecast_type in interpolated_types:
+        columns = []
+        for column, type_ in data:
+            expression = f'before."{column}"'
+            if column == "type":
+                expression = "'NORMAL'"
+            elif type_.id in numeric_types:
+                expression = interpolate_sql(
+                    expression, "before", "after", 'grid."timestamp"'
+                )
+            columns.append(f'{expression} AS "{column}"')
+        grid_keys = "".join(f"grid.{key}, " for key in keys)
+        match_before = "".join(f" AND before.{key} = grid.{key}" for key in keys)
+        match_after = "".join(f" AND after.{key} = grid.{key}" for key in keys)
+
+        # HIGH / LOW extremes are events rather than samples, so they are kept
+        extremes = ""
+        if "type" in relation.columns:
+            exclude = " EXCLUDE (row_hash)" if "row_hash" in relation.columns else ""
+            extremes = f"""
+                UNION ALL BY NAME
+                SELECT *{exclude} FROM {source} WHERE type <> 'NORMAL'
+            """
+        return f"""
+            WITH grid AS (
+                SELECT {key_list}unnest(generate_series(
+                    min("timestamp"), max("timestamp"), {step}
+                )) AS "timestamp"
+                FROM {source}
+                {f"GROUP BY {group_by}" if keys else ""}
+            )
+            SELECT {grid_keys}grid."timestamp", {", ".join(columns)}
+            FROM grid
+            ASOF LEFT JOIN {source} AS before
+                ON grid."timestamp" >= before."timestamp"{match_before}
+            ASOF LEFT JOIN {source} AS after
+                ON grid."timestamp" <= after."timestamp"{match_after}
+            {extremes}
+            ORDER BY {key_list}"timestamp"
+        """
+
+    aggregates = ", ".join(
+        f"{aggregate_sql(quoted, column, type_)} AS {quoted}"
+        for quoted, column, type_ in ((f'"{c}"', c, t) for c, t in data)
+    )
+    return f"""
+        SELECT {key_list}bucket AS "timestamp", {aggregates}
+        FROM (
+            SELECT *,
+                first_ts + (("timestamp" - first_ts) // {step}) * {step} AS bucket
+            FROM (
+                SELECT *, min("timestamp") OVER ({partition}) AS first_ts
+                FROM {source}
+            )
+        )
+        GROUP BY {key_list}bucket
+        ORDER BY {key_list}bucket
+    """
+
+
+def hourly_table(table: str) -> str:
+    """
+    Return the name of the table keeping the records a resampled table was
+    derived from, e.g. "wind" -> "wind_hourly". Warehouses and archives store
+    these: resampled aggregates share the timestamps of the hourly records
+    they summarize, so storing both would flip every bucket's values between
+    runs at different intervals.
+    """
+    return f"{table}_hourly"
+
+
+def resample_table(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    hours: float,
+    table: Optional[str] = None,
+    target: Optional[str] = None,
+) -> bool:
+    """
+    Create the version of a forecast table resampled to a coarser interval.
+
+    :param con: DuckDB connection holding the table
+    :param forecast_type: Forecast type of the table
+    :param hours: Interval of the resampled table in hours
+    :param table: Table name (defaults to the forecast type)
+    :param target: Name of the resampled table (defaults to replacing table)
+    :return: Whether the table was resampled (daily types are left as they are)
+    """
+    table = table or forecast_type
+    with metrics.stage("resample"):
+        query = resample_sql(con, f'"{table}"', forecast_type, hours)
+        if query is None:
+            return False
+        con.execute(f'CREATE OR REPLACE TABLE "{target or table}" AS {query}')
+    return True
+
+
+def resample_tables(
+    con: duckdb.DuckDBPyConnection, forecast_types: List[str], hours: float
+) -> List[str]:
+    """
+    Replace forecast tables of a connection with their resampled version,
+    keeping the fetched records of each resampled table in its hourly_table.
+
+    :param con: DuckDB connection holding one table per forecast type
+    :param forecast_types: Forecast types (and table names) to resample
+    :param hours: Interval of the resampled tables in hours
+    :return: The forecast types that were resampled
+    """
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    resampled = []
+    for forecast_type in forecast_types:
+        if forecast_type not in tables:
+            continue
+        hourly = hourly_table(forecast_type)
+        con.execute(f'DROP TABLE IF EXISTS "{hourly}"')
+        con.execute(f'ALTER TABLE "{forecast_type}" RENAME TO "{hourly}"')
+        if resample_table(con, forecast_type, hours, hourly, forecast_type):
+            resampled.append(forecast_type)
+        else:
+            con.execute(f'ALTER TABLE "{hourly}" RENAME TO "{forecast_type}"')
+    return resampled
@@ -0,0 +1,278 @@
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import metrics
+from .errors import (
+    SurflineAPIError,
+    TransportError,
+    error_for_status,
+    parse_retry_after,
+)
+
+# Statuses that mean the API is overloaded, on which concurrency is cut back
+throttle_statuses = {429, 503}
+
+
+@dataclass
+class RequestOutcome:
+    """What happened to one request sent through a RequestScheduler."""
+
+    url: str
+    status: Optional[int] = None
+    reason: Optional[str] = None
+    attempts: int = 0
+    throttled: int = 0
+    waited: float = 0.0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    retry_after: Optional[float] = None,
+) -> float:
+    """
+    Return the seconds to wait before retrying, using exponential backoff with
+    full jitter. A Retry-After from the server is a lower bound.
+
+    :param attempt: Number of attempts that failed so far, minus one
+    :param base_delay: Backoff of the first retry before jitter
+    :param max_delay: Upper bound of the jittered backoff
+    :param retry_after: Seconds the server asked to wait, if any
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+    return max(delay, retry_after or 0.0)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` requests per second on average,
+    with bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, sleeping until one is available.
+
+        :return: Seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Reserve the token now and sleep outside the lock; the balance goes
+            # negative so later callers queue up behind this one
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on the number of requests in flight, adjusted with AIMD: every
+    successful request raises the limit by 1/limit (about +1 per round of
+    requests), and a throttled request halves it. Decreases are spaced by a
+    cooldown so one burst of 429s for requests already in flight only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        if not 1 <= minimum <= maximum:
+            raise ValueError("Concurrency limits must satisfy 1 <= minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    Sends Surfline requests under a token-bucket rate limit and an adaptive
+    (AIMD) concurrency limit, retrying throttled, 5xx and failed requests with
+    exponential backoff and jitter.
+
+    A 429 or 503 with a Retry-After header pauses every request of the
+    scheduler for that long, not just the one that was throttled.
+
+    Usage:
+        scheduler = RequestScheduler(rate=5, max_retries=4)
+        client = SurflineClient(scheduler=scheduler)
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = 10.0,
+        burst: Optional[float] = None,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        on_outcome: Optional[Callable[[RequestOutcome], None]] = None,
+    ):
+        """
+        :param rate: Average requests per second (no rate limit if None)
+        :param burst: Requests allowed in a burst (defaults to rate)
+        :param max_retries: Retries of a failed request before giving up
+        :param base_delay: Backoff of the first retry in seconds, before jitter
+        :param max_delay: Upper bound of the backoff in seconds
+        :param initial_concurrency: Requests in flight allowed at first
+        :param min_concurrency: Lowest concurrency limit throttling can cut back to
+        :param max_concurrency: Highest concurrency limit successes can ramp up to
+        :param on_outcome: Callback invoked with the RequestOutcome of every request
+        """
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.concurrency = AdaptiveConcurrency(
+            initial_concurrency, min_concurrency, max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_outcome = on_outcome
+        self.stats = Counter()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_turn(self) -> float:
+        """
+        Wait out any Retry-After pause and take a rate limit token.
+
+        :return: Seconds spent waiting
+        """
+        waited = 0.0
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        if self.bucket is not None:
+            waited += self.bucket.acquire()
+        return waited
+
+    def _pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _finish(self, outcome: RequestOutcome, start: float) -> None:
+        outcome.elapsed = time.monotonic() - start
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["attempts"] += outcome.attempts
+            self.stats["throttled"] += outcome.throttled
+            self.stats["failed" if outcome.error else "succeeded"] += 1
+        if self.on_outcome:
+            self.on_outcome(outcome)
+
+    def call(
+        self, url: str, send: Callable[[], Tuple[int, str, Any, Dict[str, str]]]
+    ) -> Tuple[Tuple[int, str, Any, Dict[str, str]], RequestOutcome]:
+        """
+        Send a request, retrying it until it succeeds, fails for good or runs out of retries.
+
+        :param url: Url of the request, for errors and outcomes
+        :param send: Function sending the request once, returning (status, reason, body, headers)
+        :return: Tuple of the successful (status, reason, body, headers) and the RequestOutcome
+        :raises SurflineAPIError: Typed error of the last attempt, with its outcome attached
+        """
+        outcome = RequestOutcome(url=url)
+        start = time.monotonic()
+
+        for attempt in range(self.max_retries + 1):
+            outcome.attempts = attempt + 1
+            outcome.waited += self._wait_turn()
+
+            self.concurrency.acquire()
+            status = None
+            try:
+                status, reason, body, headers = send()
+            except SurflineAPIError as e:
+                error = e
+            except Exception as e:
+                error = TransportError(f"Request failed: {e}", url=url)
+            else:
+                error = None
+                if status not in (200, 304):
+                    error = error_for_status(
+                        status,
+                        reason,
+                        url,
+                        parse_retry_after((headers or {}).get("Retry-After")),
+                    )
+            finally:
+                self.concurrency.release(throttled=status in throttle_statuses)
+
+            outcome.status = status
+            outcome.reason = error.reason if error is not None else reason
+            if error is None:
+                self._finish(outcome, start)
+                return (status, reason, body, headers), outcome
+
+            if status in throttle_statuses:
+                outcome.throttled += 1
+                metrics.count("throttled")
+            if not error.retryable or attempt == self.max_retries:
+                outcome.error = type(error).__name__
+                error.outcome = outcome
+                self._finish(outcome, start)
+                raise error
+
+            if error.retry_after:
+                self._pause(error.retry_after)
+            delay = backoff_delay(
+                attempt, self.base_delay, self.max_delay, error.retry_after
+            )
+            metrics.count("retries")
+            outcome.waited += delay
+            time.sleep(delay)
@@ -0,0 +1,577 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import duckdb
+
+from .api import valid_types
+from .asof import forecast_asof, parse_time
+from .constants import serve_formats
+from .export import export_csv
+from .views import table_columns
+from .warehouse import generation, quote_literal, waiting_writer
+
+# Content type of each response format
+content_types = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Query parameters of /forecasts/{type}; the repeatable ones may also be comma-separated
+forecast_params = {"spot_id", "from", "to", "issued", "columns", "limit", "offset"}
+repeatable_params = {"spot_id", "columns"}
+
+# Catalog the warehouse is attached as on every read connection
+catalog = "warehouse"
+
+
+class WarehouseBusyError(RuntimeError):
+    """The warehouse stayed locked by a writer for longer than a reader waits."""
+
+
+class RequestError(ValueError):
+    """A request the server cannot answer, with the HTTP status to answer it with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class ReadPool:
+    """
+    Read-only connections to a warehouse file shared by the threads of a server.
+
+    DuckDB lets either one process write a database file or any number of
+    processes read it. The pool opens the file read-only on demand and hands
+    out up to size cursors of that connection at a time. It closes the
+    connection once every cursor is back and either a writer has left its
+    intent next to the file (see warehouse.attach_warehouse) or the pool has
+    been idle for release_after seconds, so writers like duckdive watch and
+    ingest get the file in between reads. New readers wait while a writer
+    holds the file, up to wait seconds.
+
+    Usage:
+        pool = ReadPool("duckdive.duckdb")
+        with pool.cursor() as cursor:
+            cursor.sql("SELECT count(*) FROM warehouse.wave").fetchone()
+        pool.close()
+    """
+
+    def __init__(
+        self,
+        database: str,
+        size: int = 4,
+        release_after: Optional[float] = 5.0,
+        wait: float = 10.0,
+    ):
+        """
+        :param database: Path of the warehouse database file
+        :param size: Maximum number of queries run at once
+        :param release_after: Seconds without queries after which the file is
+            released (kept open until a writer asks for it if None)
+        :param wait: Seconds a query waits for a writer to release the file
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.database = database
+        self.size = size
+        self.release_after = release_after
+        self.wait = wait
+        # Generation of the file when the open connection was opened
+        self.generation: Optional[tuple] = None
+        self.opened = 0
+        self._con: Optional[duckdb.DuckDBPyConnection] = None
+        self._idle: List[duckdb.DuckDBPyConnection] = []
+        self._active = 0
+        self._last_used = time.monotonic()
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, daemon=True)
+        self._reaper.start()
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Borrow a cursor of the read-only connection, which has the warehouse
+        attached as the "warehouse" catalog.
+
+        :raises WarehouseBusyError: If a writer holds the file for longer than wait seconds
+        """
+        cursor = self._acquire()
+        try:
+            yield cursor
+        finally:
+            self._release(cursor)
+
+    def _acquire(self) -> duckdb.DuckDBPyConnection:
+        deadline = time.monotonic() + self.wait
+        with self._cond:
+            while True:
+                if self._closed.is_set():
+                    raise WarehouseBusyError("The read pool is closed")
+                # A waiting writer gets the file as soon as the running queries are done
+                writer = waiting_writer(self.database)
+                if not self._active and self._con is not None:
+                    if writer or generation(self.database) != self.generation:
+                        self._disconnect()
+                if self._con is None and not writer:
+                    self._connect()
+                if self._con is not None and not writer and self._active < self.size:
+                    self._active += 1
+                    return self._idle.pop() if self._idle else self._con.cursor()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WarehouseBusyError(
+                        f"{self.database} is locked by a writer, try again shortly"
+                    )
+                # Writers give no signal when they let go, so poll for the file
+                self._cond.wait(min(remaining, 0.05))
+
+    def _release(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        with self._cond:
+            self._active -= 1
+            self._last_used = time.monotonic()
+            if self._con is not None:
+                self._idle.append(cursor)
+            if not self._active and waiting_writer(self.database):
+                self._disconnect()
+            self._cond.notify_all()
+
+    def _connect(self) -> None:
+        """
+        Open the file read-only, leaving the connection closed if a writer holds it.
+        """
+        stamp = generation(self.database)
+        con = duckdb.connect()
+        try:
+            con.execute(
+                f'ATTACH {quote_literal(self.database)} AS "{catalog}" (READ_ONLY)'
+            )
+        except duckdb.IOException as e:
+            con.close()
+            if "lock" not in str(e).lower():
+                raise
+            return
+        self._con = con
+        self.generation = stamp
+        self.opened += 1
+
+    def _disconnect(self) -> None:
+        for cursor in self._idle:
+            cursor.close()
+        self._idle = []
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _reap(self) -> None:
+        """
+        Release the file once the pool is idle and a writer waits or
+        release_after seconds have passed; runs in a background thread.
+        """
+        while not self._closed.wait(0.05):
+            with self._cond:
+                if self._con is None or self._active:
+                    continue
+                idle = time.monotonic() - self._last_used
+                if waiting_writer(self.database) or (
+                    self.release_after is not None and idle >= self.release_after
+                ):
+                    self._disconnect()
+
+    def close(self) -> None:
+        """
+        Close the connection and stop releasing it in the background.
+        """
+        self._closed.set()
+        self._reaper.join()
+        with self._cond:
+            self._disconnect()
+            self._cond.notify_all()
+
+
+class ResultCache:
+    """
+    Least recently used cache of encoded responses, keyed by request and
+    stamped with the warehouse generation they were read at.
+
+    A lookup at a newer generation empties the cache, so responses are never
+    served from before the latest commit of the ingester. Size is bounded by
+    entry count and total bytes; bodies larger than a quarter of max_bytes
+    are not cached.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 2**20):
+        """
+        :param max_entries: Maximum number of cached responses (0 disables the cache)
+        :param max_bytes: Maximum total size of the cached bodies
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation: Optional[tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, stamp: tuple) -> Optional[Tuple[str, bytes]]:
+        """
+        Return the cached (content type, body) of a request at a generation, or None.
+        """
+        with self._lock:
+            if stamp != self.generation:
+                self._clear(stamp)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, stamp: tuple, content_type: str, body: bytes) -> None:
+        """
+        Cache the response of a request read at a generation.
+        """
+        if not self.max_entries or len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            # Read at another generation than the lookup that missed, so it
+            # may be older than what the next lookup expects
+            if stamp != self.generation:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous[1])
+            self._entries[key] = (content_type, body)
+            self.bytes += len(body)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _clear(self, stamp: tuple) -> None:
+        self._entries.clear()
+        self.bytes = 0
+        self.generation = stamp
+
+
+def query_params(query: str) -> Dict[str, List[str]]:
+    """
+    Parse the query string of a /forecasts request.
+
+    :raises RequestError: On an unknown parameter, or a repeated single-valued one
+    """
+    params = parse_qs(query, keep_blank_values=True)
+    unknown = sorted(set(params) - forecast_params - {"format"})
+    if unknown:
+        raise RequestError(
+            f"Unknown parameters {unknown}. Parameters: {', '.join(sorted(forecast_params | {'format'}))}"
+        )
+    for name, values in params.items():
+        if name in repeatable_params:
+            params[name] = [
+                value for entry in values for value in entry.split(",") if value
+            ]
+        elif len(values) > 1:
+            raise RequestError(f"Parameter '{name}' given more than once")
+    return params
+
+
+def _single(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def _count(params: Dict[str, List[str]], name: str) -> Optional[int]:
+    value = _single(params, name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise RequestError(f"Parameter '{name}' must be a non-negative integer")
+    return int(value)
+
+
+def forecast_query(
+    con: duckdb.DuckDBPyConnection, forecast_type: str, params: Dict[str, List[str]]
+) -> str:
+    """
+    Build the SQL of a /forecasts/{type} request: the forecast as of ?issued=
+    (defaults to now) for the ?spot_id= spots between ?from= and ?to=, with
+    the ?columns= columns and at most ?limit= rows after ?offset=.
+
+    :raises RequestError: If the type has no table or a parameter is invalid
+    """
+    try:
+        times = {
+            name: parse_time(_single(params, name))
+            for name in ("issued", "from", "to")
+            if _single(params, name)
+        }
+    except ValueError as e:
+        raise RequestError(str(e)) from None
+    try:
+        relation = forecast_asof(
+            con,
+            forecast_type,
+            times.get("issued"),
+            params.get("spot_id"),
+            times.get("from"),
+            times.get("to"),
+            catalog,
+        )
+    except ValueError as e:
+        # The only error left: the warehouse has no table of the type
+        raise RequestError(str(e), 404) from None
+
+    names = params.get("columns") or []
+    unknown = [name for name in names if name not in relation.columns]
+    if unknown:
+        raise RequestError(
+            f"Unknown columns {unknown}. Columns of {forecast_type}: {', '.join(relation.columns)}"
+        )
+    projection = ", ".join(f'"{name}"' for name in names) or "*"
+    query = f"SELECT {projection} FROM ({relation.sql_query()})"
+    limit, offset = _count(params, "limit"), _count(params, "offset")
+    if limit is not None:
+        query += f" LIMIT {limit}"
+    if offset:
+        query += f" OFFSET {offset}"
+    return query
+
+
+def encode(con: duckdb.DuckDBPyConnection, query: str, output: str) -> bytes:
+    """
+    Run a query and encode its rows in a response format, one of constants.serve_formats.
+    """
+    if output == "json":
+        # Each row is serialized by DuckDB; only the joining is left to Python
+        rows = con.execute(f"SELECT to_json(q)::VARCHAR FROM ({query}) q").fetchall()
+        return f"[{','.join(row[0] for row in rows)}]".encode()
+    if output == "csv":
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            export_csv(con, f"({query})", path)
+            return Path(path).read_bytes()
+        finally:
+            os.unlink(path)
+
+    from .batches import import_pyarrow
+
+    pa = import_pyarrow("Arrow responses")
+    import pyarrow.ipc
+
+    relation = con.sql(query)
+    # to_arrow_reader replaced fetch_arrow_reader in DuckDB 1.4
+    reader = getattr(relation, "to_arrow_reader", relation.fetch_arrow_reader)()
+    sink = pa.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def warehouse_index(con: duckdb.DuckDBPyConnection) -> bytes:
+    """
+    Describe the forecast tables of the warehouse as JSON: rows, spots and
+    the latest fetch time of each.
+    """
+    tables = {}
+    for forecast_type in valid_types:
+        columns = table_columns(con, forecast_type, catalog)
+        if not columns:
+            continue
+        issued = "valid_from" if "valid_from" in columns else "fetched_at"
+        rows, spots, latest = con.execute(
+            f'SELECT count(*), count(DISTINCT spot_id), max({issued})::VARCHAR FROM "{catalog}"."{forecast_type}"'
+        ).fetchone()
+        tables[forecast_type] = {"rows": rows, "spots": spots, "latest": latest}
+    return json.dumps({"tables": tables, "formats": serve_formats}).encode()
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests of a ForecastServer:
+
+        /                   forecast tables of the warehouse, as JSON
+        /forecasts/{type}   stored forecasts, see forecast_query
+        /health             pool and cache state, never cached
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: "ForecastServer"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip("/") or "/"
+        try:
+            if path == "/health":
+                self.respond(200, "application/json", self.server.health(), cache="")
+                return
+            params = query_params(url.query) if path != "/" else {}
+            output = _single(params, "format") or "json"
+            if output not in serve_formats:
+                raise RequestError(f"Invalid format. Must be one of {serve_formats}")
+            if path == "/":
+                key = (path,)
+            elif path.startswith("/forecasts/") and path.count("/") == 2:
+                # Without ?from= the window starts today, so the day is part of the request
+                today = None if "from" in params else date.today()
+                key = (
+                    path,
+                    output,
+                    today,
+                    tuple(
+                        (name, tuple(values)) for name, values in sorted(params.items())
+                    ),
+                )
+            else:
+                raise RequestError(f"No route {path}", 404)
+
+            stamp = generation(self.server.database)
+            cached = self.server.cache.get(key, stamp)
+            if cached is not None:
+                self.respond(200, *cached, cache="hit")
+                return
+            content_type, body, stamp = self.server.read(path, params, output)
+            self.server.cache.put(key, stamp, content_type, body)
+            self.respond(200, content_type, body, cache="miss")
+        except RequestError as e:
+            self.fail(e.status, str(e))
+        except WarehouseBusyError as e:
+            self.fail(503, str(e), {"Retry-After": "1"})
+        except ImportError as e:
+            self.fail(501, str(e))
+        except duckdb.Error as e:
+            self.fail(500, str(e))
+
+    def respond(
+        self,
+        status: int,
+        content_type: str,
+        body: bytes,
+        cache: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if cache:
+            self.send_header("X-Cache", cache)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def fail(
+        self, status: int, message: str, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps({"error": message}).encode()
+        self.respond(status, "application/json", body, cache="", headers=headers)
+
+    def log_message(self, format, *args):
+        if self.server.log_requests:
+            super().log_message(format, *args)
+
+
+class ForecastServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering read-only queries of a warehouse, each
+    connection on its own thread.
+
+    Queries run on the cursors of a ReadPool, so they share one read-only
+    connection and hand the file to writers in between, and responses are
+    kept in a ResultCache until the next commit to the warehouse.
+
+    Usage:
+        with ForecastServer("duckdive.duckdb", port=8000) as server:
+            server.serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        database: str = "duckdive.duckdb",
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        pool_size: int = 4,
+        cache_entries: int = 256,
+        cache_bytes: int = 64 * 2**20,
+        release_after: Optional[float] = 5.0,
+        wait: float = 10.0,
+        log_requests: bool = False,
+    ):
+        """
+        :param database: DuckDB warehouse file to serve
+        :param host: Interface to listen on
+        :param port: Port to listen on (0 for any free port)
+        :param pool_size: Maximum number of queries run at once
+        :param cache_entries: Maximum number of cached responses (0 disables the cache)
+        :param cache_bytes: Maximum total size of the cached responses
+        :param release_after: Idle seconds after which the file is released to writers
+        :param wait: Seconds a query waits for a writer before answering 503
+        :param log_requests: Log every request to stderr
+        :raises FileNotFoundError: If there is no warehouse file
+        """
+        if not Path(database).exists():
+            raise FileNotFoundError(f"No warehouse at {database}")
+        super().__init__((host, port), ForecastHandler)
+        self.database = str(database)
+        self.log_requests = log_requests
+        self.pool = ReadPool(self.database, pool_size, release_after, wait)
+        self.cache = ResultCache(cache_entries, cache_bytes)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def read(
+        self, path: str, params: Dict[str, List[str]], output: str
+    ) -> Tuple[str, bytes, tuple]:
+        """
+        Answer a request from the warehouse.
+
+        :return: Content type, body and the generation of the file it was read at
+        """
+        with self.pool.cursor() as cursor:
+            stamp = self.pool.generation
+            if path == "/":
+                return content_types["json"], warehouse_index(cursor), stamp
+            forecast_type = path.rsplit("/", 1)[-1]
+            query = forecast_query(cursor, forecast_type, params)
+            return content_types[output], encode(cursor, query, output), stamp
+
+    def health(self) -> bytes:
+        return json.dumps(
+            {
+                "database": self.database,
+                "connections_opened": self.pool.opened,
+                "cache": self.cache.stats(),
+            }
+        ).encode()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.close()
@@ -0,0 +1,431 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import duckdb
+
+from . import metrics
+from .api import surfline_api_url, valid_types
+from .asof import Time
+from .constants import transports, validation_modes, warehouse_layouts
+from .engine import FetchResult
+from .ingest import rejects_table
+from .resample import base_interval_hours
+from .warehouse import quote_literal
+
+# Queue the worker processes of a sharded ingestion put their FetchResults on
+_progress_queue = None
+
+
+@dataclass
+class ShardResult:
+    """
+    Outcome of fetching one shard of spots into its shard database.
+    """
+
+    index: int
+    path: str
+    spot_ids: List[str]
+    rows: Dict[str, int] = field(default_factory=dict)
+    fetched: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    # Metrics collected in the worker process, as Metrics.to_dict()
+    metrics: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class ShardedIngestResult:
+    """
+    Outcome of a sharded ingestion into a warehouse.
+    """
+
+    database: str
+    shards: List[ShardResult] = field(default_factory=list)
+    inserted: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+    merge_seconds: float = 0.0
+    # Captures copied into the capture store when recording
+    captured: int = 0
+
+
+def split_spots(spot_ids: List[str], shards: int) -> List[List[str]]:
+    """
+    Deal spot ids round-robin into at most `shards` non-empty shards.
+    """
+    return [chunk for chunk in (spot_ids[i::shards] for i in range(shards)) if chunk]
+
+
+def _init_worker(queue) -> None:
+    global _progress_queue
+    _progress_queue = queue
+
+
+def ingest_shard(
+    index: int,
+    spot_ids: List[str],
+    forecast_types: List[str],
+    path: str,
+    options: Dict[str, Any],
+) -> ShardResult:
+    """
+    Fetch every forecast type for a shard of spots into the shard's own
+    database file. Runs in a worker process, with its own
+    client and RequestScheduler; each FetchResult is put on the progress queue,
+    followed by None once the shard is done.
+
+    :param index: Index of the shard
+    :param spot_ids: Spot ids of the shard
+    :param forecast_types: Forecast types to fetch
+    :param path: Shard database file to create
+    :param options: Client and fetch_report options, see ingest_sharded
+    :return: ShardResult
+    """
+    from .cache import ResponseCache
+    from .captures import CaptureStore
+    from .client import SurflineClient
+    from .engine import fetch_report
+    from .scheduler import RequestScheduler
+
+    options = dict(options)
+    collector = metrics.enable() if options.pop("profile") else None
+    transport = options.pop("transport")
+    rate = options.pop("rate")
+    retries = options.pop("retries")
+    cache = options.pop("cache")
+    cache_ttl = options.pop("cache_ttl")
+    record = options.pop("record")
+    replay = options.pop("replay")
+    as_of = options.pop("as_of")
+    recorded_at = options.pop("recorded_at")
+
+    result = ShardResult(index=index, path=path, spot_ids=spot_ids)
+    start = time.monotonic()
+
+    def on_result(fetch_result: FetchResult) -> None:
+        if fetch_result.error:
+            result.errors += 1
+        else:
+            result.fetched += 1
+        if _progress_queue is not None:
+            _progress_queue.put(fetch_result)
+
+    con = client = capture = None
+    try:
+        # The shard's tables are written straight into its file, so a worker
+        # holds no more of them in memory than DuckDB's buffer pool
+        con = duckdb.connect(path)
+        if replay:
+            capture = CaptureStore(replay, replay=True, as_of=as_of)
+        elif record:
+            # Captures go into the shard too, and are copied into the store
+            # once every shard is done
+            capture = CaptureStore(con=con, recorded_at=recorded_at)
+        client = SurflineClient(
+            con=con,
+            capture=capture,
+            transport=transport,
+            pool_size=options["max_workers"],
+            cache=ResponseCache(ttl=cache_ttl) if cache else None,
+            scheduler=RequestScheduler(
+                rate=rate, max_retries=retries, max_concurrency=options["max_workers"]
+            ),
+        )
+        con = fetch_report(
+            spot_ids, forecast_types, client=client, on_result=on_result, **options
+        )
+        tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+        for table in [*forecast_types, rejects_table]:
+            if table in tables:
+                result.rows[table] = con.execute(
+                    f'SELECT count(*) FROM "{table}"'
+                ).fetchone()[0]
+    except Exception as e:
+        result.error = str(e)
+    finally:
+        if client is not None:
+            client.close()
+        if con is not None:
+            con.close()
+        if capture is not None:
+            capture.close()
+        if _progress_queue is not None:
+            _progress_queue.put(None)
+
+    result.seconds = time.monotonic() - start
+    if collector is not None:
+        result.metrics = collector.to_dict()
+    return result
+
+
+@metrics.timed("merge")
+def merge_shards(
+    database: Union[str, Path],
+    shards: List[ShardResult],
+    forecast_types: List[str],
+    fetched_at: Optional[datetime] = None,
+    layout: str = "versions",
+) -> Dict[str, int]:
+    """
+    Combine shard databases into the warehouse, the only process writing it.
+    The shards' tables of each forecast type are unioned and upserted in one
+    batch, so a merge writes what a single process fetching every spot would.
+    Records the shards rejected are appended to the warehouse's rejects table.
+
+    :param database: Warehouse database file
+    :param shards: ShardResults of the shards to merge (failed shards are skipped)
+    :param forecast_types: Forecast types to merge
+    :param fetched_at: Fetch time recorded for every row (defaults to now)
+    :param layout: Layout of new warehouse tables, see upsert_forecast
+    :return: Number of rows written per forecast type, and records rejected
+        under "rejects" if there were any
+    """
+    from .warehouse import attach_warehouse, save_rejects, upsert_forecast
+
+    fetched_at = fetched_at or datetime.now()
+    inserted = {}
+    con = duckdb.connect()
+    try:
+        catalog = attach_warehouse(con, str(database))
+        for shard in shards:
+            if shard.error is None:
+                con.execute(
+                    f"ATTACH {quote_literal(shard.path)} AS shard{shard.index} (READ_ONLY)"
+                )
+        for table in [*forecast_types, rejects_table]:
+            sources = [
+                f'shard{shard.index}."{table}"'
+                for shard in shards
+                if shard.error is None and table in shard.rows
+            ]
+            if not sources:
+                continue
+            con.execute(
+                f'CREATE OR REPLACE TABLE "{table}" AS '
+                + " UNION ALL BY NAME ".join(f"SELECT * FROM {s}" for s in sources)
+            )
+            if table == rejects_table:
+                inserted[table] = save_rejects(con, table, catalog)
+            else:
+                inserted[table] = upsert_forecast(
+                    con,
+                    table,
+                    source=table,
+                    fetched_at=fetched_at,
+                    catalog=catalog,
+                    layout=layout,
+                )
+            con.execute(f'DROP TABLE "{table}"')
+        con.execute(f'CHECKPOINT "{catalog}"')
+    finally:
+        con.close()
+    return inserted
+
+
+def ingest_sharded(
+    spot_ids: List[str],
+    forecast_types: Optional[List[str]] = None,
+    database: Union[str, Path] = "duckdive.duckdb",
+    shards: Optional[int] = None,
+    layout: str = "versions",
+    days: Optional[int] = 3,
+    interval_hours: Optional[float] = 1,
+    access_token: Optional[str] = None,
+    max_workers: int = 8,
+    transport: str = "duckdb",
+    validate: str = "sample",
+    rate: Optional[float] = None,
+    retries: int = 4,
+    cache: bool = True,
+    cache_ttl: Optional[float] = None,
+    resample: bool = False,
+    batch_size: Optional[int] = None,
+    base_url: str = surfline_api_url,
+    on_result: Optional[Callable[[FetchResult], None]] = None,
+    shard_dir: Union[str, Path, None] = None,
+    keep_shards: bool = False,
+    record: Union[str, Path, None] = None,
+    replay: Union[str, Path, None] = None,
+    as_of: Optional[Time] = None,
+) -> ShardedIngestResult:
+    """
+    Fetch every forecast type for many spots across a pool of processes and
+    upsert them into a warehouse.
+
+    Parsing and validating responses is CPU-bound and DuckDB allows one
+    writer per file, so a single process tops out at one core. Here the
+    spots are split into shards, each fetched, validated and written into
+    its own shard database by a worker process, and merge_shards then
+    combines the shards into the warehouse.
+
+    :param spot_ids: List of Surfline spot ids
+    :param forecast_types: List of forecast types to fetch (defaults to all valid types)
+    :param database: Warehouse database file
+    :param shards: Number of worker processes (defaults to the number of CPUs)
+    :param layout: Layout of new warehouse tables, one of constants.warehouse_layouts
+    :param days: Number of forecast days
+    :param interval_hours: Interval hours for forecast
+    :param access_token: Access token for premium data
+    :param max_workers: Maximum number of requests in flight at once per shard
+    :param transport: HTTP transport of the workers' clients
+    :param validate: How records are validated, one of ingest.validation_modes
+    :param rate: Maximum average requests per second across all shards (no limit if None)
+    :param retries: Retries of throttled, 5xx and failed requests
+    :param cache: Serve recent responses from the local ResponseCache
+    :param cache_ttl: Cache TTL in seconds (defaults per forecast type)
+    :param resample: Fetch at the base interval instead of interval_hours, sharing
+        cached responses with every coarser interval; the warehouse stores the
+        fetched records, never resampled aggregates
+    :param batch_size: Load records through pyarrow in batches of this many
+        rows, see fetch_report
+    :param base_url: Base url of the forecasts API
+    :param on_result: Callback invoked in this process with each FetchResult as it completes
+    :param shard_dir: Directory of the shard databases (defaults to a temporary
+        directory next to the warehouse)
+    :param keep_shards: Keep the shard databases after merging them
+    :param record: Capture store file to record every response body into,
+        with the ingestion's start time as the run's time (see captures.CaptureStore)
+    :param replay: Capture store file to serve every response from instead of the API
+    :param as_of: When replaying, the latest captures fetched at or before this time
+    :return: ShardedIngestResult
+    """
+    forecast_types = forecast_types or valid_types
+    if layout not in warehouse_layouts:
+        raise ValueError(f"Invalid layout. Must be one of {warehouse_layouts}")
+    if transport not in transports:
+        raise ValueError(f"Invalid transport. Must be one of {transports}")
+    if validate not in validation_modes:
+        raise ValueError(f"Invalid validate mode. Must be one of {validation_modes}")
+    if any(forecast_type not in valid_types for forecast_type in forecast_types):
+        raise ValueError(f"Invalid forecast_type. Must be one of {valid_types}")
+    if record and replay:
+        raise ValueError("Record and replay are mutually exclusive")
+    if replay:
+        # Fail here rather than in every worker if there is nothing to replay
+        from .captures import CaptureStore
+
+        CaptureStore(replay, replay=True).close()
+    if batch_size:
+        # Fail here rather than in every worker if pyarrow is missing
+        from .batches import import_pyarrow
+
+        import_pyarrow()
+
+    if resample and interval_hours and interval_hours > base_interval_hours:
+        # Only the fetched records are stored (see resample.hourly_table), so
+        # fetch the interval resampling would start from and keep it as is
+        interval_hours = base_interval_hours
+
+    chunks = split_spots(spot_ids, shards or os.cpu_count() or 1)
+    result = ShardedIngestResult(database=str(database))
+    if not chunks:
+        return result
+    fetched_at = datetime.now()
+    start = time.monotonic()
+
+    # Workers share the rate limit, and each has its own concurrency limit
+    options = {
+        "days": days,
+        "interval_hours": interval_hours,
+        "access_token": access_token,
+        "max_workers": max_workers,
+        "validate": validate,
+        "batch_size": batch_size,
+        "base_url": base_url,
+        "transport": transport,
+        "rate": rate / len(chunks) if rate else None,
+        "retries": retries,
+        "cache": cache,
+        "cache_ttl": cache_ttl,
+        "record": bool(record),
+        "replay": str(replay) if replay else None,
+        "as_of": as_of,
+        "recorded_at": fetched_at,
+        "profile": metrics.active() is not None,
+    }
+    directory = Path(
+        shard_dir
+        or tempfile.mkdtemp(
+            prefix="duckdive-shards-", dir=Path(database).resolve().parent
+        )
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Spawned rather than forked workers, so no DuckDB or HTTP state is shared
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=len(chunks),
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(queue,),
+        ) as executor:
+            futures = []
+            for index, chunk in enumerate(chunks):
+                path = directory / f"shard{index}.duckdb"
+                path.unlink(missing_ok=True)
+                futures.append(
+                    executor.submit(
+                        ingest_shard, index, chunk, forecast_types, str(path), options
+                    )
+                )
+            _relay_progress(queue, futures, on_result)
+            result.shards = [future.result() for future in futures]
+
+        for shard in result.shards:
+            if shard.metrics is not None:
+                metrics.merge(shard.metrics)
+        merge_start = time.monotonic()
+        result.inserted = merge_shards(
+            database, result.shards, forecast_types, fetched_at, layout
+        )
+        result.merge_seconds = time.monotonic() - merge_start
+        if record:
+            from .captures import copy_captures
+
+            result.captured = copy_captures(
+                record, [shard.path for shard in result.shards if shard.error is None]
+            )
+    finally:
+        queue.close()
+        if not keep_shards:
+            if shard_dir is None:
+                shutil.rmtree(directory, ignore_errors=True)
+            else:
+                for index in range(len(chunks)):
+                    (directory / f"shard{index}.duckdb").unlink(missing_ok=True)
+
+    result.seconds = time.monotonic() - start
+    return result
+
+
+def _relay_progress(queue, futures, on_result) -> None:
+    """
+    Pass the FetchResults the workers put on the queue to on_result until
+    every shard has reported that it is done.
+    """
+    finished = 0
+    while finished < len(futures):
+        try:
+            item = queue.get(timeout=0.1)
+        except Empty:
+            # A worker process that died cannot report that it is done
+            if all(future.done() for future in futures) and any(
+                future.exception() for future in futures
+            ):
+                return
+            continue
+        if item is None:
+            finished += 1
+        elif on_result:
+            on_result(item)
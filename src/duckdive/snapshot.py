@@ -0,0 +1,243 @@
+from typing import Callable, List, Optional, Union
+
+import duckdb
+
+from .api import surfline_api_url, valid_types
+from .client import SurflineClient
+from .constants import daily_types, meta_columns, numeric_types
+from .engine import FetchResult, fetch_report
+from .resample import interpolate_sql
+from .scheduler import RequestScheduler
+from .warehouse import time_column
+
+# Types forecast at every interval, joined on their exact timestamps. The union
+# of their timestamps is the time axis of the snapshot.
+interval_types = ["wave", "wind", "weather", "rating", "swells"]
+
+# Types with irregular timestamps, whose numeric columns are linearly
+# interpolated between the records before and after each timestamp
+interpolated_types = ["tides"]
+
+# Snapshot columns shown by the snapshot command unless --columns is given
+preview_columns = [
+    "timestamp",
+    "wave_surf_min",
+    "wave_surf_max",
+    "wind_speed",
+    "wind_directionType",
+    "tides_height",
+    "weather_temperature",
+    "rating_key",
+    "is_daylight",
+]
+
+
+def column_name(forecast_type: str, column: str) -> str:
+    """
+    Return the snapshot column name of a forecast column, prefixed with its
+    type unless it already starts with it, e.g. wind.speed -> wind_speed and
+    rating.rating -> rating.
+    """
+    if column.startswith(forecast_type):
+        return column
+    return f"{forecast_type}_{column}"
+
+
+def projection(
+    relation: duckdb.DuckDBPyRelation, forecast_type: str, alias: str
+) -> List[tuple]:
+    """
+    Return the (expression, name, type id) of every forecast column of a table,
+    with the fields of struct columns flattened into their own columns.
+    """
+    key = time_column(forecast_type)
+    columns = []
+    for column, type_ in zip(relation.columns, relation.types):
+        if column in meta_columns or column == key:
+            continue
+        name = column_name(forecast_type, column)
+        if type_.id == "struct":
+            columns += [
+                (f'{alias}."{column}"."{field}"', f"{name}_{field}", child.id)
+                for field, child in type_.children
+            ]
+        else:
+            columns.append((f'{alias}."{column}"', name, type_.id))
+    return columns
+
+
+def snapshot_sql(con: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """
+    Build the query joining every forecast table of a connection into one wide
+    table with a row per spot and timestamp, entirely inside DuckDB:
+
+    - interval types (wave, wind, ...) are LEFT JOINed on spot_id and timestamp
+    - tides are ASOF-joined to the records before and after each timestamp,
+      with numeric columns (the height) linearly interpolated between them
+    - daily types (sunlight, conditions) are ASOF-joined to the day's record,
+      and sunlight adds an is_daylight flag
+
+    :param con: DuckDB connection holding the forecast tables
+    :return: SQL query, or None if no table provides a time axis
+    """
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    axis_types = [t for t in interval_types if t in tables] or [
+        t for t in interpolated_types if t in tables
+    ]
+    if not axis_types:
+        return None
+
+    axis = " UNION ".join(
+        f'SELECT spot_id, "timestamp" FROM "{forecast_type}"'
+        for forecast_type in axis_types
+    )
+    select = [
+        "axis.spot_id",
+        'axis."timestamp"',
+        'to_timestamp(axis."timestamp") AS valid_time',
+    ]
+    joins = []
+
+    for forecast_type in interval_types:
+        if forecast_type not in tables:
+            continue
+        select += [
+            f'{expression} AS "{name}"'
+            for expression, name, _ in projection(
+                con.table(forecast_type), forecast_type, f'"{forecast_type}"'
+            )
+        ]
+        joins.append(
+            f'LEFT JOIN "{forecast_type}" ON "{forecast_type}".spot_id = axis.spot_id'
+            f' AND "{forecast_type}"."timestamp" = axis."timestamp"'
+        )
+
+    for forecast_type in interpolated_types:
+        if forecast_type not in tables:
+            continue
+        before, after = f"{forecast_type}_before", f"{forecast_type}_after"
+        for expression, name, type_id in projection(
+            con.table(forecast_type), forecast_type, before
+        ):
+            if type_id in numeric_types:
+                expression = interpolate_sql(
+                    expression, before, after, 'axis."timestamp"'
+                )
+            select.append(f'{expression} AS "{name}"')
+        joins += [
+            f'ASOF LEFT JOIN "{forecast_type}" AS {before} ON {before}.spot_id = axis.spot_id'
+            f' AND axis."timestamp" >= {before}."timestamp"',
+            f'ASOF LEFT JOIN "{forecast_type}" AS {after} ON {after}.spot_id = axis.spot_id'
+            f' AND axis."timestamp" <= {after}."timestamp"',
+        ]
+
+    for forecast_type in daily_types:
+        if forecast_type not in tables:
+            continue
+        relation = con.table(forecast_type)
+        select += [
+            f'{expression} AS "{name}"'
+            for expression, name, _ in projection(
+                relation, forecast_type, f'"{forecast_type}"'
+            )
+        ]
+        if forecast_type == "sunlight" and {"sunrise", "sunset"} <= set(
+            relation.columns
+        ):
+            select.append(
+                'axis."timestamp" BETWEEN sunlight.sunrise AND sunlight.sunset AS is_daylight'
+            )
+        key = time_column(forecast_type)
+        joins.append(
+            f'ASOF LEFT JOIN "{forecast_type}" ON "{forecast_type}".spot_id = axis.spot_id'
+            f' AND axis."timestamp" >= "{forecast_type}"."{key}"'
+        )
+
+    return f"""
+        SELECT {", ".join(select)}
+        FROM ({axis}) AS axis
+        {" ".join(joins)}
+        ORDER BY axis.spot_id, axis."timestamp"
+    """
+
+
+def create_snapshot(
+    con: duckdb.DuckDBPyConnection, table: str = "snapshot"
+) -> Optional[duckdb.DuckDBPyRelation]:
+    """
+    Create (or replace) the wide snapshot table from the forecast tables of a connection.
+
+    :param con: DuckDB connection holding the forecast tables
+    :param table: Name of the snapshot table
+    :return: Relation over the snapshot table, or None if there was nothing to join
+    """
+    query = snapshot_sql(con)
+    if query is None:
+        return None
+    con.execute(f'CREATE OR REPLACE TABLE "{table}" AS {query}')
+    return con.table(table)
+
+
+def fetch_snapshot(
+    spot_ids: Union[str, List[str]],
+    days: Optional[int] = 1,
+    interval_hours: Optional[float] = 1,
+    forecast_types: Optional[List[str]] = None,
+    access_token: Optional[str] = None,
+    max_workers: int = 8,
+    transport: str = "duckdb",
+    validate: str = "sample",
+    client: Optional[SurflineClient] = None,
+    base_url: str = surfline_api_url,
+    on_result: Optional[Callable[[FetchResult], None]] = None,
+    resample: bool = False,
+) -> Optional[duckdb.DuckDBPyRelation]:
+    """
+    Fetch every forecast type for one or more spots concurrently and join them
+    into one wide, typed 'snapshot' table with a row per spot and timestamp.
+
+    Usage:
+        snapshot = duckdive.fetch_snapshot("5842041f4e65fad6a7708839")
+        snapshot.filter("is_daylight").df()
+
+    :param spot_ids: Surfline spot id or list of spot ids
+    :param days: Number of forecast days
+    :param interval_hours: Interval hours for forecast
+    :param forecast_types: Forecast types to join (defaults to all valid types)
+    :param access_token: Access token for premium data
+    :param max_workers: Maximum number of requests in flight at once
+    :param transport: HTTP transport of the new client, "duckdb" or "requests"
+    :param validate: How records are validated, one of ingest.validation_modes
+    :param client: SurflineClient to fetch with (defaults to a new in-memory client,
+        whose HTTP session is closed before returning)
+    :param base_url: Base url of the forecasts API
+    :param on_result: Callback invoked with each FetchResult as it completes
+    :param resample: Fetch hourly data and resample it to interval_hours locally
+    :return: Relation over the snapshot table, or None if no interval data was fetched
+    """
+    if isinstance(spot_ids, str):
+        spot_ids = [spot_ids]
+    owned = client is None
+    client = client or SurflineClient(
+        transport=transport,
+        pool_size=max_workers,
+        scheduler=RequestScheduler(max_concurrency=max_workers),
+    )
+    con = fetch_report(
+        spot_ids,
+        forecast_types or valid_types,
+        days=days,
+        interval_hours=interval_hours,
+        access_token=access_token,
+        max_workers=max_workers,
+        client=client,
+        base_url=base_url,
+        validate=validate,
+        on_result=on_result,
+        resample=resample,
+    )
+    snapshot = create_snapshot(con)
+    if owned:
+        # The snapshot relation keeps the connection alive
+        client.release()
+    return snapshot
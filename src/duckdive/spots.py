@@ -0,0 +1,347 @@
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import duckdb
+
+from . import metrics
+
+default_registry = (
+    Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share"))
+    / "duckdive"
+    / "spots.duckdb"
+)
+
+# Size in degrees of the grid cells spots are bucketed into (about 55 km of
+# latitude), so radius queries only look at the cells around the point
+grid_degrees = 0.5
+grid_columns = int(360 / grid_degrees)
+
+earth_radius_km = 6371.0
+km_per_degree = 111.32
+
+# Column names accepted on import for each registry column
+column_aliases = {
+    "spot_id": ["spot_id", "spotId", "id", "_id"],
+    "name": ["name"],
+    "region": ["region", "subregion"],
+    "lat": ["lat", "latitude"],
+    "lon": ["lon", "lng", "longitude"],
+    "timezone": ["timezone", "tz"],
+}
+
+
+def cell_of(lat: float, lon: float) -> int:
+    """
+    Return the grid cell id of a coordinate, matching the cell column of the registry.
+    """
+    row = math.floor((lat + 90) / grid_degrees)
+    column = math.floor((lon + 180) / grid_degrees) % grid_columns
+    return row * grid_columns + column
+
+
+def cell_sql(lat: str = "lat", lon: str = "lon") -> str:
+    """
+    Build the SQL computing the grid cell id of lat / lon columns, as cell_of does.
+    """
+    return (
+        f"CAST(floor(({lat} + 90) / {grid_degrees}) * {grid_columns}"
+        f" + floor(({lon} + 180) / {grid_degrees}) % {grid_columns} AS BIGINT)"
+    )
+
+
+def cells_within(lat: float, lon: float, radius_km: float) -> List[int]:
+    """
+    Return the ids of every grid cell that may hold points within radius_km of a coordinate.
+    """
+    dlat = radius_km / km_per_degree
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90)))
+    # Near the poles a radius can span every longitude
+    dlon = 180 if cos_lat < 1e-6 else min(radius_km / (km_per_degree * cos_lat), 180)
+
+    first_row = math.floor((max(lat - dlat, -90) + 90) / grid_degrees)
+    last_row = math.floor((min(lat + dlat, 90) + 90) / grid_degrees)
+    first_column = math.floor((lon - dlon + 180) / grid_degrees)
+    last_column = math.floor((lon + dlon + 180) / grid_degrees)
+    columns = {
+        column % grid_columns
+        for column in range(
+            first_column, min(last_column, first_column + grid_columns - 1) + 1
+        )
+    }
+    return sorted(
+        row * grid_columns + column
+        for row in range(first_row, last_row + 1)
+        for column in columns
+    )
+
+
+def distance_sql(lat: float, lon: float) -> str:
+    """
+    Build the SQL of the great-circle (haversine) distance in km from a
+    coordinate to the lat / lon columns.
+    """
+    return (
+        f"2 * {earth_radius_km} * asin(sqrt("
+        f"pow(sin(radians(lat - {lat!r}) / 2), 2)"
+        f" + cos(radians({lat!r})) * cos(radians(lat))"
+        f" * pow(sin(radians(lon - {lon!r}) / 2), 2)))"
+    )
+
+
+def ensure_spots_table(con: duckdb.DuckDBPyConnection) -> None:
+    """
+    Create the spots registry table and its grid cell index if they do not exist.
+    """
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS spots (
+            spot_id VARCHAR PRIMARY KEY,
+            name VARCHAR,
+            region VARCHAR,
+            lat DOUBLE,
+            lon DOUBLE,
+            timezone VARCHAR,
+            cell BIGINT
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS spots_cell ON spots (cell)")
+
+
+def open_registry(
+    path: Union[str, Path, None] = None, read_only: bool = False
+) -> duckdb.DuckDBPyConnection:
+    """
+    Open the spot registry database, creating it (and its table) if needed.
+
+    :param path: Registry database file (defaults to default_registry)
+    :param read_only: Open the registry read-only; it must already exist
+    :return: DuckDB connection to the registry
+    """
+    path = Path(path or default_registry)
+    if read_only:
+        return duckdb.connect(str(path), read_only=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(path))
+    ensure_spots_table(con)
+    return con
+
+
+@metrics.timed("spot_import")
+def import_spots(con: duckdb.DuckDBPyConnection, path: Union[str, Path]) -> int:
+    """
+    Bulk import spots from a CSV or JSON file into the registry, replacing
+    spots whose spot_id is already registered.
+
+    CSV and JSON (an array or newline-delimited objects) files are read by
+    DuckDB directly; columns are matched by name using column_aliases and
+    only spot_id is required. A JSON object of name -> spot id, the format of
+    duckdive_spots.json, is imported as names without coordinates.
+
+    :param con: DuckDB connection to the registry
+    :param path: File to import
+    :return: Number of spots imported
+    :raises ValueError: If the file has no spot id column
+    """
+    path = Path(path)
+    ensure_spots_table(con)
+
+    if path.suffix.lower() == ".csv":
+        relation = con.read_csv(str(path))
+    else:
+        with open(path) as f:
+            head = f.read(64).lstrip()
+        if head.startswith("{") and _is_name_mapping(path):
+            with open(path) as f:
+                names = json.load(f)
+            return register_spots(con, names)
+        relation = con.read_json(str(path))
+
+    available = set(relation.columns)
+    projection = []
+    for column, aliases in column_aliases.items():
+        found = next((alias for alias in aliases if alias in available), None)
+        if found is None and column == "spot_id":
+            raise ValueError(
+                f"No spot id column in {path}. Expected one of {column_aliases['spot_id']}"
+            )
+        projection.append(f'"{found}" AS {column}' if found else f"NULL AS {column}")
+
+    con.register("spot_import", relation)
+    try:
+        count = con.execute(
+            f"""
+            INSERT OR REPLACE INTO spots
+            SELECT *, {cell_sql()} AS cell
+            FROM (
+                SELECT CAST(spot_id AS VARCHAR) AS spot_id,
+                    CAST(name AS VARCHAR) AS name,
+                    CAST(region AS VARCHAR) AS region,
+                    CAST(lat AS DOUBLE) AS lat,
+                    CAST(lon AS DOUBLE) AS lon,
+                    CAST(timezone AS VARCHAR) AS timezone
+                FROM (SELECT {", ".join(projection)} FROM spot_import)
+                WHERE spot_id IS NOT NULL
+                QUALIFY row_number() OVER (PARTITION BY spot_id) = 1
+            )
+            """
+        ).fetchone()[0]
+    finally:
+        con.unregister("spot_import")
+    return count
+
+
+def _is_name_mapping(path: Path) -> bool:
+    """
+    Return whether a JSON file holds a single object of name -> spot id strings.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and all(isinstance(v, str) for v in data.values())
+
+
+def register_spots(con: duckdb.DuckDBPyConnection, names: Dict[str, str]) -> int:
+    """
+    Register spots given as a mapping of name -> spot id, without coordinates.
+    Coordinates, regions and timezones already registered for them are kept.
+
+    :param con: DuckDB connection to the registry
+    :param names: Mapping of spot name to Surfline spot id
+    :return: Number of spots registered
+    """
+    ensure_spots_table(con)
+    rows = [(spot_id, name) for name, spot_id in names.items()]
+    if not rows:
+        return 0
+    con.executemany(
+        """
+        INSERT INTO spots (spot_id, name) VALUES (?, ?)
+        ON CONFLICT (spot_id) DO UPDATE SET name = excluded.name
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def nearby_spots(
+    con: duckdb.DuckDBPyConnection,
+    lat: float,
+    lon: float,
+    radius_km: float = 30,
+    region: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> duckdb.DuckDBPyRelation:
+    """
+    Return the registered spots within radius_km of a coordinate, nearest first,
+    with their distance_km. Only the grid cells around the point are scanned
+    (through the cell index) before the exact haversine distance is applied.
+
+    :param con: DuckDB connection to the registry
+    :param lat: Latitude in degrees
+    :param lon: Longitude in degrees
+    :param radius_km: Search radius in km
+    :param region: Only return spots of this region
+    :param limit: Return at most this many spots
+    :return: DuckDB relation of spots
+    """
+    cells = ", ".join(str(cell) for cell in cells_within(lat, lon, radius_km))
+    where = f"cell IN ({cells})"
+    params = {}
+    if region is not None:
+        where += " AND region = $region"
+        params["region"] = region
+    query = f"""
+        SELECT * EXCLUDE (cell, distance_km), round(distance_km, 2) AS distance_km
+        FROM (
+            SELECT *, {distance_sql(lat, lon)} AS distance_km
+            FROM spots
+            WHERE {where}
+        )
+        WHERE distance_km <= {radius_km!r}
+        ORDER BY distance_km
+    """
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return con.sql(query, params=params or None)
+
+
+def region_spots(
+    con: duckdb.DuckDBPyConnection, region: str
+) -> duckdb.DuckDBPyRelation:
+    """
+    Return the registered spots of a region, by name.
+    """
+    return con.sql(
+        "SELECT * EXCLUDE (cell) FROM spots WHERE region = $region ORDER BY name",
+        params={"region": region},
+    )
+
+
+def parse_coordinate(value: str) -> Tuple[float, float]:
+    """
+    Parse a "lat,lon" string, e.g. "33.89,-118.42".
+    """
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError(
+            f"Invalid coordinate '{value}'. Use lat,lon e.g. 33.89,-118.42"
+        ) from None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Coordinate '{value}' is out of range")
+    return lat, lon
+
+
+def find_spot_ids(
+    region: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: float = 30,
+    registry: Union[str, Path, None] = None,
+) -> List[str]:
+    """
+    Return the ids of the registered spots of a region and/or near a
+    coordinate, for feeding straight into a batch fetch.
+
+    :param region: Region of the spots
+    :param near: "lat,lon" the spots must be within radius_km of
+    :param radius_km: Search radius in km
+    :param registry: Registry database file (defaults to default_registry)
+    :return: List of spot ids, nearest first when near is given
+    """
+    point = parse_coordinate(near) if near else None
+    con = open_registry(registry)
+    try:
+        if point is not None:
+            relation = nearby_spots(con, *point, radius_km=radius_km, region=region)
+        else:
+            relation = region_spots(con, region)
+        return [row[0] for row in relation.project("spot_id").fetchall()]
+    finally:
+        con.close()
+
+
+def select_spot_ids(
+    spot_ids: Optional[List[str]] = None,
+    region: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: float = 30,
+    registry: Union[str, Path, None] = None,
+) -> List[str]:
+    """
+    Return the spots a command runs for: the given spot ids, else the
+    registered spots matching region / near, else the spots of
+    duckdive_spots.json or the built-in spots.
+    """
+    if spot_ids:
+        return spot_ids
+    if region or near:
+        return find_spot_ids(region, near, radius_km, registry)
+    from .util import load_spot_ids, spot_dict
+
+    return load_spot_ids() or list(spot_dict)
@@ -1,9 +1,16 @@
+import json
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 from rich.table import Table
-from typing import Dict, List, Optional
 
+from . import metrics
+
+if TYPE_CHECKING:
+    import duckdb
 
 # surfline optimal score mapping
 optimal_score_mapping = {0: "Suboptimal", 1: "Good", 2: "Optimal"}
@@ -17,6 +24,18 @@ units_mapping = {
     "pressure": "MB",
 }
 
+# Keys of the 'am' / 'pm' observations of the conditions endpoint
+observation_keys = [
+    "timestamp",
+    "observation",
+    "rating",
+    "minHeight",
+    "maxHeight",
+    "plus",
+    "humanRelation",
+    "occasionalHeight",
+]
+
 spot_dict = {
     "5842041f4e65fad6a7708839": "Scripps",
     "5842041f4e65fad6a77088cc": "LJ Shores",
@@ -33,13 +52,23 @@ def load_spot_ids() -> List[str]:
     """
     Load spot IDs from duckdive_spots.json file.
     Returns list of spot IDs if file exists, None otherwise.
+    The file is parsed again only when its modification time changes.
     """
     spots_file = Path.cwd() / "duckdive_spots.json"
-    if spots_file.exists():
+    try:
+        mtime = spots_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _spot_file_cache.get(spots_file)
+    if cached is None or cached[0] != mtime:
         with open(spots_file) as f:
             data = json.load(f)
-            return list(data.values())
-    return None
+        cached = _spot_file_cache[spots_file] = (mtime, list(data.values()))
+    return list(cached[1])
+
+
+# Parsed duckdive_spots.json files, by path: (modification time, spot ids)
+_spot_file_cache: Dict[Path, tuple] = {}
 
 
 column_colors = [
@@ -55,6 +84,19 @@ column_colors = [
 ]
 
 
+def _new_table(columns: List[str]) -> Table:
+    """
+    Create an empty rich Table with one differently colored column per name.
+    """
+    table = Table(show_header=True, header_style="bold magenta")
+
+    # Cycle through the column colors if there are more columns than colors
+    for i, column in enumerate(columns):
+        table.add_column(column, style=column_colors[i % len(column_colors)])
+    return table
+
+
+@metrics.timed("table_build")
 def create_pretty_table(data: pd.DataFrame) -> Table:
     """
     Create a pretty table from a pandas DataFrame using rich's Table.
@@ -63,20 +105,99 @@ def create_pretty_table(data: pd.DataFrame) -> Table:
     :param data: pandas DataFrame
     :return: rich Table object
     """
-    table = Table(show_header=True, header_style="bold magenta")
-
-    # Cycle through the column colors if there are more columns than colors
-    num_columns = len(data.columns)
-    colors = column_colors * ((num_columns // len(column_colors)) + 1)
-
-    # Add columns to the rich Table with a different color for each
-    for i, col in enumerate(data.columns):
-        table.add_column(col, style=colors[i])
-
-    # Add rows to the rich Table
-    for _, row in data.iterrows():
+    table = _new_table([str(column) for column in data.columns])
+    for row in data.itertuples(index=False, name=None):
         table.add_row(*[str(value) for value in row])
+    return table
+
 
+def project_columns(
+    con: "duckdb.DuckDBPyConnection",
+    source: str,
+    columns: Optional[List[str]] = None,
+) -> str:
+    """
+    Build the SQL selecting a subset of a table's columns, in the given order.
+    Entries may also be comma-separated, e.g. ["timestamp,height", "type"].
+
+    :param con: DuckDB connection holding the table
+    :param source: Table name
+    :param columns: Columns to select (all columns if None or empty)
+    :return: SQL query string
+    :raises ValueError: If a column is not in the table
+    """
+    names = [name for entry in columns or [] for name in entry.split(",") if name]
+    if not names:
+        return f'SELECT * FROM "{source}"'
+
+    available = [row[0] for row in con.execute(f'DESCRIBE "{source}"').fetchall()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(
+            f"Unknown columns {unknown}. Columns of {source}: {', '.join(available)}"
+        )
+    projection = ", ".join(f'"{name}"' for name in names)
+    return f'SELECT {projection} FROM "{source}"'
+
+
+@metrics.timed("table_build")
+def stream_pretty_table(
+    con: "duckdb.DuckDBPyConnection",
+    query: str,
+    limit: Optional[int] = None,
+    page: int = 1,
+    batch_size: int = 2048,
+    formatted: bool = True,
+    params: Optional[Union[list, dict]] = None,
+) -> Table:
+    """
+    Create a pretty table from one page of a DuckDB query, streaming rows from
+    the result in batches so that only the shown rows ever leave DuckDB.
+    Each batch is formatted with format_dataframe on its own.
+
+    :param con: DuckDB connection to run the query on
+    :param query: SQL query of the rows to show
+    :param limit: Rows per page (every row if None)
+    :param page: 1-based page number to show
+    :param batch_size: Rows fetched from DuckDB at a time
+    :param formatted: Format each batch with format_dataframe
+    :param params: Parameters bound to the query's placeholders
+    :return: rich Table object, captioned with the page position when paged
+    """
+    if page < 1:
+        raise ValueError("Page must be 1 or greater")
+
+    caption = None
+    if limit is not None:
+        total = con.execute(f"SELECT count(*) FROM ({query})", params).fetchone()[0]
+        pages = max((total + limit - 1) // limit, 1)
+        first = (page - 1) * limit
+        caption = (
+            f"Page {page} of {pages} (rows {min(first + 1, total)}-"
+            f"{min(first + limit, total)} of {total})"
+        )
+        query = f"SELECT * FROM ({query}) LIMIT {limit} OFFSET {first}"
+
+    # A cursor keeps the streamed result apart from other queries on con
+    cursor = con.cursor()
+    try:
+        result = cursor.execute(query, params)
+        names = [column[0] for column in result.description]
+        table = None
+        while rows := result.fetchmany(batch_size):
+            batch = pd.DataFrame.from_records(rows, columns=names)
+            if formatted:
+                batch = format_dataframe(batch)
+            if table is None:
+                table = _new_table([str(column) for column in batch.columns])
+            for row in batch.itertuples(index=False, name=None):
+                table.add_row(*[str(value) for value in row])
+    finally:
+        cursor.close()
+
+    # No rows: show the headers of the (unformatted) result
+    table = table or _new_table(names)
+    table.caption = caption
     return table
 
 
@@ -107,6 +228,76 @@ def format_timestamp(unix_timestamp: int, utc_offset: int = 0) -> str:
     return dt.strftime("%Y-%m-%d %I%p")  # Format to 'YYYY-MM-DD HAMP/PM'
 
 
+def format_timestamp_column(series: pd.Series, utc_offset: int = 0) -> pd.Series:
+    """
+    Vectorized format_timestamp over a column of Unix timestamps.
+    Each distinct timestamp is formatted once, which matters for multi-spot
+    frames where the same timestamps repeat for every spot.
+
+    :param series: Column of Unix timestamps
+    :param utc_offset: UTC offset in hours (defaults to 0)
+    :return: Column of 'YYYY-MM-DD HHAM/PM' strings
+    """
+    codes, uniques = pd.factorize(series)
+    formatted = (
+        pd.to_datetime(np.asarray(uniques, dtype="int64"), unit="s")
+        + pd.Timedelta(hours=utc_offset)
+    ).strftime("%Y-%m-%d %I%p")
+    return _take(formatted, codes, series.index)
+
+
+def format_sunlight_column(series: pd.Series) -> pd.Series:
+    """
+    Vectorized format_sunlight_timestamp over a column of Unix timestamps.
+    Sunlight times are shown in local time, so each distinct timestamp goes
+    through format_sunlight_timestamp to keep DST handling identical.
+
+    :param series: Column of Unix timestamps
+    :return: Column of 'YYYY-MM-DD HH:MM AM/PM' strings
+    """
+    codes, uniques = pd.factorize(series)
+    formatted = [format_sunlight_timestamp(timestamp) for timestamp in uniques]
+    return _take(formatted, codes, series.index)
+
+
+def _take(values, codes: np.ndarray, index: pd.Index) -> pd.Series:
+    """
+    Expand per-distinct-value results back to a column using factorize codes,
+    leaving missing values (code -1) as NaN.
+    """
+    values = np.asarray(list(values) + [np.nan], dtype=object)
+    return pd.Series(values[codes], index=index).infer_objects()
+
+
+def format_units_column(series: pd.Series, unit: str) -> pd.Series:
+    """
+    Append a unit to every non-null value of a column, e.g. 2.5 -> '2.5 FT'.
+
+    :param series: Column of values
+    :param unit: Unit string to append
+    :return: Column of strings, with nulls left untouched
+    """
+    return (series.astype(str) + f" {unit}").where(series.notna()).infer_objects()
+
+
+def destructure_column(
+    df: pd.DataFrame, column: str, keys: List[str], prefix: str
+) -> pd.DataFrame:
+    """
+    Split a column of dicts into one '<prefix>_<key>' column per key, then drop
+    the original column. Non-dict values give missing values for every key.
+
+    :param df: The DataFrame containing the column
+    :param column: Name of the column of dicts
+    :param keys: Keys to extract
+    :param prefix: Prefix of the new column names
+    :return: The DataFrame with the new columns and the original column dropped
+    """
+    for key in keys:
+        df[f"{prefix}_{key}"] = df[column].str.get(key).infer_objects()
+    return df.drop(columns=[column])
+
+
 def format_ratings_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Formats the ratings DataFrame by:
@@ -115,14 +306,7 @@ def format_ratings_df(df: pd.DataFrame) -> pd.DataFrame:
     :param df: The DataFrame containing rating data
     :return: The formatted DataFrame with 'rating_key' and 'rating_value' columns, and the original 'rating' column dropped
     """
-    df["rating_key"] = df["rating"].apply(
-        lambda x: x.get("key") if isinstance(x, dict) else None
-    )
-    df["rating_value"] = df["rating"].apply(
-        lambda x: x.get("value") if isinstance(x, dict) else None
-    )
-    df = df.drop(columns=["rating"])  # Drop the original "rating" column
-    return df
+    return destructure_column(df, "rating", ["key", "value"], "rating")
 
 
 def format_swells_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -133,20 +317,25 @@ def format_swells_df(df: pd.DataFrame) -> pd.DataFrame:
     :param df: The DataFrame containing swells data
     :return: The DataFrame with only primary swell data
     """
-    # Process each row to extract only the primary swell
-    for idx, row in df.iterrows():
-        swells = row["swells"]
-        if isinstance(swells, list) and len(swells) > 0:
-            # Take only the first (primary) swell
-            primary_swell = swells[0]
-            # Update the row with primary swell data
-            for key, value in primary_swell.items():
-                df.at[idx, key] = value
+    # Lists come back as numpy arrays from DuckDB and as lists from records,
+    # .str[0] takes the first element of both
+    primary = df["swells"].str[0]
+    has_swell = primary.notna()
+    parts = (
+        pd.json_normalize(primary[has_swell].tolist())
+        .set_axis(df.index[has_swell])
+        .reindex(df.index)
+    )
 
-    # Drop the original swells column
-    df = df.drop(columns=["swells"])
+    # Primary swell values overwrite same-named columns (e.g. power) where present
+    for key in parts.columns:
+        if key in df.columns:
+            df[key] = parts[key].where(has_swell, df[key])
+        else:
+            df[key] = parts[key]
 
-    return df
+    # Drop the original swells column
+    return df.drop(columns=["swells"])
 
 
 def format_conditions_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -158,73 +347,13 @@ def format_conditions_df(df: pd.DataFrame) -> pd.DataFrame:
     :param df: The DataFrame containing conditions data
     :return: The formatted DataFrame with additional columns and original columns dropped
     """
-
-    # Destructure 'forecaster' into separate columns
-    df["forecaster_name"] = df["forecaster"].apply(
-        lambda x: x.get("name") if isinstance(x, dict) else None
-    )
-    df["forecaster_avatar"] = df["forecaster"].apply(
-        lambda x: x.get("avatar") if isinstance(x, dict) else None
-    )
-    df = df.drop(columns=["forecaster"])  # Drop the original "forecaster" column
-
-    # Destructure 'am' into separate columns
-    df["am_timestamp"] = df["am"].apply(
-        lambda x: x.get("timestamp") if isinstance(x, dict) else None
-    )
-    df["am_observation"] = df["am"].apply(
-        lambda x: x.get("observation") if isinstance(x, dict) else None
-    )
-    df["am_rating"] = df["am"].apply(
-        lambda x: x.get("rating") if isinstance(x, dict) else None
-    )
-    df["am_minHeight"] = df["am"].apply(
-        lambda x: x.get("minHeight") if isinstance(x, dict) else None
-    )
-    df["am_maxHeight"] = df["am"].apply(
-        lambda x: x.get("maxHeight") if isinstance(x, dict) else None
-    )
-    df["am_plus"] = df["am"].apply(
-        lambda x: x.get("plus") if isinstance(x, dict) else None
-    )
-    df["am_humanRelation"] = df["am"].apply(
-        lambda x: x.get("humanRelation") if isinstance(x, dict) else None
-    )
-    df["am_occasionalHeight"] = df["am"].apply(
-        lambda x: x.get("occasionalHeight") if isinstance(x, dict) else None
-    )
-    df = df.drop(columns=["am"])  # Drop the original "am" column
-
-    # Destructure 'pm' into separate columns
-    df["pm_timestamp"] = df["pm"].apply(
-        lambda x: x.get("timestamp") if isinstance(x, dict) else None
-    )
-    df["pm_observation"] = df["pm"].apply(
-        lambda x: x.get("observation") if isinstance(x, dict) else None
-    )
-    df["pm_rating"] = df["pm"].apply(
-        lambda x: x.get("rating") if isinstance(x, dict) else None
-    )
-    df["pm_minHeight"] = df["pm"].apply(
-        lambda x: x.get("minHeight") if isinstance(x, dict) else None
-    )
-    df["pm_maxHeight"] = df["pm"].apply(
-        lambda x: x.get("maxHeight") if isinstance(x, dict) else None
-    )
-    df["pm_plus"] = df["pm"].apply(
-        lambda x: x.get("plus") if isinstance(x, dict) else None
-    )
-    df["pm_humanRelation"] = df["pm"].apply(
-        lambda x: x.get("humanRelation") if isinstance(x, dict) else None
-    )
-    df["pm_occasionalHeight"] = df["pm"].apply(
-        lambda x: x.get("occasionalHeight") if isinstance(x, dict) else None
-    )
-    df = df.drop(columns=["pm"])  # Drop the original "pm" column
-
+    df = destructure_column(df, "forecaster", ["name", "avatar"], "forecaster")
+    df = destructure_column(df, "am", observation_keys, "am")
+    df = destructure_column(df, "pm", observation_keys, "pm")
     return df
 
 
+@metrics.timed("format")
 def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """
     Formats the given dataframe by:
@@ -232,16 +361,18 @@ def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     - Appending units to certain columns
     - Mapping optimalScore values using optimal_score_mapping
     - Flattening the nested "swells" column if it exists (taking only primary swell)
+
+    Every step works on whole columns rather than row by row.
     """
 
     # Apply format_timestamp if 'timestamp' column exists
     if "timestamp" in df.columns:
-        df["timestamp"] = df["timestamp"].apply(format_timestamp)
+        df["timestamp"] = format_timestamp_column(df["timestamp"])
 
     # Format sunlight columns
     for column in ["midnight", "dawn", "dusk", "sunrise", "sunset"]:
         if column in df.columns:
-            df[column] = df[column].apply(format_sunlight_timestamp)
+            df[column] = format_sunlight_column(df[column])
 
     # Replace optimalScore values if the column exists
     if "optimalScore" in df.columns:
@@ -263,8 +394,6 @@ def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     # Add units to the columns where applicable
     for column, unit in units_mapping.items():
         if column in df.columns:
-            df[column] = df[column].apply(
-                lambda x, u=unit: f"{x} {u}" if pd.notnull(x) else x
-            )
+            df[column] = format_units_column(df[column], unit)
 
     return df
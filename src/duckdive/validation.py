@@ -0,0 +1,111 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import ValidationError
+
+from . import metrics
+from .errors import RecordValidationError
+from .models import response_adapter
+
+
+@dataclass
+class Reject:
+    """
+    A record that failed validation, kept for quarantine.
+    """
+
+    # Position of the record in the response's list of records
+    index: int
+    # The record as JSON
+    record: str
+    error: str
+
+
+@dataclass
+class ValidationReport:
+    """
+    Outcome of validating every record of a response body.
+    """
+
+    forecast_type: str
+    records: int = 0
+    rejects: List[Reject] = field(default_factory=list)
+
+    @property
+    def valid(self) -> int:
+        return self.records - len(self.rejects)
+
+
+def validate_records(
+    body: Union[str, bytes, Dict[str, Any]],
+    forecast_type: str,
+    lenient: bool = False,
+) -> ValidationReport:
+    """
+    Validate every record of a response body in one call of the forecast
+    type's TypeAdapter (see models.response_adapter).
+
+    In strict mode any invalid record fails the whole body, with every
+    invalid record and field named in the error. In lenient mode the invalid
+    records are returned as rejects, for the caller to quarantine while the
+    rest of the body is loaded.
+
+    :param body: Raw JSON response body, or the body already decoded
+    :param forecast_type: Forecast type of the body
+    :param lenient: Reject invalid records instead of raising
+    :return: ValidationReport
+    :raises RecordValidationError: If a record is invalid in strict mode, or
+        the body is not a response of the forecast type in either mode
+    """
+    adapter = response_adapter(forecast_type)
+    report = ValidationReport(forecast_type=forecast_type)
+    try:
+        if isinstance(body, (str, bytes)):
+            response = adapter.validate_json(body)
+        else:
+            response = adapter.validate_python(body)
+    except ValidationError as e:
+        errors = record_errors(e, forecast_type)
+        if not lenient or None in errors:
+            raise RecordValidationError(forecast_type, errors) from None
+        records = _records(body, forecast_type)
+        report.records = len(records)
+        report.rejects = [
+            Reject(index=index, record=json.dumps(records[index]), error=error)
+            for index, error in sorted(errors.items())
+        ]
+        metrics.count("records_rejected", len(report.rejects))
+    else:
+        records = getattr(response.data, forecast_type, None) if response.data else None
+        report.records = len(records or [])
+    metrics.count("records_validated", report.records)
+    return report
+
+
+def record_errors(
+    error: ValidationError, forecast_type: str, index: Optional[int] = None
+) -> Dict[Optional[int], str]:
+    """
+    Group the errors of a response's validation by record index, as
+    "field: message" strings. Errors outside the records are keyed by None.
+
+    :param error: ValidationError of a response, or of a single record
+    :param forecast_type: Forecast type of the response
+    :param index: Index of the record, if the error is of a single record
+    """
+    grouped: Dict[Optional[int], List[str]] = {}
+    prefix = ("data", forecast_type)
+    for detail in error.errors(include_url=False):
+        key, loc = index, detail["loc"]
+        if index is None and loc[:2] == prefix and len(loc) > 2:
+            key, loc = loc[2], loc[3:]
+        where = ".".join(str(part) for part in loc) or "record"
+        grouped.setdefault(key, []).append(f"{where}: {detail['msg']}")
+    return {key: ", ".join(messages) for key, messages in grouped.items()}
+
+
+def _records(body: Union[str, bytes, Dict[str, Any]], forecast_type: str) -> list:
+    if isinstance(body, (str, bytes)):
+        body = json.loads(body)
+    return body["data"][forecast_type]
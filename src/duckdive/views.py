@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+import duckdb
+
+from .models import ConditionsData, json_structure
+
+# Identifying columns carried over from a forecast table into its views
+id_columns = [
+    "spot_id",
+    "forecast_type",
+    "fetched_at",
+    "valid_from",
+    "valid_to",
+    "timestamp",
+]
+
+# Forecast tables whose 'swells' list is exploded into swell_components
+swell_tables = ["swells", "wave"]
+
+
+def table_columns(
+    con: duckdb.DuckDBPyConnection, table: str, catalog: Optional[str] = None
+) -> List[str]:
+    """
+    Return the column names of a table, or an empty list if it does not exist.
+    """
+    return [
+        row[0]
+        for row in con.execute(
+            """
+            SELECT column_name FROM duckdb_columns()
+            WHERE database_name = coalesce($1, current_database())
+                AND schema_name = 'main' AND table_name = $2
+            ORDER BY column_index
+            """,
+            [catalog, table],
+        ).fetchall()
+    ]
+
+
+def swell_components_sql(tables: dict) -> Optional[str]:
+    """
+    Build the query of the swell_components view: one row per swell component
+    per timestamp, with its 1-based swell_index and every swell field as a column.
+
+    :param tables: Mapping of forecast table name to its column names
+    :return: SQL query, or None if no table holds swells
+    """
+    # Both endpoints carry the same swells, so the first available source is used
+    for table in swell_tables:
+        columns = tables.get(table, [])
+        if "swells" not in columns:
+            continue
+        ids = ", ".join(f'"{column}"' for column in id_columns if column in columns)
+        return f"""
+            SELECT {ids}, swell_index, swell.*
+            FROM (
+                SELECT *, unnest(swells) AS swell,
+                    generate_subscripts(swells, 1) AS swell_index
+                FROM "{table}"
+            )
+        """
+    return None
+
+
+def conditions_flat_sql(columns: List[str]) -> Optional[str]:
+    """
+    Build the query of the conditions_flat view: the forecaster, am and pm
+    structs of the conditions table flattened into prefixed columns.
+
+    :param columns: Column names of the conditions table
+    :return: SQL query, or None if there is no conditions table
+    """
+    if not columns:
+        return None
+    structure = json_structure(ConditionsData)
+    projection = []
+    for column in columns:
+        if isinstance(structure.get(column), dict):
+            projection += [
+                f'"{column}"."{key}" AS "{column}_{key}"' for key in structure[column]
+            ]
+        else:
+            projection.append(f'"{column}"')
+    return f'SELECT {", ".join(projection)} FROM "conditions"'
+
+
+def create_views(con: duckdb.DuckDBPyConnection, catalog: Optional[str] = None) -> None:
+    """
+    Create (or replace) the UNNEST-based views over the nested forecast tables:
+    swell_components and conditions_flat. Views are only created for the tables
+    that exist, and live in the same catalog as their tables.
+
+    :param con: DuckDB connection
+    :param catalog: Catalog holding the forecast tables (defaults to the current one)
+    """
+    tables = {
+        table: table_columns(con, table, catalog)
+        for table in [*swell_tables, "conditions"]
+    }
+    prefix = f'"{catalog}".' if catalog else ""
+
+    views = {
+        "swell_components": swell_components_sql(tables),
+        "conditions_flat": conditions_flat_sql(tables["conditions"]),
+    }
+    for view, query in views.items():
+        if query is not None:
+            con.execute(f'CREATE OR REPLACE VIEW {prefix}"{view}" AS {query}')
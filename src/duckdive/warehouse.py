@@ -0,0 +1,415 @@
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import duckdb
+
+from . import metrics
+from .constants import meta_columns, range_columns, warehouse_layouts
+from .views import create_views, table_columns
+
+# Column holding the valid time of each record, per forecast type
+time_columns = {"sunlight": "midnight"}
+
+
+def quote_literal(value: str) -> str:
+    """
+    Quote a string as a SQL literal, e.g. for ATTACH and COPY paths that cannot be
+    bound as parameters.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def time_column(forecast_type: str) -> str:
+    """
+    Return the name of the column holding the valid time of a forecast type.
+    """
+    return time_columns.get(forecast_type, "timestamp")
+
+
+# Seconds a writer waits for readers (e.g. duckdive serve) to release the
+# warehouse file before giving up on attaching it
+lock_timeout = 30.0
+
+
+def writer_intent(path: str) -> Path:
+    """
+    Return the path of the file a writer creates next to a warehouse while it
+    waits for the file lock. DuckDB lets one process write a database file or
+    any number of processes read it, so long-lived readers watch for this file
+    and close their connections when it appears.
+    """
+    return Path(f"{path}.writer")
+
+
+def waiting_writer(path: str) -> bool:
+    """
+    Return whether a writer is waiting for the lock of a warehouse file.
+    Intents older than lock_timeout are left over from a writer that died and
+    are ignored.
+    """
+    try:
+        age = time.time() - writer_intent(path).stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return age < lock_timeout
+
+
+def generation(database: str) -> tuple:
+    """
+    Return a fingerprint of a DuckDB file and its write-ahead log that changes
+    whenever a writer commits to it, checkpoints it or replaces it (e.g.
+    compact_warehouse), without opening the file.
+    """
+    stamps = []
+    for path in (database, f"{database}.wal"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stamps.append(None)
+        else:
+            stamps.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamps)
+
+
+def attach_warehouse(
+    con: duckdb.DuckDBPyConnection,
+    path: str,
+    alias: str = "warehouse",
+    timeout: float = lock_timeout,
+) -> str:
+    """
+    Attach a file-backed DuckDB warehouse to a connection, creating it if needed.
+
+    If another process holds the file (e.g. duckdive serve reading it), a
+    writer intent is left next to it and the attach is retried until the
+    holder lets go or timeout seconds have passed.
+
+    :param con: DuckDB connection
+    :param path: Path of the warehouse database file
+    :param alias: Catalog name to attach the warehouse as
+    :param timeout: Seconds to wait for other processes to release the file
+    :return: The catalog alias
+    :raises duckdb.IOException: If the file is still locked after timeout seconds
+    """
+    attached = {row[0] for row in con.execute("SHOW DATABASES").fetchall()}
+    if alias in attached:
+        return alias
+    intent = None
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    try:
+        while True:
+            try:
+                con.execute(f'ATTACH {quote_literal(path)} AS "{alias}"')
+                return alias
+            except duckdb.IOException as e:
+                if "lock" not in str(e).lower() or time.monotonic() >= deadline:
+                    raise
+            if intent is None:
+                intent = writer_intent(path)
+                intent.write_text(str(os.getpid()))
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+    finally:
+        # Leave the intent of another waiting writer in place
+        if intent is not None:
+            try:
+                if intent.read_text() == str(os.getpid()):
+                    intent.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def detach_warehouse(con: duckdb.DuckDBPyConnection, alias: str = "warehouse") -> None:
+    """
+    Detach a warehouse attached with attach_warehouse, releasing its file so
+    other processes can open it in between writes.
+    """
+    con.execute(f'DETACH DATABASE IF EXISTS "{alias}"')
+
+
+def describe(con: duckdb.DuckDBPyConnection, table: str) -> List[tuple]:
+    """
+    Return the (name, type) pairs of a table or query's columns.
+    """
+    return [row[:2] for row in con.execute(f"DESCRIBE {table}").fetchall()]
+
+
+def issue_column(columns: List[str]) -> str:
+    """
+    Return the column holding the fetch time of each version of a warehouse
+    table, given its column names: valid_from in the "ranges" layout, fetched_at
+    in the "versions" layout.
+    """
+    return "valid_from" if "valid_from" in columns else "fetched_at"
+
+
+def table_layout(con: duckdb.DuckDBPyConnection, target: str) -> Optional[str]:
+    """
+    Return the layout of an existing warehouse table, or None if it does not exist.
+
+    :param con: DuckDB connection with the warehouse attached
+    :param target: Fully qualified table name
+    """
+    catalog, table = target.split(".", 1)
+    columns = [
+        row[0]
+        for row in con.execute(
+            """
+            SELECT column_name FROM duckdb_columns()
+            WHERE database_name = $1 AND schema_name = 'main' AND table_name = $2
+            """,
+            [catalog.strip('"'), table.strip('"')],
+        ).fetchall()
+    ]
+    if not columns:
+        return None
+    return "ranges" if issue_column(columns) == "valid_from" else "versions"
+
+
+def create_table(
+    con: duckdb.DuckDBPyConnection,
+    target: str,
+    forecast_type: str,
+    columns: List[tuple],
+) -> None:
+    """
+    Create a warehouse table. "versions" layout tables get a primary key on
+    (spot_id, time column, fetched_at). "ranges" layout tables get no index,
+    since an ART index is about twice the size of the data, and the merge in
+    _insert_ranges keeps their rows unique by itself.
+
+    :param con: DuckDB connection with the warehouse attached
+    :param target: Fully qualified table name
+    :param forecast_type: Forecast type stored in the table
+    :param columns: (name, type) pairs of the table's columns, meta columns included
+    """
+    definitions = ", ".join(f'"{name}" {type_}' for name, type_ in columns)
+    if issue_column([name for name, _ in columns]) == "fetched_at":
+        key = time_column(forecast_type)
+        definitions += f', PRIMARY KEY (spot_id, "{key}", fetched_at)'
+    con.execute(f"CREATE TABLE {target} ({definitions})")
+
+
+def ensure_table(
+    con: duckdb.DuckDBPyConnection,
+    target: str,
+    forecast_type: str,
+    columns: List[tuple],
+) -> None:
+    """
+    Create a warehouse table for a forecast type if it does not exist yet, or add
+    any columns that appeared in the source since it was created.
+
+    :param con: DuckDB connection with the warehouse attached
+    :param target: Fully qualified target table name
+    :param forecast_type: Forecast type stored in the table
+    :param columns: (name, type) pairs of the table's columns, meta columns included
+    """
+    if table_layout(con, target) is None:
+        create_table(con, target, forecast_type, columns)
+        return
+
+    existing = {name for name, _ in describe(con, target)}
+    for name, type_ in columns:
+        if name not in existing:
+            con.execute(f'ALTER TABLE {target} ADD COLUMN "{name}" {type_}')
+
+
+@metrics.timed("upsert")
+def upsert_forecast(
+    con: duckdb.DuckDBPyConnection,
+    forecast_type: str,
+    source: str = "surfline_data",
+    spot_id: Optional[str] = None,
+    fetched_at: Optional[datetime] = None,
+    catalog: str = "warehouse",
+    layout: str = "versions",
+) -> int:
+    """
+    Incrementally load a table of forecast records into the warehouse table of
+    its forecast type.
+
+    A record is only written if it differs from the latest stored version of the
+    same (spot_id, timestamp), so repeated runs add nothing for unchanged
+    forecasts. Of several records sharing a (spot_id, timestamp) in one batch,
+    the same one is kept on every run. The comparison only scans the spots and time range of the
+    incoming batch, which keeps ingestion time flat as the warehouse grows.
+
+    Tables are stored in one of two layouts (see constants.warehouse_layouts):
+
+    - "versions": every version is a row keyed on (spot_id, timestamp, fetched_at)
+    - "ranges": every version is a row keyed on (spot_id, timestamp, valid_from)
+      with a validity range: valid_to is set to the fetch time of the version
+      replacing it, and is NULL for the current version (a type 2 slowly
+      changing dimension). Point-in-time lookups are a range filter.
+
+    :param con: DuckDB connection holding the source table, with the warehouse attached
+    :param forecast_type: Forecast type of the records (and name of the warehouse table)
+    :param source: Name of the table holding the fetched records
+    :param spot_id: Spot id of the records, if the source has no spot_id column
+    :param fetched_at: Fetch time recorded for this batch (defaults to now)
+    :param catalog: Catalog the warehouse is attached as
+    :param layout: Layout of the table if it does not exist yet; existing
+        tables keep the layout they were created with
+    :return: Number of rows written
+    """
+    if layout not in warehouse_layouts:
+        raise ValueError(f"Invalid layout. Must be one of {warehouse_layouts}")
+    fetched_at = fetched_at or datetime.now()
+    target = f'"{catalog}"."{forecast_type}"'
+    key = time_column(forecast_type)
+    layout = table_layout(con, target) or layout
+
+    source_columns = describe(con, f'"{source}"')
+    data_columns = [
+        (name, type_) for name, type_ in source_columns if name not in meta_columns
+    ]
+    data_projection = ", ".join(f'"{name}"' for name, _ in data_columns)
+    has_spot_id = any(name == "spot_id" for name, _ in source_columns)
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE __staging AS
+            SELECT *
+            FROM (
+                SELECT
+                    {'"spot_id"' if has_spot_id else "$spot_id::VARCHAR"} AS spot_id,
+                    $forecast_type::VARCHAR AS forecast_type,
+                    $fetched_at::TIMESTAMP AS fetched_at,
+                    hash({data_projection}) AS row_hash,
+                    {data_projection}
+                FROM "{source}"
+            )
+            -- One record per key, picked the same way on every run, e.g. when
+            -- a tide extreme falls on the same timestamp as an hourly point
+            QUALIFY row_number() OVER (
+                PARTITION BY spot_id, "{key}" ORDER BY row_hash
+            ) = 1
+            """,
+            {
+                **({} if has_spot_id else {"spot_id": spot_id}),
+                "forecast_type": forecast_type,
+                "fetched_at": fetched_at,
+            },
+        )
+        if layout == "ranges":
+            ensure_table(
+                con, target, forecast_type, list(range_columns.items()) + data_columns
+            )
+            inserted = _insert_ranges(con, target, key, fetched_at)
+        else:
+            ensure_table(
+                con, target, forecast_type, list(meta_columns.items()) + data_columns
+            )
+            inserted = con.execute(
+                f"""
+                INSERT INTO {target} BY NAME
+                WITH latest AS (
+                    SELECT spot_id, "{key}", arg_max(row_hash, fetched_at) AS row_hash
+                    FROM {target}
+                    WHERE "{key}" BETWEEN (SELECT min("{key}") FROM __staging)
+                        AND (SELECT max("{key}") FROM __staging)
+                        AND spot_id IN (SELECT DISTINCT spot_id FROM __staging)
+                    GROUP BY ALL
+                )
+                SELECT s.*
+                FROM __staging s
+                ANTI JOIN latest l
+                    ON s.spot_id = l.spot_id
+                    AND s."{key}" = l."{key}"
+                    AND s.row_hash = l.row_hash
+                ON CONFLICT DO NOTHING
+                """
+            ).fetchone()[0]
+        con.execute("DROP TABLE __staging")
+        create_views(con, catalog)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    metrics.count("rows_inserted", inserted)
+    return inserted
+
+
+def save_rejects(
+    con: duckdb.DuckDBPyConnection,
+    source: str = "rejects",
+    catalog: str = "warehouse",
+    spot_id: Optional[str] = None,
+) -> int:
+    """
+    Append the records quarantined by lenient validation to the warehouse's
+    rejects table, created on first use.
+
+    :param con: DuckDB connection holding the source table, with the warehouse attached
+    :param source: Name of the table holding the rejected records (see ingest.insert_rejects)
+    :param catalog: Catalog the warehouse is attached as
+    :param spot_id: Spot id of the records that were rejected without one
+    :return: Number of records saved, 0 if there is no source table
+    """
+    if not table_columns(con, source):
+        return 0
+    target = f'"{catalog}"."rejects"'
+    con.execute(f'CREATE TABLE IF NOT EXISTS {target} AS FROM "{source}" LIMIT 0')
+    return con.execute(
+        f"""
+        INSERT INTO {target} BY NAME
+        SELECT * REPLACE (coalesce(spot_id, $spot_id::VARCHAR) AS spot_id)
+        FROM "{source}"
+        """,
+        {"spot_id": spot_id},
+    ).fetchone()[0]
+
+
+def _insert_ranges(
+    con: duckdb.DuckDBPyConnection, target: str, key: str, fetched_at: datetime
+) -> int:
+    """
+    Merge the staged batch into a "ranges" layout table: close the current
+    version of every record that changed, then insert the new versions.
+    Records whose current version was fetched at or after this batch are left
+    alone, so replaying an older or the same batch changes nothing. The
+    staged batch holds one record per key, so each gets at most one version.
+
+    :return: Number of rows written
+    """
+    superseded = con.execute(
+        f"""
+        UPDATE {target} AS t SET valid_to = $fetched_at
+        FROM __staging s
+        WHERE t.spot_id = s.spot_id
+            AND t."{key}" = s."{key}"
+            AND t.valid_to IS NULL
+            AND t.row_hash <> s.row_hash
+            AND t.valid_from < $fetched_at
+        """,
+        {"fetched_at": fetched_at},
+    ).fetchone()[0]
+    inserted = con.execute(
+        f"""
+        INSERT INTO {target} BY NAME
+        SELECT s.* EXCLUDE (fetched_at), s.fetched_at AS valid_from
+        FROM __staging s
+        ANTI JOIN (
+            SELECT spot_id, "{key}", row_hash, valid_from
+            FROM {target}
+            WHERE "{key}" BETWEEN (SELECT min("{key}") FROM __staging)
+                AND (SELECT max("{key}") FROM __staging)
+                AND spot_id IN (SELECT DISTINCT spot_id FROM __staging)
+                AND valid_to IS NULL
+        ) c
+            ON s.spot_id = c.spot_id
+            AND s."{key}" = c."{key}"
+            AND (s.row_hash = c.row_hash OR c.valid_from >= $fetched_at)
+        """,
+        {"fetched_at": fetched_at},
+    ).fetchone()[0]
+    metrics.count("rows_superseded", superseded)
+    return inserted
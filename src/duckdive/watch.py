@@ -0,0 +1,267 @@
+import heapq
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from .api import surfline_api_url, valid_types
+from .client import SurflineClient
+from .constants import warehouse_layouts
+from .engine import fetch_report
+from .scheduler import RequestScheduler
+from .warehouse import (
+    attach_warehouse,
+    detach_warehouse,
+    save_rejects,
+    upsert_forecast,
+)
+
+# Seconds between polls of each forecast type, roughly how often Surfline updates it
+poll_intervals = {
+    "rating": 60 * 60,
+    "conditions": 3 * 60 * 60,
+    "swells": 60 * 60,
+    "sunlight": 24 * 60 * 60,
+    "wave": 60 * 60,
+    "wind": 30 * 60,
+    "tides": 24 * 60 * 60,
+    "weather": 60 * 60,
+}
+
+duration_units = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parse a duration such as "90s", "30m", "6h" or "1d" into seconds.
+    A bare number is read as minutes.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", value)
+    if not match:
+        raise ValueError(f"Invalid duration '{value}'. Use e.g. 90s, 30m, 6h or 1d")
+    amount, unit = match.groups()
+    return float(amount) * duration_units[unit or "m"]
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a number of seconds as a short duration, e.g. "45s", "31m" or "21.6h".
+    """
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 60 * 60:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def parse_intervals(overrides: List[str]) -> Dict[str, float]:
+    """
+    Parse "type=duration" overrides, e.g. ["wind=15m", "tides=12h"], into seconds per type.
+    """
+    intervals = {}
+    for override in overrides:
+        forecast_type, _, duration = override.partition("=")
+        if forecast_type not in valid_types or not duration:
+            raise ValueError(
+                f"Invalid interval '{override}'. Use type=duration with a type in {valid_types}"
+            )
+        intervals[forecast_type] = parse_duration(duration)
+    return intervals
+
+
+@dataclass
+class PollResult:
+    """Outcome of polling one forecast type for every watched spot."""
+
+    forecast_type: str
+    started_at: datetime
+    seconds: float = 0.0
+    fetched: int = 0
+    errors: int = 0
+    inserted: int = 0
+    # Records quarantined by lenient validation
+    rejected: int = 0
+    error: Optional[str] = None
+    next_poll_in: float = 0.0
+    messages: List[str] = field(default_factory=list)
+
+
+class Watcher:
+    """
+    Long-running poller that keeps one client and one DuckDB connection open
+    and upserts every watched forecast type into a persistent warehouse on its
+    own schedule.
+
+    Polls are scheduled on a heap by their due time. Each interval is jittered
+    so that many watchers (or types sharing an interval) do not hit the API in
+    lockstep. Fetched records land in per-type in-memory tables that are
+    replaced on every poll, so memory stays flat however long the watcher runs.
+
+    Usage:
+        watcher = Watcher(["5842041f4e65fad6a7708839"], ["wind", "tides"], "surf.duckdb")
+        watcher.run()  # until SIGINT/SIGTERM or watcher.stop()
+    """
+
+    def __init__(
+        self,
+        spot_ids: List[str],
+        forecast_types: Optional[List[str]] = None,
+        database: str = "duckdive.duckdb",
+        layout: str = "versions",
+        intervals: Optional[Dict[str, float]] = None,
+        jitter: float = 0.1,
+        days: int = 3,
+        interval_hours: float = 1,
+        access_token: Optional[str] = None,
+        max_workers: int = 8,
+        transport: str = "duckdb",
+        validate: str = "sample",
+        base_url: str = surfline_api_url,
+        client: Optional[SurflineClient] = None,
+        scheduler: Optional[RequestScheduler] = None,
+    ):
+        """
+        :param spot_ids: Surfline spot ids to watch
+        :param forecast_types: Forecast types to poll (defaults to all valid types)
+        :param database: DuckDB warehouse file the forecasts are upserted into
+        :param layout: Layout of new warehouse tables, one of constants.warehouse_layouts
+        :param intervals: Seconds between polls per forecast type, overriding poll_intervals
+        :param jitter: Random fraction each interval is stretched or shrunk by, e.g. 0.1 for +/-10%
+        :param days: Number of forecast days to fetch
+        :param interval_hours: Interval hours of the fetched forecasts
+        :param access_token: Access token for premium data
+        :param max_workers: Maximum number of requests in flight during a poll
+        :param transport: HTTP transport of the client, "duckdb" or "requests"
+        :param validate: How records are validated, one of ingest.validation_modes
+        :param base_url: Base url of the forecasts API
+        :param client: SurflineClient to poll with (defaults to a new in-memory client)
+        :param scheduler: RequestScheduler of the new client (defaults to one
+            allowing max_workers requests in flight); ignored when client is given
+        """
+        if not 0 <= jitter < 1:
+            raise ValueError("Jitter must be between 0 and 1")
+        if layout not in warehouse_layouts:
+            raise ValueError(f"Invalid layout. Must be one of {warehouse_layouts}")
+
+        self.spot_ids = spot_ids
+        self.forecast_types = forecast_types or valid_types
+        self.intervals = {**poll_intervals, **(intervals or {})}
+        self.jitter = jitter
+        self.layout = layout
+        self.fetch_options = {
+            "days": days,
+            "interval_hours": interval_hours,
+            "access_token": access_token,
+            "max_workers": max_workers,
+            "validate": validate,
+            "base_url": base_url,
+        }
+        self.client = client or SurflineClient(
+            transport=transport,
+            pool_size=max_workers,
+            scheduler=scheduler or RequestScheduler(max_concurrency=max_workers),
+        )
+        self.database = database
+        # The warehouse is only attached while a poll writes to it, so readers
+        # such as duckdive serve can open the file in between polls
+        self.catalog = attach_warehouse(self.client.con, database)
+        detach_warehouse(self.client.con, self.catalog)
+        self._stop = threading.Event()
+        self._schedule = []
+
+    def next_delay(self, forecast_type: str) -> float:
+        """
+        Return the jittered number of seconds until a forecast type's next poll.
+        """
+        interval = self.intervals[forecast_type]
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def poll(self, forecast_type: str) -> PollResult:
+        """
+        Fetch one forecast type for every watched spot and upsert it into the warehouse.
+        """
+        result = PollResult(forecast_type=forecast_type, started_at=datetime.now())
+        start = time.monotonic()
+
+        def on_result(fetch_result):
+            if fetch_result.error:
+                result.errors += 1
+                result.messages.append(f"{fetch_result.spot_id}: {fetch_result.error}")
+            else:
+                result.fetched += 1
+
+        try:
+            con = fetch_report(
+                self.spot_ids,
+                [forecast_type],
+                client=self.client,
+                on_result=on_result,
+                **self.fetch_options,
+            )
+            attach_warehouse(con, self.database, self.catalog)
+            try:
+                if result.fetched:
+                    result.inserted = upsert_forecast(
+                        con,
+                        forecast_type,
+                        source=forecast_type,
+                        catalog=self.catalog,
+                        layout=self.layout,
+                    )
+                result.rejected = save_rejects(con, catalog=self.catalog)
+            finally:
+                detach_warehouse(con, self.catalog)
+        except Exception as e:
+            result.error = str(e)
+
+        result.seconds = time.monotonic() - start
+        return result
+
+    def run(
+        self,
+        on_poll: Optional[Callable[[PollResult], None]] = None,
+        max_polls: Optional[int] = None,
+    ) -> int:
+        """
+        Poll every forecast type on its schedule until stop() is called.
+        Every type is polled once at startup, then again after each jittered interval.
+
+        :param on_poll: Callback invoked with each PollResult
+        :param max_polls: Stop after this many polls (runs until stopped if None)
+        :return: Number of polls made
+        """
+        now = time.monotonic()
+        self._schedule = [(now, forecast_type) for forecast_type in self.forecast_types]
+        heapq.heapify(self._schedule)
+
+        polls = 0
+        while not self._stop.is_set() and (max_polls is None or polls < max_polls):
+            due, forecast_type = self._schedule[0]
+            # Sleep on the event so stop() wakes the watcher immediately
+            if self._stop.wait(max(due - time.monotonic(), 0)):
+                break
+
+            result = self.poll(forecast_type)
+            polls += 1
+            result.next_poll_in = self.next_delay(forecast_type)
+            heapq.heapreplace(
+                self._schedule, (time.monotonic() + result.next_poll_in, forecast_type)
+            )
+            if on_poll:
+                on_poll(result)
+        return polls
+
+    def stop(self) -> None:
+        """
+        Ask the watcher to stop once the poll in progress (if any) has finished.
+        """
+        self._stop.set()
+
+    def close(self) -> None:
+        """
+        Close the client. The warehouse is checkpointed as each poll detaches it.
+        """
+        self.client.close()
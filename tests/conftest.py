@@ -0,0 +1,33 @@
+"""
+Shared fixtures. Tests run against the stand-in Surfline API of
+benchmarks/stub_server.py, never the real one.
+"""
+
+import pytest
+from stub_server import StubHandler, StubServer
+
+
+class RecordingHandler(StubHandler):
+    # Headers of every request received, shared by every connection
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        if "spotId=missing" in self.path:
+            self.send_error(404)
+            return
+        super().do_GET()
+
+
+@pytest.fixture
+def api():
+    """
+    Stand-in API on a free port, answering 404 for spot "missing", with the
+    headers of the requests it received in its `requests` list.
+    """
+    handler = type(
+        "RecordingHandler", (RecordingHandler,), {"requests": [], "payloads": {}}
+    )
+    with StubServer(handler=handler) as server:
+        server.requests = handler.requests
+        yield server
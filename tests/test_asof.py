@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app
+from duckdive.asof import forecast_asof, forecast_evolution, forecast_skill
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+hour = timedelta(hours=1)
+first_run = datetime(2024, 9, 30, 6)
+first_valid = 1727740800
+spot_ids = ["spot0001", "spot'0002"]
+
+# Speeds of the first three hours, as fetched by each run six hours apart
+runs = [[5.0, 6.0, 7.0], [5.0, 9.0, 7.0], [4.0, 9.0, 8.0]]
+
+
+@pytest.fixture(params=["versions", "ranges"])
+def con(tmp_path, request):
+    con = duckdb.connect()
+    attach_warehouse(con, str(tmp_path / "surf.duckdb"))
+    for run, speeds in enumerate(runs):
+        con.execute(
+            "CREATE OR REPLACE TABLE wind"
+            " (spot_id VARCHAR, timestamp BIGINT, speed DOUBLE)"
+        )
+        con.executemany(
+            "INSERT INTO wind VALUES (?, ?, ?)",
+            [
+                [spot_id, first_valid + i * 3600, speed]
+                for spot_id in spot_ids
+                for i, speed in enumerate(speeds)
+            ],
+        )
+        upsert_forecast(
+            con,
+            "wind",
+            "wind",
+            fetched_at=first_run + run * 6 * hour,
+            layout=request.param,
+        )
+    yield con
+    con.close()
+
+
+valid_from = datetime.fromtimestamp(first_valid)
+
+
+def test_forecast_as_of_each_run(con):
+    for run, speeds in enumerate(runs):
+        issued = first_run + run * 6 * hour + hour
+        relation = forecast_asof(
+            con, "wind", issued, ["spot0001"], valid_from, catalog="warehouse"
+        )
+        assert relation.columns == ["spot_id", "valid_at", "issued_at", "speed"]
+        assert [row[3] for row in relation.fetchall()] == speeds
+
+    # Before the first run nothing was known yet
+    before = forecast_asof(
+        con, "wind", first_run - hour, None, valid_from, catalog="warehouse"
+    )
+    assert before.fetchall() == []
+
+
+def test_spot_ids_are_constants_not_sql(con):
+    relation = forecast_asof(
+        con, "wind", first_run, ["spot'0002"], valid_from, catalog="warehouse"
+    )
+    assert {row[0] for row in relation.fetchall()} == {"spot'0002"}
+    # The relation stays plain SQL that can be composed further
+    query = f"SELECT count(*) FROM ({relation.sql_query()})"
+    assert con.execute(query).fetchone() == (3,)
+
+
+def test_forecast_evolution_lists_every_version(con):
+    relation = forecast_evolution(
+        con, "wind", valid_from + hour, spot_ids=["spot0001"], catalog="warehouse"
+    )
+    rows = relation.project("speed, issued_at, replaced_at").fetchall()
+    assert rows == [
+        (6.0, first_run, first_run + 6 * hour),
+        (9.0, first_run + 6 * hour, None),
+    ]
+
+
+def test_forecast_skill_scores_each_lead_time(con):
+    relation = forecast_skill(
+        con,
+        "wind",
+        "speed",
+        leads=[12],
+        spot_ids=["spot0001"],
+        valid_from=valid_from,
+        catalog="warehouse",
+    )
+    spot_id, lead_hours, count, bias, mae, rmse = relation.fetchone()
+    assert (spot_id, lead_hours, count) == ("spot0001", 12.0, 3)
+    # The run 12 hours ahead was 1 knot over, then 1 under the last one
+    assert (bias, mae) == (0.0, 0.667)
+    with pytest.raises(ValueError, match="gust"):
+        forecast_skill(con, "wind", "gust", catalog="warehouse")
+
+
+def test_asof_command_attaches_quoted_paths(tmp_path, con):
+    con.execute("DETACH warehouse")
+    path = tmp_path / "o'neill"
+    path.mkdir()
+    (tmp_path / "surf.duckdb").rename(path / "surf.duckdb")
+
+    result = CliRunner().invoke(
+        app,
+        ["asof", "-t", "wind", "--duckdb", str(path / "surf.duckdb")]
+        + ["-s", "spot'0002", "--issued", str(first_run + hour)]
+        + ["--valid-from", str(valid_from), "-c", "spot_id,speed"],
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output.count("spot'0002") == 3
@@ -0,0 +1,106 @@
+import sys
+import threading
+
+import duckdb
+import pytest
+from stub_server import make_payload
+
+from duckdive import engine
+from duckdive.client import SurflineClient
+
+pytest.importorskip("pyarrow")
+
+from duckdive.batches import BatchLoader, import_pyarrow  # noqa: E402
+
+spot_ids = [f"spot{i:04d}" for i in range(6)]
+
+
+def body(forecast_type):
+    return make_payload(forecast_type, days=1).decode()
+
+
+def fetched(api, forecast_types, **options):
+    with SurflineClient(transport="requests") as client:
+        con = engine.fetch_report(
+            spot_ids,
+            forecast_types,
+            days=1,
+            client=client,
+            base_url=api.base_url,
+            **options,
+        )
+        return {
+            table: (
+                con.execute(f'DESCRIBE "{table}"').fetchall(),
+                sorted(con.execute(f'SELECT * FROM "{table}"').fetchall()),
+            )
+            for table in forecast_types
+        }
+
+
+@pytest.mark.parametrize("validate", ["none", "full"])
+def test_batches_load_the_same_tables(api, validate):
+    forecast_types = ["wind", "wave", "tides", "conditions"]
+    rows = fetched(api, forecast_types, validate=validate)
+    assert fetched(api, forecast_types, validate=validate, batch_size=50) == rows
+
+
+def test_rows_are_appended_once_a_batch_is_full():
+    con = duckdb.connect()
+    with BatchLoader(con, batch_size=48) as loader:
+        loader.add("wind", body("wind"), "wind", tags={"spot_id": "a"})
+        assert loader.created == []
+        loader.add("wind", body("wind"), "wind", tags={"spot_id": "b"})
+        assert con.execute("SELECT count(*) FROM wind").fetchone() == (48,)
+        loader.add("wind", body("wind"), "wind", tags={"spot_id": "c"}, skip=[0])
+    # The rest is appended on leaving the block
+    assert con.execute("SELECT count(*) FROM wind").fetchone() == (48 + 23,)
+
+
+def test_failed_loads_drop_the_partial_batch():
+    con = duckdb.connect()
+    with pytest.raises(RuntimeError):
+        with BatchLoader(con, batch_size=30) as loader:
+            loader.add("wind", body("wind"), "wind")
+            loader.add("wind", body("wind"), "wind")
+            raise RuntimeError("fetch failed")
+    # The first full batch was appended, the partial one was not
+    assert con.execute("SELECT count(*) FROM wind").fetchone() == (48,)
+
+
+def test_fetches_in_flight_are_capped(api, monkeypatch):
+    lock = threading.Lock()
+    waiting = peak = 0
+    fetch_job = engine.fetch_job
+
+    def counted(*args, **kwargs):
+        nonlocal waiting, peak
+        with lock:
+            waiting += 1
+            peak = max(peak, waiting)
+        return fetch_job(*args, **kwargs)
+
+    def loaded(result):
+        nonlocal waiting
+        with lock:
+            waiting -= 1
+
+    monkeypatch.setattr(engine, "fetch_job", counted)
+    with SurflineClient(transport="requests") as client:
+        engine.fetch_report(
+            spot_ids * 4,
+            ["wind"],
+            days=1,
+            max_workers=2,
+            client=client,
+            base_url=api.base_url,
+            on_result=loaded,
+        )
+    # Twice max_workers, plus one: a replacement is submitted before a result is loaded
+    assert 0 < peak <= 2 * 2 + 1
+
+
+def test_missing_pyarrow_is_reported(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match=r"duckdive\[arrow\]"):
+        import_pyarrow()
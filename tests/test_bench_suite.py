@@ -0,0 +1,54 @@
+import json
+from argparse import Namespace
+
+import requests
+from bench_suite import compare, run_scenario, scenario_key, stages
+from stub_server import StubServer
+
+from duckdive.api import construct_surfline_api_url
+
+
+def test_fixtures_are_served_in_place_of_synthetic_payloads(tmp_path):
+    body = {"associated": {}, "data": {"wind": [{"timestamp": 1, "speed": 2.0}]}}
+    (tmp_path / "wind.json").write_text(json.dumps(body))
+
+    with StubServer(fixtures=str(tmp_path)) as server:
+        for forecast_type, length in [("wind", 1), ("wave", 72)]:
+            url = construct_surfline_api_url(
+                forecast_type=forecast_type, base_url=server.base_url
+            )
+            data = requests.get(url).json()["data"]
+            assert len(data[forecast_type]) == length
+
+
+def test_scenario_times_every_stage(api):
+    args = Namespace(
+        types=["wind", "tides"], transport="requests", validate="sample", repeat=1
+    )
+    scenario = run_scenario(api.base_url, 2, 1, 1, args)
+
+    assert scenario_key(scenario) == (2, 1, 1)
+    assert set(scenario["types"]) == {"wind", "tides"}
+    for timings in scenario["types"].values():
+        assert set(timings["stages"]) == set(stages)
+        assert timings["end_to_end"] > 0
+        assert timings["query_surfline"] > 0
+
+
+def test_compare_reports_slower_stages(capsys):
+    def report(http, render):
+        timings = {stage: 1.0 for stage in stages}
+        timings.update(http=http, render=render)
+        types = {
+            "wind": {"stages": timings, "end_to_end": 10.0, "query_surfline": 10.0}
+        }
+        return {
+            "started_at": "2024-09-28T06:00:00",
+            "scenarios": [{"spots": 1, "days": 1, "interval_hours": 1, "types": types}],
+        }
+
+    # render doubles but stays below the 0.5 ms noise floor
+    compare(report(http=3.0, render=0.4), report(http=2.0, render=0.2), threshold=0.2)
+    lines = capsys.readouterr().out.splitlines()
+    flagged = [line.split()[5] for line in lines if "->" in line]
+    assert flagged == ["http"]
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from duckdive.api import construct_surfline_api_url
+from duckdive.cache import ResponseCache, normalize_url
+from duckdive.client import SurflineClient
+
+
+@pytest.fixture
+def url(api):
+    return construct_surfline_api_url(
+        spot_id="spot0001", days=3, interval_hours=1, base_url=api.base_url
+    )
+
+
+def fetch(cache, url):
+    with SurflineClient(transport="requests", cache=cache) as client:
+        return client.fetch(url)
+
+
+def test_normalize_url_ignores_param_order():
+    assert normalize_url(
+        "https://x/forecasts/wave?spotId=a&days=3&intervalHours=1"
+    ) == normalize_url("https://x/forecasts/wave?intervalHours=1&days=3&spotId=a")
+
+
+def test_normalize_url_keeps_the_host():
+    assert normalize_url("https://x/forecasts/wave?spotId=a") != normalize_url(
+        "https://y/forecasts/wave?spotId=a"
+    )
+
+
+def test_normalize_url_hashes_the_access_token():
+    key = normalize_url("https://x/forecasts/wave?spotId=a&accessToken=secret")
+    assert "secret" not in key
+    assert key != normalize_url("https://x/forecasts/wave?spotId=a&accessToken=other")
+    assert key != normalize_url("https://x/forecasts/wave?spotId=a")
+    assert key == normalize_url("https://x/forecasts/wave?accessToken=secret&spotId=a")
+
+
+def test_fresh_entry_is_served_without_a_request(tmp_path, api, url):
+    cache = ResponseCache(tmp_path)
+    status, reason, body = fetch(cache, url)
+    assert (status, reason) == (200, "OK")
+
+    status, reason, cached_body = fetch(cache, url)
+    assert (status, reason) == (200, "OK (cached)")
+    assert cached_body == body
+    assert len(api.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_its_etag(tmp_path, api, url):
+    cache = ResponseCache(tmp_path, ttl=0)
+    fetch(cache, url)
+    entry = cache.get(url)
+    assert entry.etag
+
+    status, reason, _ = fetch(cache, url)
+    assert api.requests[-1]["If-None-Match"] == entry.etag
+    assert (status, reason) == (200, "Not Modified (cached)")
+    assert cache.get(url).fetched_at > entry.fetched_at
+
+
+def test_changed_response_replaces_the_entry(tmp_path, api, url):
+    cache = ResponseCache(tmp_path, ttl=0)
+    cache.put(url, "{}", etag='"outdated"')
+
+    status, reason, body = fetch(cache, url)
+    assert api.requests[-1]["If-None-Match"] == '"outdated"'
+    assert (status, reason) == (200, "OK")
+    assert body != "{}"
+    entry = cache.get(url)
+    assert entry.body == body
+    assert entry.etag != '"outdated"'
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10**6)
+    urls = [f"https://x/forecasts/wave?spotId={i}" for i in range(3)]
+    for age, url in enumerate(urls):
+        cache.put(url, "x" * 1000)
+        os.utime(cache.path(url), (1000 + age, 1000 + age))
+    # A hit makes the oldest entry the most recently used
+    cache.get(urls[0])
+
+    cache.max_bytes = 2500
+    cache.evict()
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[2]) is not None
@@ -0,0 +1,138 @@
+import json
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+from stub_server import StubServer, make_payload
+
+from duckdive.api import construct_surfline_api_url
+from duckdive.captures import CaptureStore, copy_captures, replay_history
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report
+from duckdive.errors import CaptureMissingError
+
+spot_ids = ["spot0001", "spot0002"]
+first_run = datetime(2024, 10, 1, 6)
+
+
+def report(base_url, captures, forecast_types=("wind", "tides")):
+    results = []
+    client = SurflineClient(transport="requests", capture=captures)
+    con = fetch_report(
+        spot_ids,
+        list(forecast_types),
+        client=client,
+        base_url=base_url,
+        on_result=results.append,
+    )
+    return con, results
+
+
+def rows(con, table):
+    return con.execute(f"FROM {table} ORDER BY ALL").fetchall()
+
+
+def wind_url(spot_id="spot0001", access_token=None):
+    return construct_surfline_api_url(
+        spot_id=spot_id, forecast_type="wind", access_token=access_token
+    )
+
+
+def test_replayed_report_matches_the_recorded_one(tmp_path):
+    path = tmp_path / "captures.duckdb"
+    with StubServer() as api, CaptureStore(path) as captures:
+        base_url = api.base_url
+        recorded, _ = report(base_url, captures)
+
+    # The stand-in API is gone: every response has to come from the store
+    with CaptureStore(path, replay=True) as captures:
+        replayed, results = report(base_url, captures)
+        assert [result.error for result in results] == [None] * 4
+        for table in ("wind", "tides"):
+            assert rows(replayed, table) == rows(recorded, table)
+
+
+def test_replaying_an_uncaptured_url_fails(tmp_path):
+    path = tmp_path / "captures.duckdb"
+    with StubServer() as api:
+        with CaptureStore(path) as captures:
+            report(api.base_url, captures, ["wind"])
+
+        with CaptureStore(path, replay=True) as captures:
+            _, results = report(api.base_url, captures, ["wave"])
+            with SurflineClient(transport="requests", capture=captures) as client:
+                with pytest.raises(CaptureMissingError):
+                    client.request(f"{api.base_url}/wind?spotId=spot9999")
+
+    assert {result.error_type for result in results} == {"CaptureMissingError"}
+
+
+def test_replay_needs_an_existing_store(tmp_path):
+    with pytest.raises(ValueError, match="No capture store"):
+        CaptureStore(tmp_path / "missing.duckdb", replay=True)
+
+
+def test_captures_are_keyed_without_the_access_token(tmp_path):
+    with CaptureStore(tmp_path / "captures.duckdb") as captures:
+        captures.record(wind_url(access_token="secret"), "{}")
+        assert captures.get(wind_url()).body == "{}"
+        assert captures.get(wind_url(access_token="other")).body == "{}"
+        assert captures.get(wind_url("spot0002")) is None
+
+
+def test_captures_are_copied_from_quoted_paths(tmp_path):
+    directory = tmp_path / "o'shards"
+    directory.mkdir()
+    with CaptureStore(directory / "shard0.duckdb") as captures:
+        captures.record(wind_url(), "{}")
+    duckdb.connect(str(directory / "shard1.duckdb")).close()
+
+    path = tmp_path / "captures.duckdb"
+    sources = [directory / "shard0.duckdb", directory / "shard1.duckdb"]
+    assert copy_captures(path, sources) == 1
+    with CaptureStore(path, replay=True) as captures:
+        assert captures.get(wind_url()).body == "{}"
+
+
+def test_replay_as_of_serves_the_capture_of_that_time(tmp_path):
+    path = tmp_path / "captures.duckdb"
+    for run, body in enumerate(['{"run": 0}', '{"run": 1}']):
+        fetched_at = first_run + timedelta(hours=run)
+        with CaptureStore(path, recorded_at=fetched_at) as captures:
+            captures.record(wind_url(), body, fetched_at.timestamp())
+
+    with CaptureStore(path, replay=True) as captures:
+        assert captures.get(wind_url()).body == '{"run": 1}'
+        assert captures.runs() == [first_run, first_run + timedelta(hours=1)]
+    # Captures fetched at or before as_of count, whenever they were recorded
+    for as_of in ("2024-10-01 06:30", first_run):
+        with CaptureStore(path, replay=True, as_of=as_of) as captures:
+            assert captures.get(wind_url()).body == '{"run": 0}'
+    with CaptureStore(path, replay=True, as_of="2024-10-01 05:00") as captures:
+        assert captures.get(wind_url()) is None
+
+
+@pytest.mark.parametrize("batch_size", [None, 1000])
+def test_replay_history_rebuilds_the_warehouse_run_by_run(tmp_path, batch_size):
+    if batch_size:
+        pytest.importorskip("pyarrow")
+    body = json.loads(make_payload("wind", days=1))
+    path = tmp_path / "captures.duckdb"
+    for run in range(3):
+        # The forecast for the first hour changes in the last run
+        body["data"]["wind"][0]["speed"] = 5.0 + (run == 2)
+        with CaptureStore(path, recorded_at=first_run + timedelta(hours=run)) as store:
+            for spot_id in spot_ids:
+                store.record(wind_url(spot_id), json.dumps(body))
+
+    database = tmp_path / "surf.duckdb"
+    with CaptureStore(path, replay=True) as captures:
+        runs = replay_history(captures, database, batch_size=batch_size)
+
+    assert [run.captures for run in runs] == [2, 2, 2]
+    assert [run.inserted for run in runs] == [{"wind": 48}, {"wind": 0}, {"wind": 2}]
+    with duckdb.connect(str(database), read_only=True) as con:
+        fetched = con.execute(
+            "SELECT DISTINCT fetched_at FROM wind ORDER BY 1"
+        ).fetchall()
+    assert fetched == [(first_run,), (first_run + timedelta(hours=2),)]
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import pytest
+
+from duckdive.api import construct_surfline_api_url
+from duckdive.client import SurflineClient
+
+
+def url(api, spot_id="spot0001", forecast_type="wind"):
+    return construct_surfline_api_url(
+        spot_id=spot_id, forecast_type=forecast_type, base_url=api.base_url
+    )
+
+
+def test_query_stores_the_records_in_a_table(api):
+    with SurflineClient(transport="requests") as client:
+        assert client.query(url(api), table="wind") == "wind"
+        assert client.con.execute("SELECT count(*) FROM wind").fetchone() == (72,)
+
+
+def test_failed_requests_return_their_status(api):
+    with SurflineClient(transport="requests") as client:
+        status, _, data = client.fetch(url(api, "missing"))
+        assert (status, data) == (404, None)
+        with pytest.raises(RuntimeError, match="status 404"):
+            client.query(url(api, "missing"))
+
+
+def test_threads_share_one_connection(api):
+    forecast_types = ["wind", "tides", "wave", "rating"]
+    with SurflineClient(transport="requests") as client:
+        with ThreadPoolExecutor(4) as executor:
+            list(
+                executor.map(
+                    lambda forecast_type: client.query(
+                        url(api, forecast_type=forecast_type), table=forecast_type
+                    ),
+                    forecast_types,
+                )
+            )
+        tables = {row[0] for row in client.con.execute("SHOW TABLES").fetchall()}
+    assert tables == set(forecast_types)
+
+
+def test_close_leaves_a_passed_in_connection_open(api):
+    con = duckdb.connect()
+    with SurflineClient(transport="requests", con=con) as client:
+        client.query(url(api), table="wind")
+    assert con.execute("SELECT count(*) FROM wind").fetchone() == (72,)
+
+
+def test_release_hands_the_connection_over(api):
+    client = SurflineClient(transport="requests")
+    client.query(url(api), table="wind")
+    con = client.release()
+
+    client.close()
+    assert con.execute("SELECT count(*) FROM wind").fetchone() == (72,)
+    con.close()
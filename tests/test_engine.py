@@ -0,0 +1,93 @@
+from datetime import datetime, time
+from functools import partial
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app, engine
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report, report_query
+
+spot_ids = ["spot0001", "spot0002"]
+
+
+@pytest.fixture
+def client():
+    with SurflineClient(transport="requests") as client:
+        yield client
+
+
+def test_fetch_report_lands_one_table_per_type(api, client):
+    con = fetch_report(
+        spot_ids, ["wind", "tides"], days=1, client=client, base_url=api.base_url
+    )
+
+    assert len(api.requests) == 4
+    assert con.execute(
+        "SELECT spot_id, forecast_type, count(*) FROM wind GROUP BY ALL ORDER BY ALL"
+    ).fetchall() == [(spot_id, "wind", 24) for spot_id in spot_ids]
+    assert con.execute(
+        "SELECT count(DISTINCT spot_id), min(forecast_type) FROM tides"
+    ).fetchone() == (2, "tides")
+
+
+def test_failed_fetches_are_reported_not_raised(api, client):
+    results = []
+    con = fetch_report(
+        ["spot0001", "missing"],
+        ["wind"],
+        client=client,
+        base_url=api.base_url,
+        on_result=results.append,
+    )
+
+    errors = {result.spot_id: result.error for result in results}
+    assert errors["spot0001"] is None
+    assert "status 404" in errors["missing"]
+    assert con.execute("SELECT DISTINCT spot_id FROM wind").fetchall() == [
+        ("spot0001",)
+    ]
+
+
+def test_invalid_parameters_fail_before_any_request(api, client):
+    with pytest.raises(ValueError):
+        fetch_report(spot_ids, ["wind"], days=30, client=client, base_url=api.base_url)
+    assert api.requests == []
+
+
+def test_report_query_simplifies_and_keeps_todays_daylight_hours():
+    midnight = int(datetime.combine(datetime.now().date(), time()).timestamp())
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE wind AS SELECT 'spot0001' AS spot_id, 'wind' AS forecast_type,"
+        " $midnight + i * 3600 AS timestamp, 5.0 AS speed, 8.0 AS gust,"
+        " 270.0 AS direction, 'Offshore' AS directionType, 1 AS optimalScore"
+        " FROM range(24) t(i)",
+        {"midnight": midnight},
+    )
+
+    query = report_query(con, "wind")
+    columns = [column for column, *_ in con.execute(query).description]
+    assert columns == ["spot_id", "timestamp", "speed", "gust", "directionType"]
+    hours = [row[1] for row in con.execute(query).fetchall()]
+    assert hours == [midnight + hour * 3600 for hour in range(7, 21)]
+
+    query = report_query(con, "wind", simplify=False, today=False)
+    assert con.execute(f"SELECT count(*) FROM ({query})").fetchone()[0] == 24
+
+
+def test_report_command_saves_one_csv_per_type(tmp_path, api, monkeypatch):
+    monkeypatch.setattr(
+        engine, "fetch_report", partial(fetch_report, base_url=api.base_url)
+    )
+    csv = tmp_path / "report.csv"
+    result = CliRunner().invoke(
+        app,
+        ["report", "-s", "spot0001", "-t", "wind", "-t", "tides", "--no-today"]
+        + ["--transport", "requests", "--csv", str(csv)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "report_wind.csv").read_text().count("\n") == 1 + 3 * 24
+    assert (tmp_path / "report_tides.csv").exists()
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import duckdb
+import pytest
+from stub_server import make_payload
+
+from duckdive.export import export_csv, export_parquet
+from duckdive.ingest import ingest_body
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    body = make_payload("wind", days=2).decode()
+    ingest_body(con, "wind", body)
+    yield con
+    con.close()
+
+
+def archive(con, directory):
+    return con.execute(
+        "SELECT * FROM read_parquet($1, hive_partitioning = true)",
+        [f"{directory}/**/*.parquet"],
+    )
+
+
+def test_records_are_partitioned_by_spot_type_and_date(tmp_path, con):
+    export_parquet(con, "wind", str(tmp_path), "wind", spot_id="spot0001")
+
+    partitions = sorted(
+        str(path.parent.relative_to(tmp_path)) for path in tmp_path.rglob("*.parquet")
+    )
+    assert partitions == [
+        "spot_id=spot0001/forecast_type=wind/forecast_date=2024-09-28",
+        "spot_id=spot0001/forecast_type=wind/forecast_date=2024-09-29",
+    ]
+    assert all(path.name.startswith("data_") for path in tmp_path.rglob("*.parquet"))
+    assert len(archive(con, tmp_path).fetchall()) == 48
+
+
+def test_repeated_exports_add_files_without_rewriting(tmp_path, con):
+    first = datetime(2024, 9, 28, 6)
+    export_parquet(con, "wind", str(tmp_path), "wind", "spot0001", fetched_at=first)
+    files = set(tmp_path.rglob("*.parquet"))
+    export_parquet(con, "wind", str(tmp_path), "wind", "spot0001")
+
+    assert files < set(tmp_path.rglob("*.parquet"))
+    fetches = archive(con, tmp_path).df().groupby("fetched_at").size()
+    assert fetches.tolist() == [48, 48]
+    assert fetches.index[0] == first
+
+
+def test_invalid_compression_is_rejected(tmp_path, con):
+    with pytest.raises(ValueError):
+        export_parquet(con, "wind", str(tmp_path), "wind", compression="zip")
+
+
+def test_csv_paths_are_quoted(tmp_path, con):
+    path = tmp_path / "o'clock.csv"
+    export_csv(con, "wind", str(path))
+    assert len(path.read_text().splitlines()) == 1 + 48
@@ -0,0 +1,63 @@
+import json
+
+import duckdb
+import pytest
+from stub_server import make_payload
+
+from duckdive.errors import RecordValidationError
+from duckdive.ingest import detect_forecast_type, ingest_body, validate_body
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    yield con
+    con.close()
+
+
+def body(forecast_type, days=1):
+    return make_payload(forecast_type, days=days).decode()
+
+
+def test_records_are_loaded_with_model_types(con):
+    assert (
+        ingest_body(con, "wind", body("wind"), tags={"spot_id": "spot0001"}) == "wind"
+    )
+
+    columns = dict(
+        con.execute("SELECT column_name, column_type FROM (DESCRIBE wind)").fetchall()
+    )
+    assert columns["spot_id"] == "VARCHAR"
+    assert columns["timestamp"] == "BIGINT"
+    assert columns["speed"] == "DOUBLE"
+    counts = con.execute("SELECT count(*), count(DISTINCT spot_id) FROM wind")
+    assert counts.fetchone() == (24, 1)
+
+
+def test_later_bodies_are_appended_unless_replaced(con):
+    ingest_body(con, "wave", body("wave"), tags={"spot_id": "a"})
+    ingest_body(con, "wave", body("wave"), tags={"spot_id": "b"})
+    assert con.execute("SELECT count(*) FROM wave").fetchone() == (48,)
+
+    ingest_body(con, "wave", body("wave"), tags={"spot_id": "c"}, replace=True)
+    assert con.execute("SELECT DISTINCT spot_id FROM wave").fetchall() == [("c",)]
+
+
+def test_body_without_records_is_not_loaded(con):
+    empty = json.dumps({"data": {"wind": []}})
+    assert detect_forecast_type(con, empty) is None
+    assert ingest_body(con, "wind", empty) is None
+
+
+@pytest.mark.parametrize("validate", ["full", "sample"])
+def test_invalid_records_are_rejected(con, validate):
+    payload = json.loads(body("wind"))
+    payload["data"]["wind"][-1]["speed"] = "calm"
+    with pytest.raises(RecordValidationError, match="#23 speed"):
+        validate_body(con, json.dumps(payload), "wind", validate)
+    validate_body(con, json.dumps(payload), "wind", "none")
+
+
+def test_unknown_validate_mode_is_rejected(con):
+    with pytest.raises(ValueError):
+        validate_body(con, body("wind"), "wind", "some")
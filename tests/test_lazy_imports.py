@@ -0,0 +1,23 @@
+import pytest
+from bench_import import heavy_imports, import_times, scenarios
+
+import duckdive
+
+
+@pytest.mark.parametrize("scenario", sorted(scenarios))
+def test_startup_skips_heavy_dependencies(scenario):
+    code, allowed, _ = scenarios[scenario]
+    modules = import_times(code)
+    assert any(name == "duckdive" for name, *_ in modules)
+    assert set(heavy_imports(modules)) <= set(allowed)
+
+
+@pytest.mark.parametrize("name", sorted(duckdive.lazy_exports))
+def test_lazy_exports_resolve_to_their_module_attribute(name):
+    module = __import__(f"duckdive.{duckdive.lazy_exports[name]}", fromlist=[name])
+    assert getattr(duckdive, name) is getattr(module, name)
+
+
+def test_unknown_attributes_raise_attribute_error():
+    with pytest.raises(AttributeError, match="not_a_name"):
+        duckdive.not_a_name  # noqa: B018
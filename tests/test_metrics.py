@@ -0,0 +1,87 @@
+import json
+import threading
+from functools import partial
+
+from typer.testing import CliRunner
+
+from duckdive import app, engine, metrics
+from duckdive.engine import fetch_report
+
+
+def test_stages_and_counters_add_up_across_threads():
+    collected = metrics.enable()
+    try:
+
+        def work():
+            for _ in range(100):
+                with metrics.stage("http"):
+                    metrics.count("requests")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        metrics.disable()
+
+    data = collected.to_dict()
+    assert data["stages"]["http"]["calls"] == 400
+    assert data["counters"] == {"requests": 400}
+
+
+def test_nothing_is_collected_while_disabled():
+    @metrics.timed("format")
+    def format_rows():
+        metrics.count("rows")
+        return "formatted"
+
+    assert format_rows() == "formatted"
+    assert metrics.active() is None
+
+
+def test_stages_are_listed_in_pipeline_order():
+    collected = metrics.Metrics()
+    for name in ["render", "custom", "http", "connect"]:
+        with collected.stage(name):
+            pass
+    assert list(collected.to_dict()["stages"]) == [
+        "connect",
+        "http",
+        "render",
+        "custom",
+    ]
+
+
+def test_metrics_json_on_stdout_is_kept_apart_from_the_output(api, monkeypatch):
+    monkeypatch.setattr(
+        engine, "fetch_report", partial(fetch_report, base_url=api.base_url)
+    )
+    result = CliRunner().invoke(
+        app,
+        ["report", "-s", "spot0001", "-t", "wind", "--no-today"]
+        + ["--transport", "requests", "--metrics-json", "-"],
+    )
+
+    assert result.exit_code == 0, result.output
+    data = json.loads(result.stdout)
+    assert data["command"] == "report"
+    assert data["stages"]["http"]["calls"] == 1
+    # The report itself went to stderr
+    assert "spot0001" in result.stderr
+
+
+def test_metrics_json_is_written_to_a_file(tmp_path, api, monkeypatch):
+    monkeypatch.setattr(
+        engine, "fetch_report", partial(fetch_report, base_url=api.base_url)
+    )
+    path = tmp_path / "metrics.json"
+    result = CliRunner().invoke(
+        app,
+        ["report", "-s", "spot0001", "-t", "wind", "--no-today"]
+        + ["--transport", "requests", "--metrics-json", str(path)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "spot0001" in result.stdout
+    assert json.loads(path.read_text())["counters"]["requests"] == 1
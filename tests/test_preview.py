@@ -0,0 +1,75 @@
+from functools import partial
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app, engine
+from duckdive.engine import fetch_report
+from duckdive.util import project_columns, stream_pretty_table
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE wind AS SELECT 1727481600 + i * 3600 AS timestamp,"
+        " i::DOUBLE AS speed, 'Offshore' AS directionType FROM range(1000) t(i)"
+    )
+    yield con
+    con.close()
+
+
+def test_only_the_requested_page_is_shown(con):
+    table = stream_pretty_table(con, "SELECT * FROM wind", limit=20, page=3)
+    assert table.row_count == 20
+    assert table.caption == "Page 3 of 50 (rows 41-60 of 1000)"
+    speeds = list(table.columns[1].cells)
+    assert (speeds[0], speeds[-1]) == ("40.0", "59.0")
+
+
+def test_rows_are_streamed_in_batches_without_a_limit(con):
+    table = stream_pretty_table(con, "SELECT * FROM wind", batch_size=64)
+    assert table.row_count == 1000
+    assert table.caption is None
+    # Every batch is formatted
+    assert list(table.columns[0].cells)[-1] == "2024-11-08 03PM"
+
+
+def test_pages_past_the_end_show_the_headers(con):
+    table = stream_pretty_table(con, "SELECT * FROM wind", limit=20, page=60)
+    assert table.row_count == 0
+    assert [column.header for column in table.columns] == [
+        "timestamp",
+        "speed",
+        "directionType",
+    ]
+    with pytest.raises(ValueError):
+        stream_pretty_table(con, "SELECT * FROM wind", limit=20, page=0)
+
+
+def test_project_columns_keeps_the_given_order(con):
+    query = project_columns(con, "wind", ["speed,timestamp"])
+    assert [column[0] for column in con.execute(query).description] == [
+        "speed",
+        "timestamp",
+    ]
+    assert project_columns(con, "wind") == 'SELECT * FROM "wind"'
+    with pytest.raises(ValueError, match="gust"):
+        project_columns(con, "wind", ["speed", "gust"])
+
+
+def test_report_pages_and_projects_each_table(api, monkeypatch):
+    monkeypatch.setattr(
+        engine, "fetch_report", partial(fetch_report, base_url=api.base_url)
+    )
+    result = CliRunner().invoke(
+        app,
+        ["report", "-s", "spot0001", "-t", "wind", "--no-today", "--no-simplify"]
+        + ["--transport", "requests", "-n", "10", "--page", "2", "-c", "speed"],
+    )
+
+    assert result.exit_code == 0, result.output
+    # The caption wraps under the narrow table
+    assert "Page 2 of 8 (rows 11-20 of 72)" in " ".join(result.output.split())
+    assert "gust" not in result.output
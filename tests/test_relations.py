@@ -0,0 +1,76 @@
+import duckdb
+import pytest
+
+from duckdive.client import SurflineClient
+from duckdive.relations import fetch
+
+
+@pytest.fixture
+def options(api):
+    return {"days": 1, "transport": "requests", "base_url": api.base_url}
+
+
+def test_one_lazy_relation_per_fetched_type(options):
+    relations = fetch(["spot0001", "spot0002"], ["wind", "tides"], **options)
+
+    assert set(relations) == {"wind", "tides"}
+    assert isinstance(relations["wind"], duckdb.DuckDBPyRelation)
+    assert relations["wind"].count("*").fetchone() == (2 * 24,)
+    counts = relations["wind"].aggregate("spot_id, count(*)", "spot_id").order("1")
+    assert counts.fetchall() == [("spot0001", 24), ("spot0002", 24)]
+
+
+def test_columns_and_filters_are_applied(options):
+    relations = fetch(
+        "spot0001",
+        ["wind", "tides"],
+        columns=["timestamp", "speed"],
+        where={"wind": "speed > 5"},
+        **options,
+    )
+
+    assert relations["wind"].columns == ["spot_id", "timestamp", "speed"]
+    assert relations["wind"].min("speed").fetchone()[0] > 5
+    # tides has no speed column and no filter
+    assert relations["tides"].columns == ["spot_id", "timestamp"]
+    assert relations["tides"].count("*").fetchone()[0] > 24
+
+
+def test_types_without_data_are_left_out(options):
+    errors = []
+    relations = fetch(
+        "missing", ["wind"], on_result=lambda r: errors.append(r.error), **options
+    )
+    assert relations == {}
+    assert "status 404" in errors[0]
+
+
+@pytest.fixture
+def released(monkeypatch):
+    """
+    Clients whose release() was called.
+    """
+    released = []
+    release = SurflineClient.release
+
+    def record(client):
+        released.append(client)
+        return release(client)
+
+    monkeypatch.setattr(SurflineClient, "release", record)
+    return released
+
+
+def test_owned_client_is_released_and_relations_stay_usable(options, released):
+    relations = fetch("spot0001", ["wind"], **options)
+
+    assert len(released) == 1
+    assert relations["wind"].count("*").fetchone() == (24,)
+
+
+def test_given_client_is_left_open(options, released):
+    options.pop("transport")
+    with SurflineClient(transport="requests") as client:
+        relations = fetch("spot0001", ["wind"], client=client, **options)
+        assert released == []
+        assert relations["wind"].count("*").fetchone() == (24,)
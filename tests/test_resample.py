@@ -0,0 +1,103 @@
+from functools import partial
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app, engine
+from duckdive.client import SurflineClient
+from duckdive.resample import hourly_table, resample_tables
+
+spot_ids = ["spot0001", "spot0002"]
+
+
+def scalar(con, query: str):
+    return con.execute(query).fetchone()[0]
+
+
+@pytest.fixture
+def client():
+    with SurflineClient(transport="requests") as client:
+        yield client
+
+
+@pytest.fixture
+def report(api, monkeypatch):
+    """
+    Run `duckdive report` against the stand-in API and return its output.
+    """
+    monkeypatch.setattr(
+        engine, "fetch_report", partial(engine.fetch_report, base_url=api.base_url)
+    )
+
+    def run(*args):
+        result = CliRunner().invoke(
+            app,
+            ["report", "--transport", "requests", "--no-cache"]
+            + [option for spot_id in spot_ids for option in ("-s", spot_id)]
+            + list(args),
+        )
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    return run
+
+
+def test_resampled_report_keeps_the_fetched_records(api, client):
+    con = engine.fetch_report(
+        spot_ids,
+        ["wind", "conditions"],
+        interval_hours=3,
+        client=client,
+        base_url=api.base_url,
+        resample=True,
+    )
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    assert hourly_table("wind") in tables
+    # Daily types are never resampled
+    assert hourly_table("conditions") not in tables
+
+    assert scalar(con, "SELECT count(*) FROM wind_hourly") == 2 * 3 * 24
+    assert scalar(con, "SELECT count(*) FROM wind") == 2 * 3 * 8
+    assert scalar(con, "SELECT count(*) FROM wind WHERE timestamp % 10800 <> 0") == 0
+    # Buckets keep the strongest gust of the hours they summarize
+    assert scalar(con, "SELECT max(gust) FROM wind") == scalar(
+        con, "SELECT max(gust) FROM wind_hourly"
+    )
+
+
+def test_hourly_reports_are_not_resampled(api, client):
+    con = engine.fetch_report(
+        spot_ids, ["wind"], client=client, base_url=api.base_url, resample=True
+    )
+    assert hourly_table("wind") not in {
+        row[0] for row in con.execute("SHOW TABLES").fetchall()
+    }
+
+    assert resample_tables(con, ["wind", "sunlight"], 6) == ["wind"]
+    assert scalar(con, "SELECT count(*) FROM wind") == 2 * 3 * 4
+    assert scalar(con, "SELECT count(*) FROM wind_hourly") == 2 * 3 * 24
+
+
+@pytest.mark.parametrize("layout", ["versions", "ranges"])
+def test_reports_at_any_interval_store_the_same_records(tmp_path, report, layout):
+    database = str(tmp_path / "surf.duckdb")
+    store = ["-t", "wind", "--duckdb", database, "--layout", layout]
+
+    assert "144 new or changed wind rows saved" in report("-i", "3", *store)
+    for interval in ("1", "3", "6", "3"):
+        assert "0 new or changed wind rows saved" in report("-i", interval, *store)
+
+    with duckdb.connect(database, read_only=True) as con:
+        assert scalar(con, "SELECT count(*) FROM wind") == 144
+
+
+def test_resampled_report_archives_the_fetched_records(tmp_path, report):
+    archive = tmp_path / "archive"
+    report("-i", "3", "-t", "wind", "--parquet", str(archive))
+
+    rows = duckdb.execute(
+        "SELECT count(*) FROM read_parquet($files)",
+        {"files": f"{archive}/**/*.parquet"},
+    ).fetchone()
+    assert rows == (2 * 3 * 24,)
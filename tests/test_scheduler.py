@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+from stub_server import StubServer, throttling_handler
+
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report
+from duckdive.errors import ClientError, ServerError, parse_retry_after
+from duckdive.scheduler import AdaptiveConcurrency, RequestScheduler, backoff_delay
+
+ok = (200, "OK", "{}", {})
+
+
+def responses(*answers):
+    """
+    Return a send function answering with each (status, reason, body, headers) in turn.
+    """
+    answers = iter(answers)
+    return lambda: next(answers)
+
+
+def throttled(retry_after: str = "0.3"):
+    return 429, "Too Many Requests", None, {"Retry-After": retry_after}
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_delay_waits_at_least_retry_after():
+    for attempt in range(5):
+        assert 0 <= backoff_delay(attempt, base_delay=0.5, max_delay=4) <= 4
+        assert backoff_delay(attempt, max_delay=1, retry_after=3) == 3
+
+
+def test_throttled_request_is_retried_after_retry_after():
+    scheduler = RequestScheduler(rate=None, base_delay=0.01)
+    (status, _, body, _), outcome = scheduler.call("u", responses(throttled(), ok))
+
+    assert (status, body) == (200, "{}")
+    assert outcome.ok
+    assert outcome.attempts == 2
+    assert outcome.throttled == 1
+    assert outcome.waited >= 0.3
+    assert scheduler.stats["throttled"] == 1
+
+
+def test_retry_after_pauses_every_request_of_the_scheduler():
+    scheduler = RequestScheduler(rate=None, base_delay=0.01)
+    started = threading.Event()
+    outcomes = []
+
+    def first():
+        started.set()
+        return throttled("0.5")
+
+    def second():
+        started.wait()
+        time.sleep(0.1)
+        outcomes.append(scheduler.call("b", responses(ok))[1])
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    scheduler.call("a", responses(first(), ok))
+    thread.join()
+
+    assert outcomes[0].attempts == 1
+    assert outcomes[0].waited >= 0.3
+
+
+def test_server_errors_are_retried_until_retries_run_out():
+    scheduler = RequestScheduler(rate=None, max_retries=2, base_delay=0.01)
+    failure = (503, "Service Unavailable", None, {})
+    with pytest.raises(ServerError) as raised:
+        scheduler.call("u", responses(failure, failure, failure))
+
+    assert raised.value.outcome.attempts == 3
+    assert raised.value.outcome.error == "ServerError"
+    assert scheduler.stats["failed"] == 1
+
+
+def test_client_errors_are_not_retried():
+    scheduler = RequestScheduler(rate=None)
+    with pytest.raises(ClientError) as raised:
+        scheduler.call("u", responses((404, "Not Found", None, {}), ok))
+    assert raised.value.outcome.attempts == 1
+
+
+def test_concurrency_is_halved_once_per_cooldown_and_grows_additively():
+    concurrency = AdaptiveConcurrency(initial=8, maximum=16, cooldown=60)
+    for _ in range(3):
+        concurrency.acquire()
+        concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+
+    for _ in range(4):
+        concurrency.acquire()
+        concurrency.release()
+    assert 4.9 < concurrency.limit < 5
+
+    concurrency = AdaptiveConcurrency(initial=1, minimum=1, cooldown=0)
+    concurrency.acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 1
+
+
+def test_report_against_a_throttling_server_succeeds():
+    handler = throttling_handler(rate=20, burst=2, retry_after=0.1)
+    scheduler = RequestScheduler(rate=None, max_retries=10, base_delay=0.01)
+    results = []
+    client = SurflineClient(transport="requests", scheduler=scheduler)
+    with StubServer(handler=handler) as api, client:
+        con = fetch_report(
+            [f"spot{i:04d}" for i in range(10)],
+            ["wind"],
+            max_workers=4,
+            client=client,
+            base_url=api.base_url,
+            on_result=results.append,
+        )
+        spots = con.execute("SELECT count(DISTINCT spot_id) FROM wind").fetchone()[0]
+
+    assert [result.error for result in results] == [None] * 10
+    assert spots == 10
+    assert handler.stats["throttled"] > 0
+    assert scheduler.stats["throttled"] == handler.stats["throttled"]
@@ -0,0 +1,130 @@
+import json
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import duckdb
+import pytest
+
+from duckdive.serve import ForecastServer, ReadPool
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+first_run = datetime(2024, 9, 30, 6)
+first_valid = 1727740800
+valid_from = datetime.fromtimestamp(first_valid)
+forecast = f"/forecasts/wind?from={valid_from:%Y-%m-%dT%H:%M}&spot_id=spot0001"
+
+# Stores a second run of speeds while the server holds the warehouse open
+writer = """
+import sys
+from datetime import datetime
+
+import duckdb
+
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+con = duckdb.connect()
+attach_warehouse(con, sys.argv[1], timeout=20)
+con.execute(
+    "CREATE TABLE wind AS SELECT 'spot0001' AS spot_id,"
+    " 1727740800 + i * 3600 AS timestamp, 9.0 AS speed FROM range(3) t(i)"
+)
+upsert_forecast(con, "wind", "wind", fetched_at=datetime(2024, 9, 30, 12))
+con.close()
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    # Quotes in paths are escaped in the ATTACH of every read connection
+    directory = tmp_path / "o'serve"
+    directory.mkdir()
+    path = str(directory / "surf.duckdb")
+    with duckdb.connect() as con:
+        attach_warehouse(con, path)
+        con.execute(
+            "CREATE TABLE wind AS SELECT 'spot000' || (i % 2 + 1) AS spot_id,"
+            " 1727740800 + (i // 2) * 3600 AS timestamp, 5.0 AS speed"
+            " FROM range(6) t(i)"
+        )
+        upsert_forecast(con, "wind", "wind", fetched_at=first_run)
+    return path
+
+
+@pytest.fixture
+def server(database):
+    server = ForecastServer(database, port=0, release_after=None, wait=20)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    try:
+        with urllib.request.urlopen(server.url + path) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_index_lists_the_tables(server):
+    status, _, body = get(server, "/")
+    assert status == 200
+    assert json.loads(body)["tables"]["wind"] == {
+        "rows": 6,
+        "spots": 2,
+        "latest": str(first_run),
+    }
+
+
+def test_forecasts_are_served_and_cached(server):
+    status, headers, body = get(server, forecast + "&columns=spot_id,speed")
+    assert (status, headers["X-Cache"]) == (200, "miss")
+    assert json.loads(body) == [{"spot_id": "spot0001", "speed": 5.0}] * 3
+
+    _, headers, cached = get(server, forecast + "&columns=spot_id,speed")
+    assert (headers["X-Cache"], cached) == ("hit", body)
+
+    _, headers, csv = get(server, forecast + "&columns=speed&limit=1&format=csv")
+    assert headers["Content-Type"] == "text/csv"
+    assert csv.decode().split() == ["speed", "5.0"]
+
+
+@pytest.mark.parametrize(
+    "path, status",
+    [
+        (forecast + "&colour=red", 400),
+        (forecast + "&limit=-1", 400),
+        (forecast + "&columns=gust", 400),
+        (forecast + "&format=xml", 400),
+        ("/forecasts/swells", 404),
+        ("/spots", 404),
+    ],
+)
+def test_invalid_requests_are_rejected(server, path, status):
+    code, _, body = get(server, path)
+    assert code == status
+    assert "error" in json.loads(body)
+
+
+def test_writers_get_the_file_in_between_reads(server, database):
+    _, _, body = get(server, forecast + "&columns=speed")
+    assert json.loads(body) == [{"speed": 5.0}] * 3
+
+    # The writer leaves its intent next to the file and the idle pool lets go
+    subprocess.run([sys.executable, "-c", writer, database], check=True, timeout=60)
+
+    _, headers, body = get(server, forecast + "&columns=speed")
+    assert headers["X-Cache"] == "miss"
+    assert json.loads(body) == [{"speed": 9.0}] * 3
+    assert json.loads(get(server, "/health")[2])["connections_opened"] == 2
+
+
+def test_pools_need_a_connection(database):
+    with pytest.raises(ValueError, match="at least 1"):
+        ReadPool(database, size=0)
@@ -0,0 +1,94 @@
+import duckdb
+import pytest
+
+from duckdive.shards import ShardResult, ingest_sharded, merge_shards, split_spots
+
+spot_ids = ["spot0001", "spot0002", "spot0003"]
+
+
+@pytest.fixture
+def options(api):
+    return {"transport": "requests", "base_url": api.base_url, "cache": False}
+
+
+def count(database, table: str) -> int:
+    with duckdb.connect(str(database), read_only=True) as con:
+        return con.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+
+
+def test_spots_are_dealt_round_robin():
+    assert split_spots(spot_ids, 2) == [["spot0001", "spot0003"], ["spot0002"]]
+    assert split_spots(spot_ids[:1], 4) == [["spot0001"]]
+
+
+def test_shards_are_merged_into_the_warehouse(tmp_path, options):
+    # Quotes in paths are escaped in the ATTACH of every shard
+    directory = tmp_path / "o'shards"
+    database = directory / "surf.duckdb"
+    fetched = []
+
+    result = ingest_sharded(
+        spot_ids,
+        ["wind", "tides"],
+        database=database,
+        shards=2,
+        days=1,
+        on_result=fetched.append,
+        shard_dir=directory,
+        keep_shards=True,
+        **options,
+    )
+
+    assert [shard.error for shard in result.shards] == [None, None]
+    assert len(fetched) == 3 * 2
+    assert result.inserted["wind"] == count(database, "wind") == 3 * 24
+    assert count(directory / "shard0.duckdb", "wind") == 2 * 24
+
+    # Merging the same forecasts again writes nothing new
+    again = ingest_sharded(
+        spot_ids, ["wind"], database=database, shards=2, days=1, **options
+    )
+    assert again.inserted == {"wind": 0}
+    # Temporary shard directories sit next to the warehouse and are removed
+    assert not list(directory.glob("duckdive-shards-*"))
+
+
+def test_resampled_ingests_store_the_fetched_records(tmp_path, options):
+    database = tmp_path / "surf.duckdb"
+    result = ingest_sharded(
+        ["spot0001", "missing"],
+        ["wind"],
+        database=database,
+        shards=1,
+        days=1,
+        interval_hours=3,
+        resample=True,
+        **options,
+    )
+    assert count(database, "wind") == 24
+    # The failed spot is counted, the shard itself succeeded
+    assert (result.shards[0].errors, result.shards[0].error) == (1, None)
+
+
+def test_failed_shards_are_left_out_of_the_merge(tmp_path):
+    paths = []
+    for index, speed in enumerate([5.0, 6.0]):
+        path = tmp_path / f"shard{index}.duckdb"
+        with duckdb.connect(str(path)) as con:
+            con.execute(
+                "CREATE TABLE wind AS SELECT 'spot000' || $index AS spot_id,"
+                " 1727740800 AS timestamp, $speed AS speed",
+                {"index": index, "speed": speed},
+            )
+        paths.append(str(path))
+    shards = [
+        ShardResult(0, paths[0], ["spot0000"], rows={"wind": 1}),
+        ShardResult(1, paths[1], ["spot0001"], rows={"wind": 1}, error="boom"),
+    ]
+
+    database = tmp_path / "surf.duckdb"
+    assert merge_shards(database, shards, ["wind", "tides"]) == {"wind": 1}
+    with duckdb.connect(str(database), read_only=True) as con:
+        assert con.execute("SELECT spot_id, speed FROM wind").fetchall() == [
+            ("spot0000", 5.0)
+        ]
@@ -0,0 +1,85 @@
+from functools import partial
+from importlib import import_module
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app
+from duckdive.client import SurflineClient
+from duckdive.snapshot import create_snapshot, fetch_snapshot
+
+
+@pytest.fixture
+def options(api):
+    return {"days": 1, "transport": "requests", "base_url": api.base_url}
+
+
+def test_every_type_is_joined_on_one_time_axis(options):
+    relation = fetch_snapshot(["spot0001", "spot0002"], **options)
+
+    assert relation.count("*").fetchone() == (2 * 24,)
+    columns = relation.columns
+    for name in ["wind_speed", "wave_surf_min", "tides_height", "rating_key"]:
+        assert name in columns
+    assert "is_daylight" in columns
+    # Every row gets the day's sunlight and conditions
+    assert relation.filter("sunlight_sunrise IS NULL").count("*").fetchone() == (0,)
+    assert relation.filter("conditions_am_rating IS NULL").count("*").fetchone() == (0,)
+
+
+def test_tides_are_interpolated_between_records():
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE wind AS SELECT 'a' AS spot_id, i * 1800 AS timestamp,"
+        " 5.0 AS speed FROM range(5) t(i)"
+    )
+    con.execute(
+        "CREATE TABLE tides AS SELECT * FROM (VALUES"
+        " ('a', 0, 'LOW', 1.0), ('a', 7200, 'HIGH', 3.0)) t(spot_id, timestamp, type, height)"
+    )
+
+    rows = create_snapshot(con).project("timestamp, tides_height, tides_type")
+    assert rows.fetchall() == [
+        (0, 1.0, "LOW"),
+        (1800, 1.5, "LOW"),
+        (3600, 2.0, "LOW"),
+        (5400, 2.5, "LOW"),
+        (7200, 3.0, "HIGH"),
+    ]
+
+
+def test_nothing_to_join_gives_none():
+    assert create_snapshot(duckdb.connect()) is None
+
+
+def test_owned_client_is_released(options, monkeypatch):
+    released = []
+    release = SurflineClient.release
+    monkeypatch.setattr(
+        SurflineClient,
+        "release",
+        lambda client: released.append(client) or release(client),
+    )
+
+    relation = fetch_snapshot("spot0001", forecast_types=["wind", "tides"], **options)
+    assert len(released) == 1
+    assert relation.count("*").fetchone() == (24,)
+
+
+def test_snapshot_command_shows_each_spot(api, monkeypatch):
+    # duckdive.snapshot is the command, the module has to be imported by name
+    module = import_module("duckdive.snapshot")
+    monkeypatch.setattr(
+        module, "fetch_snapshot", partial(fetch_snapshot, base_url=api.base_url)
+    )
+    # Spot ids are bound as parameters, quotes included
+    result = CliRunner().invoke(
+        app,
+        ["snapshot", "-s", "spot0001", "-s", "spot'0002", "--no-today"]
+        + ["--transport", "requests", "--days", "1", "-n", "3", "-c", "spot_id"],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.output.count("Page 1 of 8") == 2
+    assert "spot'0002" in result.output
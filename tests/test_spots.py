@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from duckdive import app
+from duckdive.spots import (
+    cell_of,
+    cells_within,
+    find_spot_ids,
+    import_spots,
+    nearby_spots,
+    open_registry,
+    parse_coordinate,
+)
+
+spots_csv = """\
+id,name,subregion,latitude,longitude,tz
+hb,Huntington Beach,North Orange County,33.655,-118.003,America/Los_Angeles
+lowers,Lower Trestles,South Orange County,33.382,-117.588,America/Los_Angeles
+uppers,Upper Trestles,South Orange County,33.385,-117.592,America/Los_Angeles
+pipe,Pipeline,O'ahu North Shore,21.665,-158.053,Pacific/Honolulu
+sunset,Sunset,O'ahu North Shore,21.678,-158.041,Pacific/Honolulu
+"""
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "spots.csv"
+    path.write_text(spots_csv)
+    database = tmp_path / "spots.duckdb"
+    con = open_registry(database)
+    assert import_spots(con, path) == 5
+    con.close()
+    return database
+
+
+def test_import_matches_aliases_and_indexes_cells(registry):
+    with open_registry(registry, read_only=True) as con:
+        rows = con.execute(
+            "SELECT spot_id, region, timezone, lat, lon, cell FROM spots ORDER BY spot_id"
+        ).fetchall()
+    assert [row[0] for row in rows] == ["hb", "lowers", "pipe", "sunset", "uppers"]
+    assert rows[2][1:3] == ("O'ahu North Shore", "Pacific/Honolulu")
+    for *_, lat, lon, cell in rows:
+        assert cell == cell_of(lat, lon)
+
+
+def test_name_mappings_and_files_without_ids(tmp_path):
+    con = open_registry(tmp_path / "spots.duckdb")
+    mapping = tmp_path / "duckdive_spots.json"
+    mapping.write_text(json.dumps({"Pipeline": "pipe", "Sunset": "sunset"}))
+    assert import_spots(con, mapping) == 2
+    assert con.execute("SELECT count(*) FROM spots WHERE lat IS NULL").fetchone() == (
+        2,
+    )
+
+    unnamed = tmp_path / "unnamed.csv"
+    unnamed.write_text("name,lat,lon\nSomewhere,1,2\n")
+    with pytest.raises(ValueError, match="No spot id column"):
+        import_spots(con, unnamed)
+    con.close()
+
+
+def test_nearby_spots_are_ordered_and_filtered_by_region(registry):
+    with open_registry(registry) as con:
+        near_trestles = nearby_spots(con, 33.38, -117.59, radius_km=60)
+        assert near_trestles.project("spot_id").fetchall() == [
+            ("lowers",),
+            ("uppers",),
+            ("hb",),
+        ]
+        # Regions are bound as parameters, quotes included
+        north_shore = nearby_spots(
+            con, 21.67, -158.05, radius_km=10, region="O'ahu North Shore", limit=1
+        )
+        assert north_shore.project("spot_id").fetchall() == [("pipe",)]
+        assert nearby_spots(con, 21.67, -158.05, region="Hawaii").fetchall() == []
+
+
+def test_cells_wrap_around_the_antimeridian():
+    cells = cells_within(0, 179.9, 30)
+    assert cell_of(0, -179.9) in cells
+    assert cell_of(0, 179.9) in cells
+    assert cell_of(0, 170) not in cells
+
+
+def test_find_spot_ids_by_region_or_coordinate(registry):
+    assert find_spot_ids("O'ahu North Shore", registry=registry) == ["pipe", "sunset"]
+    assert find_spot_ids(near="33.65,-118.0", radius_km=5, registry=registry) == ["hb"]
+    with pytest.raises(ValueError, match="out of range"):
+        parse_coordinate("95,10")
+
+
+def test_spots_list_command(registry):
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        ["spots", "list", "--ids", "--region", "O'ahu North Shore"]
+        + ["--registry", str(registry)],
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["pipe", "sunset"]
+
+    result = runner.invoke(
+        app,
+        ["spots", "list", "--near", "33.38,-117.59", "--radius-km", "10"]
+        + ["--registry", str(registry)],
+    )
+    assert result.exit_code == 0, result.output
+    assert "uppers" in result.output and "hb" not in result.output
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bench_format import row_at_a_time
+from stub_server import make_records
+
+from duckdive.util import (
+    destructure_column,
+    format_dataframe,
+    format_swells_df,
+    format_timestamp,
+    format_timestamp_column,
+)
+
+
+@pytest.mark.parametrize("forecast_type", ["wind", "wave", "swells", "tides", "rating"])
+def test_format_dataframe_matches_row_at_a_time_formatting(forecast_type):
+    frame = pd.DataFrame(make_records(forecast_type, days=2))
+    pd.testing.assert_frame_equal(
+        format_dataframe(frame.copy()),
+        row_at_a_time(frame.copy()),
+        # Swell values set one cell at a time with df.at always come out as floats
+        check_dtype=forecast_type != "swells",
+    )
+
+
+def test_timestamps_are_formatted_once_per_value_with_gaps_kept():
+    series = pd.Series([1727481600, 1727485200, None, 1727481600])
+    formatted = format_timestamp_column(series, utc_offset=-7)
+    assert formatted[:2].tolist() == [
+        format_timestamp(1727481600, -7),
+        format_timestamp(1727485200, -7),
+    ]
+    assert pd.isna(formatted[2])
+    assert formatted[3] == formatted[0]
+
+
+def test_destructure_column_splits_dicts_into_columns():
+    df = pd.DataFrame({"rating": [{"key": "GOOD", "value": 4}, None]})
+    df = destructure_column(df, "rating", ["key", "value"], "rating")
+    assert list(df.columns) == ["rating_key", "rating_value"]
+    assert df["rating_key"][0] == "GOOD"
+    assert df["rating_value"][0] == 4
+    assert df.iloc[1].isna().all()
+
+
+def test_primary_swell_is_taken_from_lists_and_arrays():
+    df = pd.DataFrame(
+        {
+            "power": [1.0, 2.0, 3.0],
+            "swells": [
+                [{"height": 1.5, "power": 10.0}, {"height": 0.5, "power": 5.0}],
+                # Lists come back from DuckDB as numpy arrays
+                np.array([{"height": 2.5, "power": 20.0}], dtype=object),
+                [],
+            ],
+        }
+    )
+    df = format_swells_df(df)
+    assert "swells" not in df.columns
+    assert df["height"].tolist()[:2] == [1.5, 2.5]
+    assert pd.isna(df["height"][2])
+    # Rows without a swell keep their own power
+    assert df["power"].tolist() == [10.0, 20.0, 3.0]
@@ -0,0 +1,100 @@
+import json
+
+import duckdb
+import pytest
+from stub_server import StubServer, make_payload
+
+from duckdive.client import SurflineClient
+from duckdive.engine import fetch_report
+from duckdive.errors import RecordValidationError
+from duckdive.validation import validate_records
+from duckdive.warehouse import attach_warehouse, save_rejects, upsert_forecast
+
+spot_ids = ["spot0001", "spot0002"]
+
+
+def broken_wind(days: int = 1) -> dict:
+    """
+    Wind response with two invalid records, #1 and #3.
+    """
+    body = json.loads(make_payload("wind", days))
+    records = body["data"]["wind"]
+    records[1]["speed"] = "fast"
+    del records[3]["timestamp"]
+    return body
+
+
+@pytest.fixture
+def broken_api(tmp_path):
+    (tmp_path / "wind.json").write_text(json.dumps(broken_wind()))
+    with StubServer(fixtures=str(tmp_path)) as server:
+        yield server
+
+
+def fetch(api, validate):
+    results = []
+    client = SurflineClient(transport="requests")
+    con = fetch_report(
+        spot_ids,
+        ["wind"],
+        client=client,
+        base_url=api.base_url,
+        validate=validate,
+        on_result=results.append,
+    )
+    return con, results
+
+
+def test_strict_validation_names_every_invalid_record():
+    with pytest.raises(RecordValidationError) as raised:
+        validate_records(json.dumps(broken_wind()), "wind")
+    assert sorted(raised.value.errors) == [1, 3]
+    assert "#1 speed:" in str(raised.value)
+    assert "#3 timestamp:" in str(raised.value)
+
+
+def test_lenient_validation_returns_the_invalid_records():
+    report = validate_records(broken_wind(), "wind", lenient=True)
+    assert report.records == 24
+    assert report.valid == 22
+    assert [reject.index for reject in report.rejects] == [1, 3]
+    assert json.loads(report.rejects[0].record)["speed"] == "fast"
+
+
+def test_lenient_validation_still_rejects_bodies_that_are_not_responses():
+    with pytest.raises(RecordValidationError):
+        validate_records({"data": {"wind": "none"}}, "wind", lenient=True)
+
+
+def test_lenient_report_quarantines_rejects_and_loads_the_rest(broken_api):
+    con, results = fetch(broken_api, "lenient")
+
+    assert [result.error for result in results] == [None, None]
+    assert con.execute("SELECT count(*) FROM wind").fetchone()[0] == 2 * 22
+    assert con.execute(
+        "SELECT spot_id, record_index, record->>'speed' FROM rejects"
+        " WHERE record_index = 1 ORDER BY spot_id"
+    ).fetchall() == [(spot_id, 1, "fast") for spot_id in spot_ids]
+
+
+def test_full_validation_fails_the_whole_response(broken_api):
+    con, results = fetch(broken_api, "full")
+
+    assert {result.error_type for result in results} == {"RecordValidationError"}
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    assert "wind" not in tables
+    assert "rejects" not in tables
+
+
+def test_rejects_are_appended_to_the_warehouse(tmp_path, broken_api):
+    database = str(tmp_path / "surf.duckdb")
+    for _ in range(2):
+        con, _ = fetch(broken_api, "lenient")
+        attach_warehouse(con, database)
+        upsert_forecast(con, "wind", source="wind")
+        assert save_rejects(con) == 2 * 2
+        con.close()
+
+    with duckdb.connect(database, read_only=True) as con:
+        assert con.execute("SELECT count(*) FROM wind").fetchone()[0] == 2 * 22
+        assert con.execute("SELECT count(*) FROM rejects").fetchone()[0] == 2 * 4
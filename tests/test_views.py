@@ -0,0 +1,64 @@
+import duckdb
+import pytest
+from stub_server import make_payload
+
+from duckdive.ingest import ingest_body
+from duckdive.views import create_views
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    yield con
+    con.close()
+
+
+def ingest(con, forecast_type, spot_id="spot0001"):
+    body = make_payload(forecast_type, days=1).decode()
+    ingest_body(con, forecast_type, body, tags={"spot_id": spot_id})
+
+
+def test_swell_components_has_a_row_per_swell(con):
+    ingest(con, "swells")
+    create_views(con)
+
+    assert con.execute(
+        "SELECT count(*), min(swell_index), max(swell_index) FROM swell_components"
+    ).fetchone() == (24 * 6, 1, 6)
+    first = con.execute(
+        "SELECT spot_id, height, period FROM swell_components"
+        " WHERE timestamp = 1727481600 AND swell_index = 1"
+    ).fetchone()
+    assert first == ("spot0001", 1.0, 8)
+
+
+def test_conditions_flat_flattens_the_structs(con):
+    ingest(con, "conditions")
+    create_views(con)
+
+    row = con.execute(
+        "SELECT forecaster_name, am_rating, pm_maxHeight FROM conditions_flat"
+    ).fetchall()
+    assert row == [("Stub Forecaster", "FAIR", 3)]
+
+
+def test_views_are_only_created_for_existing_tables(con):
+    ingest(con, "wind")
+    create_views(con)
+    assert con.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE NOT internal"
+    ).fetchone() == (0,)
+
+
+def test_upserts_create_the_views_in_the_warehouse(tmp_path, con):
+    attach_warehouse(con, str(tmp_path / "surf.duckdb"))
+    ingest(con, "wave")
+    upsert_forecast(con, "wave", "wave")
+    con.execute("DETACH warehouse")
+
+    # The views bind to the warehouse tables when the file is opened directly
+    with duckdb.connect(str(tmp_path / "surf.duckdb")) as warehouse:
+        assert warehouse.execute(
+            "SELECT count(DISTINCT timestamp) FROM swell_components"
+        ).fetchone() == (24,)
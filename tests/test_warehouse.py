@@ -0,0 +1,204 @@
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+
+from duckdive import compaction
+from duckdive.compaction import compact_warehouse
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+hour = timedelta(hours=1)
+first_run = datetime(2024, 10, 1, 6)
+
+
+@pytest.fixture
+def con(tmp_path):
+    con = duckdb.connect()
+    attach_warehouse(con, str(tmp_path / "surf.duckdb"))
+    yield con
+    con.close()
+
+
+def fetched(con, speeds):
+    """
+    Stand in for a fetch of the wind forecast of one spot, one speed per hour.
+    """
+    con.execute(
+        "CREATE OR REPLACE TABLE wind (spot_id VARCHAR, timestamp BIGINT, speed DOUBLE)"
+    )
+    con.executemany(
+        "INSERT INTO wind VALUES ('spot0001', ?, ?)",
+        [[1727740800 + i * 3600, speed] for i, speed in enumerate(speeds)],
+    )
+
+
+def rows(con, query):
+    return con.execute(query).fetchall()
+
+
+@pytest.mark.parametrize("layout", ["versions", "ranges"])
+def test_unchanged_forecasts_are_written_once(con, layout):
+    for run in range(3):
+        fetched(con, [5.0, 6.0, 7.0])
+        written = upsert_forecast(
+            con, "wind", "wind", fetched_at=first_run + run * hour, layout=layout
+        )
+        assert written == (3 if run == 0 else 0)
+
+
+def test_changed_records_add_a_version(con):
+    fetched(con, [5.0, 6.0, 7.0])
+    upsert_forecast(con, "wind", "wind", fetched_at=first_run)
+    fetched(con, [5.0, 9.0, 7.0])
+    assert upsert_forecast(con, "wind", "wind", fetched_at=first_run + hour) == 1
+    # Back to a value seen before is still a change from the latest version
+    fetched(con, [5.0, 6.0, 7.0])
+    assert upsert_forecast(con, "wind", "wind", fetched_at=first_run + 2 * hour) == 1
+
+    assert rows(
+        con,
+        "SELECT speed FROM warehouse.wind WHERE timestamp = 1727744400 ORDER BY fetched_at",
+    ) == [(6.0,), (9.0,), (6.0,)]
+
+
+@pytest.mark.parametrize("layout", ["versions", "ranges"])
+def test_duplicate_timestamps_keep_the_same_record_on_every_run(con, layout):
+    con.execute(
+        "CREATE TABLE tides (spot_id VARCHAR, timestamp BIGINT, type VARCHAR, height DOUBLE)"
+    )
+    # An extreme at the same time as an hourly point
+    con.execute(
+        "INSERT INTO tides VALUES ('spot0001', 1727740800, 'NORMAL', 1.2),"
+        " ('spot0001', 1727740800, 'HIGH', 1.3), ('spot0001', 1727744400, 'NORMAL', 1.1)"
+    )
+    assert (
+        upsert_forecast(con, "tides", "tides", fetched_at=first_run, layout=layout) == 2
+    )
+    kept = rows(con, "SELECT type FROM warehouse.tides WHERE timestamp = 1727740800")
+
+    for run in range(1, 4):
+        # The same batch in another row order
+        con.execute("CREATE OR REPLACE TABLE tides AS FROM tides ORDER BY random()")
+        assert (
+            upsert_forecast(con, "tides", "tides", fetched_at=first_run + run * hour)
+            == 0
+        )
+    assert (
+        rows(con, "SELECT type FROM warehouse.tides WHERE timestamp = 1727740800")
+        == kept
+    )
+
+
+def test_new_columns_are_added_to_the_table(con):
+    fetched(con, [5.0])
+    upsert_forecast(con, "wind", "wind", fetched_at=first_run)
+    con.execute("ALTER TABLE wind ADD COLUMN gust DOUBLE DEFAULT 8.0")
+    assert upsert_forecast(con, "wind", "wind", fetched_at=first_run + hour) == 1
+
+    assert rows(con, "SELECT speed, gust FROM warehouse.wind ORDER BY fetched_at") == [
+        (5.0, None),
+        (5.0, 8.0),
+    ]
+
+
+def test_ranges_layout_closes_the_replaced_version(con):
+    fetched(con, [5.0, 6.0, 7.0])
+    upsert_forecast(con, "wind", "wind", fetched_at=first_run, layout="ranges")
+    fetched(con, [5.0, 9.0, 7.0])
+    assert upsert_forecast(con, "wind", "wind", fetched_at=first_run + hour) == 1
+
+    assert rows(
+        con,
+        "SELECT speed, valid_from, valid_to FROM warehouse.wind"
+        " WHERE timestamp = 1727744400 ORDER BY valid_from",
+    ) == [(6.0, first_run, first_run + hour), (9.0, first_run + hour, None)]
+    assert rows(con, "SELECT count(*) FROM warehouse.wind WHERE valid_to IS NULL") == [
+        (3,)
+    ]
+
+
+def test_ranges_layout_ignores_replayed_older_batches(con):
+    fetched(con, [5.0, 9.0, 7.0])
+    upsert_forecast(con, "wind", "wind", fetched_at=first_run + hour, layout="ranges")
+    # A batch fetched before the current versions, e.g. from a replayed capture
+    fetched(con, [5.0, 6.0, 7.0])
+    assert upsert_forecast(con, "wind", "wind", fetched_at=first_run) == 0
+    assert rows(con, "SELECT DISTINCT speed FROM warehouse.wind ORDER BY 1") == [
+        (5.0,),
+        (7.0,),
+        (9.0,),
+    ]
+
+
+def stored_runs(con, layout):
+    """
+    Store four runs within one hour, each changing the second record.
+    """
+    for run, speed in enumerate([6.0, 7.0, 8.0, 9.0]):
+        fetched(con, [5.0, speed])
+        upsert_forecast(
+            con, "wind", "wind", fetched_at=first_run + run * hour / 4, layout=layout
+        )
+
+
+@pytest.mark.parametrize("layout", ["versions", "ranges"])
+def test_compaction_keeps_the_current_versions(tmp_path, con, layout):
+    stored_runs(con, layout)
+    con.execute("DETACH warehouse")
+
+    result = compact_warehouse(tmp_path / "surf.duckdb", now=first_run + 30 * hour)
+    assert result.rows_before == {"wind": 5}
+    # Of the versions fetched within one hour only the last one is kept
+    assert result.rows_after == {"wind": 2}
+
+    attach_warehouse(con, str(tmp_path / "surf.duckdb"))
+    assert rows(con, "SELECT speed FROM warehouse.wind ORDER BY timestamp") == [
+        (5.0,),
+        (9.0,),
+    ]
+
+
+def test_compaction_leaves_a_warehouse_in_use_alone(tmp_path, con, monkeypatch):
+    stored_runs(con, "versions")
+    path = tmp_path / "surf.duckdb"
+
+    # Still attached to a writer
+    with pytest.raises(duckdb.Error):
+        compact_warehouse(path, now=first_run + 30 * hour)
+    con.execute("DETACH warehouse")
+
+    # Written to anyway while it was copied
+    generations = iter([(1, 2, 3), (1, 2, 4)])
+    monkeypatch.setattr(compaction, "generation", lambda path: next(generations))
+    with pytest.raises(RuntimeError, match="changed"):
+        compact_warehouse(path, now=first_run + 30 * hour)
+
+    assert not (tmp_path / "surf.duckdb.compact").exists()
+    assert rows(duckdb.connect(str(path)), "SELECT count(*) FROM wind") == [(5,)]
+
+
+writer = """
+import os, sys
+import duckdb
+from duckdive.warehouse import attach_warehouse, upsert_forecast
+
+con = duckdb.connect()
+con.execute("SET checkpoint_threshold = '1GB'")
+attach_warehouse(con, sys.argv[1])
+con.execute("CREATE TABLE wind AS SELECT 'spot0001' AS spot_id, 1727740800 AS timestamp")
+upsert_forecast(con, "wind", "wind")
+os._exit(0)
+"""
+
+
+def test_compaction_includes_the_write_ahead_log(tmp_path):
+    path = tmp_path / "surf.duckdb"
+    # A writer that exits without checkpointing leaves its rows in the log
+    subprocess.run([sys.executable, "-c", writer, str(path)], check=True)
+    assert (tmp_path / "surf.duckdb.wal").exists()
+
+    result = compact_warehouse(path)
+    assert result.rows_after == {"wind": 1}
+    assert not (tmp_path / "surf.duckdb.wal").exists()
@@ -0,0 +1,81 @@
+import duckdb
+import pytest
+
+from duckdive.watch import Watcher, parse_duration, parse_intervals
+
+
+@pytest.fixture
+def watcher(tmp_path, api, request):
+    watcher = Watcher(
+        ["spot0001", "spot0002"],
+        ["wind", "tides"],
+        database=str(tmp_path / "surf.duckdb"),
+        layout=getattr(request, "param", "versions"),
+        transport="requests",
+        base_url=api.base_url,
+    )
+    yield watcher
+    watcher.close()
+
+
+@pytest.mark.parametrize("watcher", ["versions", "ranges"], indirect=True)
+def test_repeated_polls_write_nothing_new(watcher):
+    first = watcher.poll("wind")
+    assert first.error is None
+    assert first.fetched == 2
+    assert first.inserted == 2 * 3 * 24
+
+    for _ in range(2):
+        again = watcher.poll("wind")
+        assert again.error is None
+        assert again.inserted == 0
+
+
+def test_every_type_is_polled_at_startup_then_on_its_interval(watcher):
+    watcher.intervals = {"wind": 3600, "tides": 0}
+    polls = []
+    assert watcher.run(on_poll=polls.append, max_polls=4) == 4
+    # wind waits an hour after its first poll, tides is due again right away
+    assert sorted(poll.forecast_type for poll in polls[:2]) == ["tides", "wind"]
+    assert [poll.forecast_type for poll in polls[2:]] == ["tides", "tides"]
+
+
+def test_failed_spots_are_reported_with_the_poll(tmp_path, api):
+    watcher = Watcher(
+        ["spot0001", "missing"],
+        ["wind"],
+        database=str(tmp_path / "surf.duckdb"),
+        transport="requests",
+        base_url=api.base_url,
+    )
+    try:
+        result = watcher.poll("wind")
+    finally:
+        watcher.close()
+    assert (result.fetched, result.errors) == (1, 1)
+    assert "missing" in result.messages[0]
+    assert result.inserted == 3 * 24
+
+
+def test_cursors_of_finished_threads_are_closed(watcher):
+    for _ in range(3):
+        watcher.poll("wind")
+    # Each poll runs a new worker pool, one thread per spot at most, and the
+    # cursors of the previous pool's threads are closed by the next one
+    assert len(watcher.client._cursors) <= 2
+
+
+def test_parse_intervals():
+    assert parse_duration("90s") == 90
+    assert parse_duration("15") == 15 * 60
+    assert parse_intervals(["wind=15m", "tides=12h"]) == {
+        "wind": 15 * 60,
+        "tides": 12 * 60 * 60,
+    }
+
+
+def test_polls_only_write_to_the_warehouse_while_polling(watcher):
+    watcher.poll("tides")
+    # The file is free in between polls, e.g. for a read-only duckdive serve
+    with duckdb.connect(watcher.database, read_only=True) as con:
+        assert con.execute("SELECT count(*) FROM tides").fetchone()[0] > 0